@@ -0,0 +1,264 @@
+# coding: utf-8
+"""
+Health of the saved accounts.
+
+The online records of the accounts are queried in the background, a
+limited batch per pass in the lowest priority class of the portal rate
+limiter, which tells the number of sessions of the account without
+touching the current session. Whether the password is right and the
+account has quota left is only known from the reply of a login, so the
+failures of logins are classified with the patterns of the portal profile
+and remembered as well. Every result expires after a while, so an account
+whose problem was fixed is tried again.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from .portal import PortalClient
+from .rate_limit import RateLimitedError
+
+
+OK = "ok"
+UNKNOWN = "unknown"
+CREDENTIALS = "credentials"
+QUOTA = "quota"
+DEVICES = "devices"
+
+# 各类故障的有效期，过期后重新尝试该账号
+FAILURE_TTL = {CREDENTIALS: 24 * 3600, QUOTA: 3600, DEVICES: 300}
+
+
+class AccountHealth:
+    """ Health of one account
+
+    Parameters
+    ----------
+    uid: str
+        account
+
+    state: str
+        `ok`, `unknown`, or the failure `credentials`, `quota` or `devices`
+
+    sessions: int
+        online sessions of the account, `None` if not queried
+
+    msg: str
+        reply of the portal which set the state
+
+    expires: float
+        monotonic time after which the state is no longer trusted
+    """
+
+    def __init__(self, uid, state=UNKNOWN, sessions=None, msg="", expires=0.0):
+        self.uid = uid
+        self.state = state
+        self.sessions = sessions
+        self.msg = msg
+        self.expires = expires
+
+    @property
+    def healthy(self):
+        return self.state in (OK, UNKNOWN)
+
+    def toDict(self, now: float) -> dict:
+        return {"state": self.state, "sessions": self.sessions, "msg": self.msg,
+                "expires_in": round(max(0.0, self.expires - now))}
+
+
+class AccountHealthChecker:
+    """ Validate the saved accounts concurrently and cache the results
+
+    Parameters
+    ----------
+    ttl: float
+        seconds the online session count of an account is trusted
+
+    deviceLimit: int
+        sessions an account may have at the same time, 0 if unknown
+
+    max_workers: int
+        maximum number of accounts queried at the same time
+
+    batch: int
+        maximum number of accounts queried in one pass, those queried least recently first
+
+    clock: callable
+        monotonic clock in seconds
+
+    **kwargs:
+        extra arguments passed to `PortalClient`. The queries go through the
+        shared `portalLimiter` in the lowest priority class `health` unless
+        another `limiter` is given.
+    """
+
+    def __init__(self, ttl=300.0, deviceLimit=0, max_workers=1, batch=20, clock=time.monotonic, **kwargs):
+        self.ttl = ttl
+        self.deviceLimit = deviceLimit
+        self.max_workers = max_workers
+        self.batch = batch
+        self.clock = clock
+        self.clientKwargs = kwargs
+
+        self.cache = {}     # uid -> AccountHealth
+        self.queried = {}   # uid -> 上一次查询的时间，决定下一轮查询哪些账号
+        self.lock = threading.Lock()
+
+    def get(self, uid) -> AccountHealth:
+        """ cached health of the account, `unknown` if it expired """
+        with self.lock:
+            health = self.cache.get(uid)
+            if health is None or health.expires <= self.clock():
+                return AccountHealth(uid)
+
+            return health
+
+    def _set(self, uid, state, sessions=None, msg="", ttl=None):
+        with self.lock:
+            previous = self.cache.get(uid)
+            if sessions is None and previous is not None:
+                sessions = previous.sessions
+
+            health = AccountHealth(uid, state, sessions, msg, self.clock() + (self.ttl if ttl is None else ttl))
+            self.cache[uid] = health
+            return health
+
+    def check(self, uids) -> dict:
+        """ query the online sessions of at most `batch` accounts concurrently
+
+        The accounts not queried for the longest time go first. A failure
+        learned from a login which has not expired is kept. Once the rate
+        limiter sheds a query the rest of the pass is skipped.
+
+        Returns
+        -------
+        health: dict
+            uid -> `AccountHealth` of the queried accounts
+        """
+        with self.lock:
+            uids = sorted(set(uids), key=lambda uid: self.queried.get(uid, float("-inf")))[:self.batch]
+        if not uids:
+            return {}
+
+        shed = threading.Event()
+
+        local = threading.local()
+        clients = []
+
+        def client():
+            if not hasattr(local, "client"):
+                local.client = PortalClient(**self.clientKwargs)
+                clients.append(local.client)
+            return local.client
+
+        def run(uid):
+            if shed.is_set():
+                return uid, None
+
+            try:
+                sessions = len(client().fetchDevices(uid, endpoint="health"))
+            except RateLimitedError as e:
+                # 门户请求繁忙，本轮剩余的账号留到下一轮
+                shed.set()
+                logger.debug(f"Health check of {uid} shed: {e}")
+                return uid, None
+            except Exception as e:
+                logger.debug(f"Health check of {uid} failed: {e}")
+                return uid, self.get(uid)
+
+            with self.lock:
+                self.queried[uid] = self.clock()
+
+            # 登录得知的故障在过期前保留，设备数超限的账号有会话下线后恢复
+            current = self.get(uid)
+            if current.state in (CREDENTIALS, QUOTA) or \
+                    (current.state == DEVICES and sessions >= (current.sessions or 0)):
+                return uid, self._set(uid, current.state, sessions, current.msg,
+                                      current.expires - self.clock())
+
+            if self.deviceLimit and sessions >= self.deviceLimit:
+                return uid, self._set(uid, DEVICES, sessions, f"{sessions} sessions online")
+
+            return uid, self._set(uid, OK, sessions)
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(uids)))) as executor:
+                health = {uid: h for uid, h in executor.map(run, uids) if h is not None}
+        finally:
+            for c in clients:
+                c.session.close()
+
+        healthy = sum(1 for h in health.values() if h.healthy)
+        logger.info(f"Checked {len(health)} of {len(uids)} accounts in {time.perf_counter() - start:.2f} s, "
+                    f"{healthy} healthy")
+        return health
+
+    def recordLogin(self, uid, results: dict, classify):
+        """ learn the health of the account from the results of a login
+
+        Parameters
+        ----------
+        results: dict
+            interface name -> result dict of `PortalClient.login`
+
+        classify: callable
+            maps the message of a failed login to `credentials`, `quota`, `devices` or `None`
+
+        Returns
+        -------
+        state: str
+            failure of the account, `ok` after a success, or `None` if the
+            login failed for another reason, e.g. the network
+        """
+        if any(result["success"] for result in results.values()):
+            self._set(uid, OK)
+            return OK
+
+        for result in results.values():
+            kind = classify(result.get("msg", ""))
+            if kind:
+                self._set(uid, kind, msg=result["msg"], ttl=FAILURE_TTL[kind])
+                logger.warning(f"Account {uid} failed with {kind}: {result['msg']}")
+                return kind
+
+        return None
+
+    def invalidate(self, uid=None):
+        """ forget the account, e.g. after its password was changed, or all accounts after an import """
+        with self.lock:
+            if uid is None:
+                self.cache.clear()
+                self.queried.clear()
+            else:
+                self.cache.pop(uid, None)
+                self.queried.pop(uid, None)
+
+    def candidates(self, preferred, uids) -> list:
+        """ accounts to log in with in order, the preferred one first unless it is known to fail
+
+        Other healthy accounts follow, those known to work and with fewer
+        sessions first. Accounts known to fail are left out.
+        """
+        order = {OK: 0, UNKNOWN: 1}
+        others = []
+        for index, uid in enumerate(uids):
+            if uid == preferred:
+                continue
+            health = self.get(uid)
+            if health.healthy:
+                others.append((order[health.state], health.sessions or 0, index, uid))
+
+        result = [uid for *_, uid in sorted(others)]
+        if preferred and self.get(preferred).healthy:
+            result.insert(0, preferred)
+
+        return result
+
+    def summary(self) -> dict:
+        """ uid -> health of the cached accounts, for the local socket """
+        now = self.clock()
+        with self.lock:
+            return {uid: health.toDict(now) for uid, health in self.cache.items()}
@@ -0,0 +1,332 @@
+# coding: utf-8
+"""
+Bulk import and export of the account store.
+
+    python -m app.common.account_io import roster.csv
+    python -m app.common.account_io export backup.json
+
+A roster is a csv file with the columns `uid,password,auto` (the header is
+optional, `auto` may be left out), a json file in the format of the old
+`net_ids.json` (`{uid: [password, auto]}`) or an array of such rows, or a
+json lines file with one row per line. Files are read and written a batch
+at a time, so a large roster takes constant memory. Rows repeating a uid
+overwrite the earlier ones, invalid rows are skipped and reported.
+"""
+import argparse
+import csv
+import getpass
+import json
+import os
+import tempfile
+import time
+
+from loguru import logger
+
+from .account_store import AccountStore, DEFAULT_DB_PATH
+from .vault import VaultError
+
+
+FORMATS = ("csv", "json", "jsonl")
+CSV_COLUMNS = ("uid", "password", "auto")
+MAX_UID_LENGTH = 64
+BATCH_SIZE = 1000
+CHUNK_SIZE = 1 << 16
+# 报告中保留的错误行数
+MAX_ERRORS = 20
+
+
+class AccountFileError(ValueError):
+    """ The roster file cannot be read or has an unknown format """
+
+
+def detectFormat(path: str, format: str = None) -> str:
+    """ format of the file, given or from its extension """
+    format = (format or os.path.splitext(path)[1].lstrip(".")).lower()
+    if format == "ndjson":
+        format = "jsonl"
+
+    if format not in FORMATS:
+        raise AccountFileError(f"Unknown roster format {format or path}, expected one of {', '.join(FORMATS)}")
+
+    return format
+
+
+def parseAuto(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "on", "是")
+
+    return bool(value)
+
+
+class ImportReport:
+    """ Result of an import
+
+    Parameters
+    ----------
+    path: str
+        file which was imported
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.invalid = 0
+        self.errors = []    # (行号, 原因)
+        self.added = 0
+        self.elapsed = 0.0
+
+    def reject(self, line, reason: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, reason))
+
+    def summary(self) -> dict:
+        return {
+            "path": self.path,
+            "rows": self.rows,
+            "added": self.added,
+            "updated": self.rows - self.added,
+            "invalid": self.invalid,
+            "errors": [f"{line}: {reason}" for line, reason in self.errors],
+            "elapsed": round(self.elapsed, 3),
+        }
+
+    def __str__(self):
+        return json.dumps(self.summary(), ensure_ascii=False)
+
+
+def _csvRows(f):
+    reader = csv.reader(f)
+    columns = None
+    for row in reader:
+        if not row or not any(cell.strip() for cell in row):
+            continue
+
+        if columns is None:
+            # 第一行是表头时按列名取值，否则按 uid,password,auto 的顺序
+            header = [cell.strip().lower() for cell in row]
+            if "uid" in header:
+                columns = [header.index(name) if name in header else None for name in CSV_COLUMNS]
+                continue
+            columns = [0, 1, 2]
+
+        yield reader.line_num, [row[i] if i is not None and i < len(row) else "" for i in columns]
+
+
+def _jsonValues(f):
+    """ the members of a top level json object as `(key, value)` or of an array as `(None, value)`,
+    decoded one at a time from chunks of the file """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars=" \t\r\n"):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def expect(chars):
+        nonlocal pos
+        skip()
+        if pos >= len(buffer) or buffer[pos] not in chars:
+            found = buffer[pos:pos + 20] or "end of file"
+            raise AccountFileError(f"Malformed json, expected {' or '.join(chars)} but found {found!r}")
+        pos += 1
+        return buffer[pos - 1]
+
+    def decode():
+        nonlocal pos
+        while True:
+            skip()
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # 数字等值可能在块的边界被截断，读到下一个分隔符才算完整
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise AccountFileError(f"Malformed json: {e}") from None
+            fill()
+
+    fill()
+    opening = expect("{[")
+    closing = "}" if opening == "{" else "]"
+    skip()
+    if buffer[pos:pos + 1] == closing:
+        return
+
+    while True:
+        key = None
+        if opening == "{":
+            key = decode()
+            expect(":")
+        yield key, decode()
+
+        if expect("," + closing) == closing:
+            return
+
+
+def _jsonRow(key, value):
+    """ `[uid, password, auto]` of one json member """
+    if key is not None:
+        value = value if isinstance(value, list) else [value]
+        return [key] + value[:2]
+    if isinstance(value, dict):
+        return [value.get("uid"), value.get("password", ""), value.get("auto", value.get("auto_login", False))]
+    if isinstance(value, list):
+        return value[:3]
+
+    raise ValueError(f"unexpected {type(value).__name__}")
+
+
+def readRows(path: str, format: str = None):
+    """ `(line, [uid, password, auto])` of the rows of a roster, `line` is the row number for json """
+    format = detectFormat(path, format)
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            if format == "csv":
+                yield from _csvRows(f)
+            elif format == "jsonl":
+                for line, text in enumerate(f, 1):
+                    if text.strip():
+                        try:
+                            yield line, _jsonRow(None, json.loads(text))
+                        except ValueError as e:
+                            yield line, e
+            else:
+                for index, (key, value) in enumerate(_jsonValues(f), 1):
+                    try:
+                        yield index, _jsonRow(key, value)
+                    except ValueError as e:
+                        yield index, e
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        raise AccountFileError(f"Cannot read {path}: {e}") from None
+
+
+def _validate(batch: list, report: ImportReport):
+    """ the valid `(uid, password, auto)` of a batch of parsed rows """
+    valid = []
+    for line, row in batch:
+        if isinstance(row, Exception):
+            report.reject(line, str(row))
+            continue
+
+        row = list(row) + [""] * (3 - len(row))
+        uid, password, auto = row[:3]
+        uid = "" if uid is None else str(uid).strip()
+        if not uid:
+            report.reject(line, "empty uid")
+        elif len(uid) > MAX_UID_LENGTH:
+            report.reject(line, f"uid longer than {MAX_UID_LENGTH} characters")
+        elif not uid.isprintable() or any(c.isspace() for c in uid):
+            report.reject(line, f"invalid characters in uid {uid!r}")
+        else:
+            valid.append((uid, "" if password is None else str(password), parseAuto(auto)))
+
+    report.rows += len(valid)
+    return valid
+
+
+def importAccounts(store: AccountStore, path: str, format: str = None, batchSize=BATCH_SIZE) -> ImportReport:
+    """ add the accounts of a roster to the store in one transaction, sealing the passwords if a vault is enabled
+
+    Raises
+    ------
+    AccountFileError
+        the file cannot be read or is malformed, nothing is imported
+    """
+    report = ImportReport(path)
+    start = time.perf_counter()
+
+    def rows():
+        batch = []
+        for item in readRows(path, format):
+            batch.append(item)
+            if len(batch) >= batchSize:
+                yield from _validate(batch, report)
+                batch.clear()
+        yield from _validate(batch, report)
+
+    # 文件格式错误时抛出异常，事务回滚
+    report.added = store.importRows(rows(), batchSize)["added"]
+    report.elapsed = time.perf_counter() - start
+    logger.info(f"Imported {report.rows} accounts from {path} in {report.elapsed:.2f} s, "
+                f"{report.added} new, {report.invalid} invalid")
+    return report
+
+
+def _plainRows(store: AccountStore):
+    for uid, password, auto in store.iterRows(BATCH_SIZE):
+        yield uid, store.reveal(uid, password), auto
+
+
+def exportAccounts(store: AccountStore, path: str, format: str = None) -> int:
+    """ write all accounts to a file only the user can read, returns the number of accounts
+
+    Sealed passwords are written in plaintext, so the vault has to be unlocked.
+    """
+    format = detectFormat(path, format)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(prefix=".accounts-", dir=directory)
+    count = 0
+    try:
+        # 文件含明文密码，写完再替换，避免留下不完整的文件
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            if format == "csv":
+                writer = csv.writer(f)
+                writer.writerow(CSV_COLUMNS)
+                for uid, password, auto in _plainRows(store):
+                    writer.writerow((uid, password, int(auto)))
+                    count += 1
+            elif format == "jsonl":
+                for uid, password, auto in _plainRows(store):
+                    f.write(json.dumps({"uid": uid, "password": password, "auto": auto}, ensure_ascii=False) + "\n")
+                    count += 1
+            else:
+                f.write("{")
+                for uid, password, auto in _plainRows(store):
+                    f.write(("," if count else "") + "\n  " + json.dumps(uid, ensure_ascii=False) + ": "
+                            + json.dumps([password, auto], ensure_ascii=False))
+                    count += 1
+                f.write("\n}\n")
+
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+    logger.info(f"Exported {count} accounts to {path}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import or export the saved accounts")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", help="csv, json or jsonl file")
+    parser.add_argument("--format", choices=FORMATS, help="format of the file, from its extension by default")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="account database")
+    args = parser.parse_args()
+
+    store = AccountStore(args.db, legacy_path=None)
+    try:
+        if store.locked:
+            store.unlock(getpass.getpass("Vault passphrase: "))
+        if args.action == "import":
+            print(importAccounts(store, args.path, args.format))
+        else:
+            print(json.dumps({"path": args.path, "accounts": exportAccounts(store, args.path, args.format)}))
+    except (AccountFileError, VaultError) as e:
+        parser.exit(1, f"{e}\n")
+    finally:
+        store.close()
@@ -0,0 +1,364 @@
+# coding: utf-8
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from loguru import logger
+
+from .vault import CredentialVault, VaultLocked, DEFAULT_COST
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~"), "net_ids.db")
+LEGACY_JSON_PATH = os.path.join(os.path.expanduser("~"), "net_ids.json")
+
+UPSERT_SQL = (
+    "INSERT INTO accounts (uid, password, auto_login, updated_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(uid) DO UPDATE SET password = excluded.password, "
+    "auto_login = excluded.auto_login, updated_at = excluded.updated_at")
+
+
+class AccountStore:
+    """ SQLite backed account store
+
+    Every write is a single transaction touching only the changed accounts,
+    lookups go through the primary key index on `uid`. Listeners registered
+    with `subscribe` receive only the delta of each change::
+
+        {"upserted": {uid: [password, auto]}, "removed": [uid, ...]}
+
+    A bulk import sends one delta with `"reset": True` instead, without the
+    accounts, listeners read them again with `iterRows` if they need them.
+
+    Passwords are written in plaintext. Once a vault is enabled, they are
+    stored and passed to listeners sealed for their uid, `reveal` opens one
+    of them while the vault is unlocked.
+
+    Parameters
+    ----------
+    path: str
+        path of the database file
+
+    legacy_path: str
+        `net_ids.json` written by older versions, imported once when the database is empty
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, legacy_path=LEGACY_JSON_PATH):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock = threading.RLock()
+        self.listeners = []
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._createTables()
+        self.vault = self._loadVault()
+
+        if legacy_path and os.path.exists(legacy_path) and self.count() == 0:
+            self._importLegacy(legacy_path)
+
+    def _createTables(self):
+        with self.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS accounts (
+                    uid TEXT PRIMARY KEY,
+                    password TEXT NOT NULL DEFAULT '',
+                    auto_login INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )""")
+            # 只索引自动登录账号，查找为O(1)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_auto ON accounts(auto_login) WHERE auto_login = 1")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS vault (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    salt BLOB NOT NULL,
+                    cost INTEGER NOT NULL,
+                    r INTEGER NOT NULL,
+                    p INTEGER NOT NULL,
+                    checksum BLOB NOT NULL
+                )""")
+
+    def _loadVault(self):
+        with self.lock:
+            row = self.conn.execute("SELECT salt, cost, r, p, checksum FROM vault WHERE id = 1").fetchone()
+
+        return CredentialVault(*row) if row else None
+
+    def _importLegacy(self, legacy_path):
+        try:
+            with open(legacy_path, "r") as f:
+                ids = json.load(f)
+
+            self.upsertMany((uid, values[0], values[1]) for uid, values in ids.items())
+            os.replace(legacy_path, legacy_path + ".bak")
+            logger.info(f"Imported {len(ids)} accounts from {legacy_path}")
+        except Exception as e:
+            logger.error(f"Error importing {legacy_path}: {e}")
+
+    def transaction(self):
+        return _Transaction(self)
+
+    def subscribe(self, listener):
+        """ register a callable receiving the delta of every change """
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def _notify(self, upserted: dict, removed: list):
+        if not (upserted or removed):
+            return
+
+        self._dispatch({"upserted": upserted, "removed": removed})
+
+    def _notifyReset(self):
+        self._dispatch({"upserted": {}, "removed": [], "reset": True})
+
+    def _dispatch(self, delta: dict):
+        for listener in self.listeners:
+            try:
+                listener(delta)
+            except Exception as e:
+                logger.error(f"Error notifying account change: {e}")
+
+    def get(self, uid):
+        """ returns `[password, auto]` of the account or `None` """
+        with self.lock:
+            row = self.conn.execute("SELECT password, auto_login FROM accounts WHERE uid = ?", (uid,)).fetchone()
+
+        return [row[0], bool(row[1])] if row else None
+
+    def __contains__(self, uid):
+        return self.get(uid) is not None
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+    def uids(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT uid FROM accounts ORDER BY rowid")]
+
+    def all(self) -> dict:
+        """ all accounts as `{uid: [password, auto]}` """
+        with self.lock:
+            rows = self.conn.execute("SELECT uid, password, auto_login FROM accounts ORDER BY rowid").fetchall()
+
+        return {uid: [password, bool(auto)] for uid, password, auto in rows}
+
+    def iterRows(self, batchSize=1000):
+        """ `(uid, password, auto)` of all accounts, read a batch at a time """
+        last = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, uid, password, auto_login FROM accounts WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, batchSize)).fetchall()
+            if not rows:
+                return
+
+            last = rows[-1][0]
+            for _, uid, password, auto in rows:
+                yield uid, password, bool(auto)
+
+    @property
+    def locked(self):
+        """ whether passwords are sealed and the vault is locked """
+        return self.vault is not None and self.vault.locked
+
+    def reveal(self, uid: str, password: str) -> str:
+        """ plaintext of the password of the account from the store, raises `VaultLocked` while the vault is locked """
+        return self.vault.open(password, uid) if self.vault is not None else password
+
+    def _seal(self, uid: str, password: str) -> str:
+        return self.vault.seal(password, uid) if self.vault is not None else password
+
+    def unlock(self, passphrase: str):
+        """ derive the key of the vault, raises `WrongPassphrase` """
+        if self.vault is not None:
+            self.vault.unlock(passphrase)
+
+    def lockVault(self):
+        """ forget the key, sealed passwords cannot be opened until the next `unlock` """
+        if self.vault is not None:
+            self.vault.lock()
+
+    def enableVault(self, passphrase: str, cost=DEFAULT_COST):
+        """ seal all passwords under a new passphrase in one transaction, the vault stays unlocked
+
+        An enabled vault has to be unlocked, its passwords are sealed again under the new passphrase.
+        """
+        if self.locked:
+            raise VaultLocked("the credential vault is locked")
+
+        vault = CredentialVault.create(passphrase, cost)
+        with self.transaction() as cursor:
+            rows = cursor.execute("SELECT uid, password FROM accounts").fetchall()
+            cursor.executemany("UPDATE accounts SET password = ? WHERE uid = ?",
+                               [(vault.seal(self.reveal(uid, password), uid), uid) for uid, password in rows])
+            cursor.execute("INSERT OR REPLACE INTO vault (id, salt, cost, r, p, checksum) VALUES (1, ?, ?, ?, ?, ?)",
+                           (vault.salt, vault.cost, vault.r, vault.p, vault.check))
+        self.vault = vault
+
+        # 重写数据库文件并清空 WAL，不在空闲页中留下明文密码
+        with self.lock:
+            self.conn.execute("VACUUM")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        # 旧版导入时留下的明文备份
+        if self.legacy_path and os.path.exists(self.legacy_path + ".bak"):
+            os.remove(self.legacy_path + ".bak")
+
+        logger.info(f"Sealed {len(rows)} passwords, scrypt cost {vault.cost}")
+        self._notifyReset()
+
+    def disableVault(self):
+        """ store the passwords in plaintext again, the vault has to be unlocked """
+        if self.vault is None:
+            return
+
+        with self.transaction() as cursor:
+            rows = cursor.execute("SELECT uid, password FROM accounts").fetchall()
+            cursor.executemany("UPDATE accounts SET password = ? WHERE uid = ?",
+                               [(self.vault.open(password, uid), uid) for uid, password in rows])
+            cursor.execute("DELETE FROM vault")
+        self.vault = None
+
+        logger.info(f"Stored {len(rows)} passwords in plaintext")
+        self._notifyReset()
+
+    def autoLoginUid(self):
+        """ uid of the auto login account or `None` """
+        with self.lock:
+            row = self.conn.execute("SELECT uid FROM accounts WHERE auto_login = 1 LIMIT 1").fetchone()
+
+        return row[0] if row else None
+
+    def upsert(self, uid: str, password: str, auto=False):
+        self.upsertMany([(uid, password, auto)])
+
+    def upsertMany(self, rows):
+        """ insert or update accounts in one transaction
+
+        Parameters
+        ----------
+        rows: iterable
+            `(uid, password, auto)` tuples with plaintext passwords, later rows win for duplicated uids
+        """
+        upserted = {}
+        with self.transaction() as cursor:
+            for uid, password, auto in rows:
+                auto = bool(auto)
+                if auto:
+                    upserted.update(self._clearAutoLogin(cursor, uid))
+
+                password = self._seal(uid, password)
+                cursor.execute(UPSERT_SQL, (uid, password, int(auto), time.time()))
+                upserted[uid] = [password, auto]
+
+        self._notify(upserted, [])
+
+    def importRows(self, rows, batchSize=1000) -> dict:
+        """ insert or update many accounts in one transaction
+
+        Later rows win for duplicated uids as with `upsertMany`, but the rows
+        are written a batch at a time without being collected, and listeners
+        receive a single `reset` marker after the commit.
+
+        Parameters
+        ----------
+        rows: iterable
+            `(uid, password, auto)` tuples with plaintext passwords, e.g. a generator reading a file
+
+        Returns
+        -------
+        counts: dict
+            `rows` written and `added` accounts which were not in the store
+        """
+        written = 0
+        batch = []
+        with self.transaction() as cursor:
+            before = cursor.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+            for uid, password, auto in rows:
+                if auto:
+                    # 自动登录账号按文件顺序写入，最后一个生效
+                    self._writeBatch(cursor, batch)
+                    self._clearAutoLogin(cursor, uid)
+                    cursor.execute(UPSERT_SQL, (uid, self._seal(uid, password), 1, time.time()))
+                else:
+                    batch.append((uid, self._seal(uid, password), 0, time.time()))
+                    if len(batch) >= batchSize:
+                        self._writeBatch(cursor, batch)
+                written += 1
+
+            self._writeBatch(cursor, batch)
+            added = cursor.execute("SELECT COUNT(*) FROM accounts").fetchone()[0] - before
+
+        self._notifyReset()
+        return {"rows": written, "added": added}
+
+    @staticmethod
+    def _writeBatch(cursor, batch: list):
+        if batch:
+            cursor.executemany(UPSERT_SQL, batch)
+            batch.clear()
+
+    def _clearAutoLogin(self, cursor, uid):
+        """ unset the previous auto login account, only one account logs in automatically """
+        rows = cursor.execute(
+            "SELECT uid, password FROM accounts WHERE auto_login = 1 AND uid != ?", (uid,)).fetchall()
+        cursor.execute("UPDATE accounts SET auto_login = 0 WHERE auto_login = 1 AND uid != ?", (uid,))
+        return {other: [password, False] for other, password in rows}
+
+    def remove(self, uid: str):
+        self.removeMany([uid])
+
+    def removeMany(self, uids):
+        removed = []
+        with self.transaction() as cursor:
+            for uid in uids:
+                if cursor.execute("DELETE FROM accounts WHERE uid = ?", (uid,)).rowcount:
+                    removed.append(uid)
+
+        self._notify({}, removed)
+
+    def replace(self, ids: dict):
+        """ make the store equal to `{uid: [password, auto]}` with plaintext passwords, only the differences are written """
+        current = {uid: [self.reveal(uid, password), auto] for uid, (password, auto) in self.all().items()}
+        removed = [uid for uid in current if uid not in ids]
+        changed = [(uid, values[0], values[1]) for uid, values in ids.items()
+                   if current.get(uid) != [values[0], bool(values[1])]]
+
+        # 先写入非自动登录账号，避免清除自动登录标记时产生多余的变更
+        changed.sort(key=lambda row: bool(row[2]))
+        with self.lock:
+            if removed:
+                self.removeMany(removed)
+            if changed:
+                self.upsertMany(changed)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class _Transaction:
+    """ `BEGIN IMMEDIATE ... COMMIT` block holding the store lock """
+
+    def __init__(self, store: AccountStore):
+        self.store = store
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        self.cursor = self.store.conn.cursor()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        return self.cursor
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.cursor.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.cursor.close()
+            self.store.lock.release()
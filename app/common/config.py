@@ -48,6 +48,47 @@ class Config(QConfig):
     # Material
     blurRadius = RangeConfigItem("Material", "AcrylicBlurRadius", 15, RangeValidator(0, 40))
 
+    # power
+    backgroundProbeInterval = RangeConfigItem("Power", "BackgroundProbeInterval", 30, RangeValidator(5, 600))
+
+    # log
+    logLevel = OptionsConfigItem(
+        "Log", "Level", "INFO", OptionsValidator(["DEBUG", "INFO", "WARNING", "ERROR"]), restart=True)
+    logMaxSize = RangeConfigItem("Log", "MaxSize", 5, RangeValidator(1, 100), restart=True)
+
+    # metrics
+    metricsEnabled = ConfigItem("Metrics", "Enabled", False, BoolValidator(), restart=True)
+    metricsPort = RangeConfigItem("Metrics", "Port", 9108, RangeValidator(1024, 65535), restart=True)
+
+    # keep-alive, interval 0 learns the idle timeout of the portal
+    keepAliveEnabled = ConfigItem("KeepAlive", "Enabled", True, BoolValidator())
+    keepAliveRequest = OptionsConfigItem(
+        "KeepAlive", "Request", "head", OptionsValidator(["head", "identity", "devices"]))
+    keepAliveInterval = RangeConfigItem("KeepAlive", "Interval", 0, RangeValidator(0, 3600))
+    keepAliveLearned = RangeConfigItem("KeepAlive", "LearnedTimeout", 0, RangeValidator(0, 86400))
+
+    # pre-login, watch the session around the learned times of forced logouts
+    preloginEnabled = ConfigItem("Prelogin", "Enabled", True, BoolValidator())
+    preloginInterval = RangeConfigItem("Prelogin", "WatchInterval", 1, RangeValidator(1, 30))
+
+    # accounts, health check of the saved accounts and failover of auto login
+    accountFailover = ConfigItem("Accounts", "Failover", True, BoolValidator())
+    accountCheckInterval = RangeConfigItem("Accounts", "CheckInterval", 300, RangeValidator(60, 3600))
+    accountDeviceLimit = RangeConfigItem("Accounts", "DeviceLimit", 0, RangeValidator(0, 20))
+    accountCheckBatch = RangeConfigItem("Accounts", "CheckBatch", 20, RangeValidator(1, 200))
+
+    # online devices, requests in flight when unbinding or kicking sessions
+    deviceConcurrency = RangeConfigItem("Devices", "Concurrency", 8, RangeValidator(1, 32))
+
+    # credential vault, log2 of the scrypt work factor of a new passphrase, every step doubles time and memory
+    vaultCost = RangeConfigItem("Vault", "Cost", 15, RangeValidator(14, 20))
+
+    # portal, path of a portal profile json, empty for the bundled profile
+    portalProfile = ConfigItem("Portal", "Profile", "", restart=True)
+
+    # profile
+    profileEnabled = ConfigItem("Profile", "Enabled", False, BoolValidator(), restart=True)
+
     # software update
     checkUpdateAtStartUp = ConfigItem("Update", "CheckUpdateAtStartUp", True, BoolValidator())
 
@@ -0,0 +1,224 @@
+# coding: utf-8
+"""
+Fleet mode: drive login, logout and status checks of many (account, source IP)
+pairs from one process.
+
+    python -m app.common.fleet targets.csv status --workers 64 --deadline 5
+
+`targets.csv` has the columns `uid,password,source`, `source` may be empty to
+use the default route.
+"""
+import argparse
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from loguru import logger
+
+from .portal import PortalClient
+from .portal_profile import loadProfile, DEFAULT_PROFILE_PATH
+
+
+class FleetReport:
+    """ Aggregate report of a fleet run """
+
+    def __init__(self, action: str, results: list, elapsed: float):
+        self.action = action
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r["success"]]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r["success"]]
+
+    @property
+    def timedOut(self):
+        return [r for r in self.results if r.get("timeout")]
+
+    def latency(self, quantile: float):
+        """ latency quantile of the targets in seconds """
+        latencies = sorted(r["elapsed"] for r in self.results)
+        if not latencies:
+            return 0.0
+
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    def summary(self) -> dict:
+        return {
+            "action": self.action,
+            "targets": len(self.results),
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "timeout": len(self.timedOut),
+            "elapsed": round(self.elapsed, 3),
+            "p50": round(self.latency(0.5), 3),
+            "p95": round(self.latency(0.95), 3),
+            "max": round(self.latency(1.0), 3),
+        }
+
+    def __str__(self):
+        return json.dumps(self.summary(), ensure_ascii=False)
+
+
+class FleetController:
+    """ Run portal actions for many targets with bounded concurrency
+
+    Parameters
+    ----------
+    max_workers: int
+        maximum number of targets handled at the same time
+
+    deadline: float
+        seconds each target may take in total, over all of its requests. Each
+        request gets the time left, and a target still running at its deadline
+        is reported as timed out without waiting for it
+
+    **kwargs:
+        extra arguments passed to `PortalClient`, e.g. `portal_url` and `eportal_url`.
+        The targets are not rate limited unless a `limiter` is given.
+    """
+
+    def __init__(self, max_workers=32, deadline=5.0, **kwargs):
+        self.max_workers = max_workers
+        self.deadline = deadline
+        self.clientKwargs = kwargs
+        self.clientKwargs.setdefault("limiter", None)
+
+    def login(self, targets: list) -> FleetReport:
+        return self.run("login", targets)
+
+    def logout(self, targets: list) -> FleetReport:
+        return self.run("logout", targets)
+
+    def status(self, targets: list) -> FleetReport:
+        return self.run("status", targets)
+
+    def run(self, action: str, targets: list) -> FleetReport:
+        """ run the action for every target
+
+        Parameters
+        ----------
+        action: str
+            one of `login`, `logout` and `status`
+
+        targets: list
+            dicts with the keys `uid`, `password` and `source`
+        """
+        if action not in ("login", "logout", "status"):
+            raise ValueError(f"Unknown fleet action: {action}")
+
+        start = time.perf_counter()
+        results = [None] * len(targets)
+        started = {}    # 目标序号 -> 开始处理的 time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(targets))))
+        pending = {executor.submit(self._runTarget, action, target, i, started): i for i, target in enumerate(targets)}
+        try:
+            while pending:
+                expiries = [started[i] + self.deadline for i in pending.values() if i in started]
+                timeout = max(0.001, min(expiries) - time.monotonic()) if expiries else self.deadline
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+
+                now = time.monotonic()
+                for future, i in list(pending.items()):
+                    if i in started and now - started[i] >= self.deadline:
+                        results[i] = self._timedOut(targets[i], now - started[i])
+                        pending.pop(future)
+        finally:
+            # 超时的目标不再等待，其线程在时间预算用完后的请求结束时退出
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        report = FleetReport(action, results, time.perf_counter() - start)
+        logger.info(f"Fleet {report}")
+        return report
+
+    def _runTarget(self, action, target, index, started: dict):
+        uid = target.get("uid")
+        source = target.get("source") or None
+        started[index] = time.monotonic()
+        client = PortalClient(source, timeout=self.deadline, deadline=started[index] + self.deadline,
+                              **self.clientKwargs)
+
+        start = time.perf_counter()
+        try:
+            if action == "login":
+                result = client.login(uid, target.get("password"))
+            elif action == "logout":
+                result = client.logout()
+            else:
+                result = self._status(client, uid)
+        except Exception as e:
+            result = {"source": client.userIP, "success": False, "msg": str(e), "code": None}
+        finally:
+            client.session.close()
+
+        result["uid"] = uid
+        result["elapsed"] = time.perf_counter() - start
+        result["timeout"] = result["elapsed"] > self.deadline or "timed out" in result["msg"].lower()
+        if result["timeout"]:
+            result["success"] = False
+
+        return result
+
+    @staticmethod
+    def _timedOut(target, elapsed):
+        """ result of a target still running at its deadline """
+        return {
+            "source": target.get("source") or "0.0.0.0",
+            "success": False,
+            "msg": "deadline exceeded",
+            "code": None,
+            "uid": target.get("uid"),
+            "elapsed": elapsed,
+            "timeout": True,
+        }
+
+    @staticmethod
+    def _status(client: PortalClient, uid):
+        """ check whether the account is online from the source address """
+        records = client.fetchDevices(uid)
+        online = any(record.get("online_ip") == client.userIP for record in records) \
+            if client.source_address else bool(records)
+
+        return {
+            "source": client.userIP,
+            "success": online,
+            "msg": "online" if online else "offline",
+            "code": 200,
+            "devices": len(records),
+        }
+
+
+def loadTargets(path: str) -> list:
+    """ read targets from a csv file with the columns `uid,password,source` """
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row for row in csv.DictReader(f) if row.get("uid")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch login and health checks of many targets")
+    parser.add_argument("targets", help="csv file with the columns uid,password,source")
+    parser.add_argument("action", choices=["login", "logout", "status"])
+    parser.add_argument("--workers", type=int, default=32, help="maximum concurrent targets")
+    parser.add_argument("--deadline", type=float, default=5.0, help="seconds allowed per target")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE_PATH, help="portal profile json")
+    parser.add_argument("--portal-url", help="override the portal page url of the profile")
+    parser.add_argument("--eportal-url", help="override the ePortal api url of the profile")
+    parser.add_argument("--verbose", action="store_true", help="print the result of every target")
+    args = parser.parse_args()
+
+    controller = FleetController(args.workers, args.deadline, profile=loadProfile(args.profile),
+                                 portal_url=args.portal_url, eportal_url=args.eportal_url)
+    report = controller.run(args.action, loadTargets(args.targets))
+
+    if args.verbose:
+        for result in report.results:
+            print(json.dumps(result, ensure_ascii=False))
+
+    print(report)
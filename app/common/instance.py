@@ -0,0 +1,178 @@
+# coding: utf-8
+"""
+Single-instance guard of the application.
+
+The first instance listens on the local socket of `ipc.serverName()`. A
+later launch finds it with `ipc.request`, forwards its command and exits
+before any window is built, so only one instance polls the portal.
+"""
+import os
+import sys
+
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtNetwork import QLocalServer, QLocalSocket, QAbstractSocket
+
+from loguru import logger
+
+from .ipc import serverName, encode, decode, isRunning, MAX_MESSAGE
+
+
+class InstanceServer(QObject):
+    """ Local server of the running instance
+
+    Commands are dispatched to the handlers added with `addHandler` on the
+    GUI thread. A handler receives the arguments of the request and returns
+    the reply, or `None` for a plain `{"ok": true}`. A deferred handler
+    returns at once and calls `respond(reply)` later, e.g. from the signal of
+    a worker thread, so a slow command does not block the GUI and the other
+    clients. Commands received before `setReady`, e.g. while the main window
+    is still being built, are acknowledged and run once it is called.
+
+    Parameters
+    ----------
+    name: str
+        server name, `ipc.serverName()` by default
+    """
+
+    commandReceived = Signal(str, dict)
+
+    def __init__(self, name: str = None, parent=None):
+        super().__init__(parent)
+        self.name = name or serverName()
+        self.handlers = {"ping": lambda args: None}
+        self.deferred = set()   # 稍后通过 respond 回复的命令
+        self.ready = False
+        self.pending = []   # (command, args) received before setReady
+
+        self.server = QLocalServer(self)
+        if sys.platform == "win32":
+            # 只允许当前用户连接，命令可以触发登录。Unix 上设置该选项后 Qt 会
+            # 先绑定临时路径再改名，覆盖正在运行的实例的套接字，改为绑定后修改权限
+            self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.onNewConnection)
+
+    def listen(self) -> bool:
+        """ start listening, `False` if another instance is already running """
+        # Windows 上同名管道可以重复创建，先确认没有实例在运行
+        if isRunning(self.name):
+            return False
+
+        if not self.server.listen(self.name) and self.server.serverError() == QAbstractSocket.AddressInUseError:
+            # 上次异常退出后留下的套接字文件
+            logger.warning(f"Removing stale instance socket {self.name}")
+            QLocalServer.removeServer(self.name)
+            self.server.listen(self.name)
+
+        if not self.server.isListening():
+            logger.error(f"Failed to listen on {self.name}: {self.server.errorString()}")
+            return False
+
+        if sys.platform != "win32":
+            os.chmod(self.server.fullServerName(), 0o600)
+
+        logger.info(f"Listening for other instances on {self.server.fullServerName()}")
+        return True
+
+    def close(self):
+        self.server.close()
+
+    def addHandler(self, command: str, handler, deferred=False):
+        """ handle `command` with `handler(args) -> dict | None`
+
+        A `deferred` handler is called as `handler(args, respond)` and replies
+        with `respond(reply)` once, `reply` being a dict or `None` as above, or
+        an exception for an error. Raising before that replies with the error.
+        """
+        self.handlers[command] = handler
+        if deferred:
+            self.deferred.add(command)
+        else:
+            self.deferred.discard(command)
+
+    def setReady(self):
+        """ all handlers are added, run the commands received so far """
+        self.ready = True
+        pending, self.pending = self.pending, []
+        for command, args in pending:
+            self.dispatch(command, args)
+
+    def dispatch(self, command: str, args: dict, respond=None):
+        """ run the handler of `command` and pass the reply to `respond(reply)`
+
+        Deferred handlers reply after `dispatch` returns. Without `respond`,
+        e.g. for the commands of `setReady`, a failed reply is only logged.
+        """
+        if respond is None:
+            respond = lambda reply: self.logReply(command, reply)
+
+        handler = self.handlers.get(command)
+        if handler is None:
+            if not self.ready:
+                self.pending.append((command, args))
+                respond({"ok": True, "queued": True})
+            else:
+                respond({"ok": False, "error": f"unknown command: {command}"})
+            return
+
+        self.commandReceived.emit(command, args)
+        replied = []
+
+        def reply(result: dict = None):
+            if replied:
+                logger.warning(f"Instance command {command} replied twice")
+                return
+            replied.append(True)
+            if isinstance(result, Exception):
+                respond({"ok": False, "error": str(result)})
+            else:
+                respond({"ok": True} if result is None else {"ok": True, **result})
+
+        try:
+            if command in self.deferred:
+                handler(args, reply)
+            else:
+                reply(handler(args))
+        except Exception as e:
+            logger.error(f"Error handling instance command {command}: {e}")
+            if not replied:
+                replied.append(True)
+                respond({"ok": False, "error": str(e)})
+
+    def logReply(self, command: str, reply: dict):
+        if not reply["ok"]:
+            logger.warning(f"Dropped instance command {command}: {reply['error']}")
+
+    def onNewConnection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda s=socket: self.onReadyRead(s))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def onReadyRead(self, socket: QLocalSocket):
+        if not socket.canReadLine():
+            if socket.bytesAvailable() > MAX_MESSAGE:
+                socket.abort()
+            return
+
+        line = bytes(socket.readLine(MAX_MESSAGE).data())
+        try:
+            message = decode(line)
+            command = str(message.get("command", ""))
+            args = message.get("args") or {}
+        except ValueError as e:
+            reply = {"ok": False, "error": f"malformed request: {e}"}
+        else:
+            logger.info(f"Instance command received: {command}")
+            self.dispatch(command, args, lambda reply: self.sendReply(socket, reply))
+            return
+
+        self.sendReply(socket, reply)
+
+    def sendReply(self, socket: QLocalSocket, reply: dict):
+        try:
+            socket.write(encode(reply))
+            socket.flush()
+            socket.disconnectFromServer()
+        except RuntimeError:
+            # 延迟回复之前客户端已经断开，套接字已被删除
+            logger.info(f"Instance client left before the reply: {reply}")
@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+Local socket protocol between the running instance and other processes.
+
+The module only uses the standard library, so a second launch of the
+application and command-line clients can talk to the running instance
+before importing Qt, requests or bs4. The running instance listens with
+`QLocalServer` on `serverName()`: a Unix domain socket in the runtime
+directory of the user, or a named pipe on Windows.
+
+A client sends one request and reads one reply, each a line of UTF-8 JSON:
+
+    {"command": "show", "args": {}}
+    {"ok": true}
+    {"ok": false, "error": "unknown command: foo"}
+"""
+import getpass
+import json
+import os
+import re
+import socket
+import sys
+import tempfile
+
+
+SERVER_PREFIX = "ouc-net"
+DEFAULT_TIMEOUT = 2.0
+MAX_MESSAGE = 1 << 20
+
+
+class InstanceNotRunning(ConnectionError):
+    """ No instance is listening on the local socket """
+
+
+def serverName() -> str:
+    """ name passed to `QLocalServer.listen`, one per user """
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "user"
+    name = f"{SERVER_PREFIX}-{re.sub(r'[^A-Za-z0-9_.-]', '_', user)}"
+
+    if sys.platform == "win32":
+        return name
+
+    # 完整路径，QLocalServer 不会再拼接临时目录
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(), name)
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+
+
+def decode(line: bytes) -> dict:
+    message = json.loads(line.decode("utf-8"))
+    if not isinstance(message, dict):
+        raise ValueError("message is not a JSON object")
+
+    return message
+
+
+def _connect(name, timeout):
+    """ binary file object connected to the server """
+    if sys.platform == "win32":
+        try:
+            return open(rf"\\.\pipe\{name}", "r+b", buffering=0)
+        except FileNotFoundError as e:
+            raise InstanceNotRunning(name) from e
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(name)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        sock.close()
+        raise InstanceNotRunning(name) from e
+
+    # makefile 持有套接字的引用，关闭文件后才真正关闭
+    f = sock.makefile("rwb", buffering=0)
+    sock.close()
+    return f
+
+
+def request(command: str, args: dict = None, name: str = None, timeout=DEFAULT_TIMEOUT) -> dict:
+    """ send a command to the running instance and return its reply
+
+    Parameters
+    ----------
+    command: str
+        command name, e.g. `show` or `login`
+
+    args: dict
+        arguments of the command
+
+    name: str
+        server name, `serverName()` by default
+
+    timeout: float
+        seconds to wait for the connection and the reply
+
+    Raises
+    ------
+    InstanceNotRunning
+        if no instance is listening
+
+    OSError, ValueError
+        if the connection fails or the reply is malformed
+    """
+    with _connect(name or serverName(), timeout) as f:
+        f.write(encode({"command": command, "args": args or {}}))
+        reply = f.readline(MAX_MESSAGE)
+
+    if not reply.endswith(b"\n"):
+        raise ConnectionError("connection closed before the reply")
+
+    return decode(reply)
+
+
+def isRunning(name: str = None, timeout=DEFAULT_TIMEOUT) -> bool:
+    """ whether an instance listens on the local socket
+
+    An instance which accepts the connection but is too busy to reply in
+    time, e.g. while building its window, still counts as running.
+    """
+    try:
+        request("ping", name=name, timeout=timeout)
+    except InstanceNotRunning:
+        return False
+    except (OSError, ValueError):
+        pass
+
+    return True
@@ -0,0 +1,118 @@
+# coding: utf-8
+"""
+Keep-alive of the portal session.
+
+The portal drops a session after it has been idle for some time. Every
+time the session is found expired, the time from the last request which
+refreshed it (a login or a heartbeat) to the last probe which still saw it
+online is a lower bound of that idle timeout, and the time to the probe
+which saw it offline is an upper bound. `IdleTimeoutEstimator` keeps the
+lower bounds of the recent expiries and schedules the next heartbeat a safety
+margin before the largest lower bound, so heartbeats stay below the
+timeout while sending as few requests as possible.
+"""
+import time
+from collections import deque
+
+
+HEARTBEAT_KINDS = ("head", "identity", "devices")
+
+
+class IdleTimeoutEstimator:
+    """ Learn the idle timeout of the portal and schedule heartbeats
+
+    Parameters
+    ----------
+    default: float
+        heartbeat interval in seconds until an expiry has been observed
+
+    fixed: float
+        heartbeat interval in seconds which overrides the learned one, `None` to learn
+
+    minimum, maximum: float
+        bounds of the heartbeat interval, an expiry sooner than `minimum`
+        after the last refresh is not counted as idle timeout
+
+    margin: float
+        fraction of the learned timeout at which the heartbeat is sent
+
+    samples: int
+        number of recent expiries kept
+
+    clock: callable
+        monotonic clock in seconds
+    """
+
+    def __init__(self, default=600.0, fixed=None, minimum=30.0, maximum=3600.0, margin=0.8, samples=8,
+                 clock=time.monotonic):
+        self.default = default
+        self.fixed = fixed
+        self.minimum = minimum
+        self.maximum = maximum
+        self.margin = margin
+        self.clock = clock
+
+        self.lowers = deque(maxlen=samples)
+        self.lastActivity = None    # 最近一次刷新会话的时间，None 表示没有会话
+        self.lastOnline = None
+
+    def activity(self):
+        """ the session was refreshed by a login or a heartbeat """
+        self.lastActivity = self.clock()
+
+    def online(self):
+        """ a probe saw the session online """
+        now = self.clock()
+        self.lastOnline = now
+        if self.lastActivity is None:
+            # 启动时会话已经在线，不知道上次刷新的时间，按现在计算更保守
+            self.lastActivity = now
+
+    def offline(self):
+        """ a probe saw the session offline
+
+        Returns
+        -------
+        bounds: tuple
+            `(lower, upper)` seconds since the last refresh if this is a new
+            idle expiry, otherwise `None`
+        """
+        now = self.clock()
+        lastActivity, self.lastActivity = self.lastActivity, None
+        if lastActivity is None or self.lastOnline is None or self.lastOnline < lastActivity:
+            return None
+
+        lower, upper = self.lastOnline - lastActivity, now - lastActivity
+        if lower < self.minimum:
+            return None
+
+        self.lowers.append(lower)
+        return lower, upper
+
+    def restore(self, timeout: float):
+        """ seed the estimate with the timeout learned by a previous run """
+        if timeout and timeout >= self.minimum:
+            self.lowers.append(timeout)
+
+    @property
+    def timeout(self):
+        """ largest lower bound of the idle timeout, `None` until an expiry has been observed """
+        return max(self.lowers) if self.lowers else None
+
+    def interval(self) -> float:
+        """ seconds between two heartbeats """
+        if self.fixed:
+            return self.fixed
+
+        if not self.lowers:
+            return min(max(self.default, self.minimum), self.maximum)
+
+        # 最大的下界仍小于真实的超时，取其一部分作为余量
+        return min(max(self.margin * self.timeout, self.minimum), self.maximum)
+
+    def due(self):
+        """ seconds until the next heartbeat, `None` without a session """
+        if self.lastActivity is None:
+            return None
+
+        return max(0.0, self.lastActivity + self.interval() - self.clock())
@@ -0,0 +1,153 @@
+# coding: utf-8
+"""
+Logging pipeline of the application.
+
+Records are rate limited once per call in a loguru patcher, then written by
+enqueued sinks, so the GUI and worker threads only pay for the patcher and a
+queue put. The file sink writes one JSON record per line and rotates by size.
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+from loguru import logger
+
+
+DEFAULT_LOG_PATH = os.path.join(os.path.expanduser("~"), "ouc_net_logs", "ouc_net.log")
+
+# 口令类字段的值在写出前替换掉，覆盖 key=value、"key": "value" 与URL参数
+SECRET_PATTERN = re.compile(
+    r"""(?i)((?:user_)?pass(?:word)?|passwd|pwd|upass|secret|token|cookie)(["']?\s*[:=]\s*["']?)([^\s&"',;}]+)""")
+REDACTED = "***"
+SECRET_KEYS = ("password", "passwd", "pwd", "secret", "token", "cookie")
+
+
+def redact(text: str) -> str:
+    """ replace the values of secret fields in the text """
+    return SECRET_PATTERN.sub(lambda m: m.group(1) + m.group(2) + REDACTED, text)
+
+
+class LogRateLimiter:
+    """ Per-key deduplication and rate limiting of log records
+
+    The key of a record is `extra["key"]` if given, otherwise its source
+    location. Within `interval` seconds a key may emit `burst` distinct
+    messages below WARNING, repeats of the last message are dropped at every
+    level. The first record let through after drops carries the number of
+    dropped records in `extra["suppressed"]`.
+
+    Parameters
+    ----------
+    interval: float
+        length of the rate limit window in seconds
+
+    burst: int
+        distinct messages of one key allowed per window
+
+    clock: callable
+        monotonic clock in seconds
+    """
+
+    WARNING_NO = 30
+
+    def __init__(self, interval=60.0, burst=5, clock=time.monotonic):
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.states = {}    # key -> [window start, emitted, last message, suppressed]
+
+    def allow(self, record) -> bool:
+        key = record["extra"].get("key") or (record["file"].path, record["line"])
+        message = record["message"]
+        now = self.clock()
+
+        with self.lock:
+            state = self.states.get(key)
+            if state is None or now - state[0] >= self.interval:
+                suppressed = state[3] if state else 0
+                self.states[key] = [now, 1, message, 0]
+            elif message == state[2] or (state[1] >= self.burst and record["level"].no < self.WARNING_NO):
+                state[3] += 1
+                return False
+            else:
+                suppressed = state[3]
+                state[1] += 1
+                state[2] = message
+                state[3] = 0
+
+        if suppressed:
+            record["extra"]["suppressed"] = suppressed
+
+        return True
+
+    def patch(self, record):
+        """ loguru patcher, runs once per record before the sinks """
+        if not self.allow(record):
+            record["extra"]["dropped"] = True
+            return
+
+        if SECRET_PATTERN.search(record["message"]):
+            record["message"] = redact(record["message"])
+
+        for name, value in record["extra"].items():
+            if isinstance(value, str) and any(secret in name.lower() for secret in SECRET_KEYS):
+                record["extra"][name] = REDACTED
+
+
+def _keep(record):
+    return not record["extra"].get("dropped")
+
+
+def _consoleFormat(record):
+    suffix = " <dim>(suppressed {extra[suppressed]} similar)</dim>" if "suppressed" in record["extra"] else ""
+    return ("<green>{time:HH:mm:ss.SSS}</green> | <level>{level: <7}</level> | "
+            "<cyan>{name}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>" + suffix + "\n{exception}")
+
+
+def setupLogging(path=DEFAULT_LOG_PATH, level="INFO", maxSize=5, retention=5, interval=60.0, burst=5,
+                 console=True):
+    """ replace the default synchronous sink with the logging pipeline
+
+    Parameters
+    ----------
+    path: str
+        path of the JSON log file, `None` disables the file sink
+
+    level: str
+        minimum level of both sinks
+
+    maxSize: int
+        size of a log file in MB before it is rotated
+
+    retention: int
+        number of rotated files kept
+
+    interval, burst:
+        see `LogRateLimiter`
+
+    console: bool
+        whether to also log to stderr
+
+    Returns
+    -------
+    limiter: LogRateLimiter
+        the rate limiter of the pipeline
+    """
+    limiter = LogRateLimiter(interval, burst)
+    logger.remove()
+    logger.configure(patcher=limiter.patch)
+
+    if console and sys.stderr is not None:
+        logger.add(sys.stderr, level=level, format=_consoleFormat, filter=_keep, enqueue=True,
+                   backtrace=False, diagnose=False)
+
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger.add(path, level=level, filter=_keep, enqueue=True, serialize=True,
+                   rotation=f"{maxSize} MB", retention=retention, encoding="utf-8",
+                   backtrace=False, diagnose=False)
+
+    return limiter
@@ -0,0 +1,271 @@
+# coding: utf-8
+"""
+Prediction of forced logouts.
+
+Some portals drop every session at fixed times, e.g. when the daily quota
+is reset or at midnight. The transitions between online and offline are
+recorded, and logouts which recur at the same time of day, on the same
+weekday of several weeks or on several days, become patterns.
+`LogoutPredictor.nextWindow` gives the next time span in which such a
+logout is expected, so the session can be watched closely and logged in
+again at once.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, time as dtime
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~"), "net_transitions.db")
+DAY = 86400
+
+
+def _midnight(day) -> float:
+    """ timestamp of the local midnight starting the date """
+    return datetime.combine(day, dtime()).timestamp()
+
+
+class TransitionLog:
+    """ SQLite backed log of the transitions between online and offline
+
+    Parameters
+    ----------
+    path: str
+        path of the database file, `:memory:` for a log which is not kept
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS transitions (
+                at REAL NOT NULL,
+                online INTEGER NOT NULL,
+                since REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_transitions_at ON transitions(at)")
+
+    def record(self, online: bool, at: float, since: float = None):
+        """ the session was found online or offline at `at`, and last seen in the other state at `since` """
+        with self.lock:
+            self.conn.execute("INSERT INTO transitions (at, online, since) VALUES (?, ?, ?)", (at, int(online), since))
+
+    def logouts(self, after: float = 0) -> list:
+        """ `(since, at)` of the transitions to offline after a time, oldest first """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT since, at FROM transitions WHERE online = 0 AND since IS NOT NULL AND at > ? ORDER BY at",
+                (after,)).fetchall()
+
+    def prune(self, before: float):
+        """ forget the transitions before a time """
+        with self.lock:
+            self.conn.execute("DELETE FROM transitions WHERE at < ?", (before,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class LogoutPattern:
+    """ Logouts recurring at the same time of day
+
+    Parameters
+    ----------
+    weekday: int
+        0 for Monday, `None` for every day
+
+    start, end: float
+        seconds from midnight of the window in which the logout is expected,
+        may lie on the day before or after
+
+    days: int
+        number of days the logout was seen
+    """
+
+    def __init__(self, weekday, start: float, end: float, days: int):
+        self.weekday = weekday
+        self.start = start
+        self.end = end
+        self.days = days
+
+    def __repr__(self):
+        day = "daily" if self.weekday is None else f"weekday {self.weekday}"
+        return f"LogoutPattern({day}, {self.start:.0f}-{self.end:.0f} s, {self.days} days)"
+
+
+class LogoutPredictor:
+    """ Learn the recurring forced logouts from the transitions
+
+    Parameters
+    ----------
+    log: TransitionLog
+        persistent log of the transitions
+
+    history: float
+        days of transitions considered
+
+    tolerance: float
+        seconds between two logouts counted as the same time of day
+
+    weekly: int
+        logouts on the same weekday, each in another week, which make a pattern of that weekday
+
+    daily: int
+        logouts on distinct days which make a pattern of every day
+
+    coverage: float
+        share of the days, or of the weeks for a weekday, from the first to the last logout of a
+        pattern on which it was seen, so that scattered drops at a similar time are not a pattern
+
+    uncertainty: float
+        logouts whose time is known less precisely are ignored, e.g. those found after a sleep
+
+    lead: float
+        seconds the window opens before the earliest logout of a pattern and closes after the latest
+
+    clock: callable
+        wall clock in seconds
+    """
+
+    def __init__(self, log: TransitionLog, history=56, tolerance=120.0, weekly=2, daily=3, coverage=0.5,
+                 uncertainty=120.0, lead=60.0, clock=time.time):
+        self.log = log
+        self.history = history
+        self.tolerance = tolerance
+        self.weekly = weekly
+        self.daily = daily
+        self.coverage = coverage
+        self.uncertainty = uncertainty
+        self.lead = lead
+        self.clock = clock
+
+        self.online = None
+        self.lastSeen = None    # 上一次探测的时间
+        self._patterns = None
+
+        self.log.prune(self.clock() - self.history * DAY)
+        logouts = self.log.logouts()
+        self.lastLogout = tuple(logouts[-1]) if logouts else None
+
+    def observe(self, online: bool):
+        """ feed a probe result
+
+        Returns
+        -------
+        bounds: tuple
+            `(lower, upper)` timestamps of a newly recorded logout, otherwise `None`
+        """
+        now = self.clock()
+        previous, self.online = self.online, online
+        lastSeen, self.lastSeen = self.lastSeen, now
+        if previous is None or previous == online:
+            return None
+
+        if online:
+            self.log.record(True, now, lastSeen)
+            return None
+
+        return self.recordLogout(lastSeen, now)
+
+    def recordLogout(self, lower: float, upper: float):
+        """ the session was dropped between two timestamps, e.g. found by the watch of a window
+
+        A logout overlapping the previous one, found again by another probe, is not recorded twice.
+        """
+        if self.lastLogout is not None:
+            lastLower, lastUpper = self.lastLogout
+            if lower <= lastUpper + self.tolerance and upper >= lastLower - self.tolerance:
+                return None
+
+        self.log.record(False, upper, lower)
+        self.lastLogout = (lower, upper)
+        self._patterns = None
+        return lower, upper
+
+    def patterns(self) -> list:
+        """ the learned `LogoutPattern`s """
+        if self._patterns is None:
+            self._patterns = self._learn()
+
+        return self._patterns
+
+    def _learn(self):
+        events = []     # (日期, 距当天零点的下界, 上界)
+        for lower, upper in self.log.logouts(self.clock() - self.history * DAY):
+            if upper - lower > self.uncertainty:
+                continue
+
+            day = datetime.fromtimestamp((lower + upper) / 2).date()
+            midnight = _midnight(day)
+            events.append((day, lower - midnight, upper - midnight))
+
+        patterns = [LogoutPattern(None, *cluster) for cluster in self._cluster(events, self.daily, 1)]
+        for weekday in range(7):
+            sameDay = [event for event in events if event[0].weekday() == weekday]
+            patterns += [LogoutPattern(weekday, *cluster) for cluster in self._cluster(sameDay, self.weekly, 7)]
+
+        return patterns
+
+    def _cluster(self, events, minimum, period):
+        """ `(start, end, days)` of the groups of logouts at the same time of day seen on `minimum`
+        days, which recur in most periods of `period` days between the first and the last one """
+        middle = lambda event: (event[1] + event[2]) / 2
+        clusters = []
+        for event in sorted(events, key=middle):
+            if clusters and middle(event) - middle(clusters[-1][-1]) <= self.tolerance:
+                clusters[-1].append(event)
+            else:
+                clusters.append([event])
+
+        # 零点前后的登出属于同一时刻，归入第二天
+        if len(clusters) > 1 and middle(clusters[0][0]) + DAY - middle(clusters[-1][-1]) <= self.tolerance:
+            last = clusters.pop()
+            clusters[0] = [(day + timedelta(days=1), lower - DAY, upper - DAY) for day, lower, upper in last] \
+                + clusters[0]
+
+        result = []
+        for cluster in clusters:
+            dates = {day for day, _, _ in cluster}
+            days = len(dates)
+            periods = (max(dates) - min(dates)).days // period + 1
+            if days >= minimum and days >= self.coverage * periods:
+                start = min(lower for _, lower, _ in cluster) - self.lead
+                end = max(upper for _, _, upper in cluster) + self.lead
+                result.append((start, end, days))
+
+        return result
+
+    def nextWindow(self, now: float = None):
+        """ `(start, end)` timestamps of the current or next window of an expected logout in a week, or `None` """
+        patterns = self.patterns()
+        if not patterns:
+            return None
+
+        now = self.clock() if now is None else now
+        today = datetime.fromtimestamp(now).date()
+        windows = []
+        for offset in range(-1, 8):
+            day = today + timedelta(days=offset)
+            midnight = _midnight(day)
+            for pattern in patterns:
+                if pattern.weekday is None or pattern.weekday == day.weekday():
+                    if midnight + pattern.end > now:
+                        windows.append((midnight + pattern.start, midnight + pattern.end))
+
+        if not windows:
+            return None
+
+        # 重叠的窗口合并为一个
+        windows.sort()
+        start, end = windows[0]
+        for nextStart, nextEnd in windows[1:]:
+            if nextStart > end:
+                break
+            end = max(end, nextEnd)
+
+        return start, end
@@ -0,0 +1,381 @@
+# coding: utf-8
+"""
+Runtime metrics served in the Prometheus text format.
+
+Counters and histograms are updated on per-thread cells, so worker threads
+never contend on a lock after the first update of a label set. A scrape sums
+the cells of every thread.
+"""
+import sys
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+from .rate_limit import portalLimiter
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _formatValue(value):
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _formatLabels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """ Base class of metrics
+
+    Parameters
+    ----------
+    name: str
+        metric name, e.g. `ouc_net_portal_requests_total`
+
+    help: str
+        description shown in the exposition
+
+    labels: tuple
+        label names, the values are passed as keyword arguments when updating
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels[n]) for n in self.labelNames)
+
+    def samples(self):
+        """ yield `(suffix, label values, extra labels, value)` """
+        raise NotImplementedError
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_formatLabels(self.labelNames, values, extra)} {_formatValue(value)}")
+
+        return lines
+
+
+class _ThreadCells:
+    """ One cell per (label values, thread), only the owning thread writes a cell
+
+    Every refresh runs on a new thread, so the cells of finished threads are
+    folded into one retired cell per label set instead of piling up.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.cells = {}     # (label values, thread id) -> cell
+        self.lock = threading.Lock()
+        self.compactAt = 64
+
+    def get(self, key):
+        cellKey = (key, threading.get_ident())
+        cell = self.cells.get(cellKey)
+        if cell is None:
+            with self.lock:
+                cell = self.cells.setdefault(cellKey, self.factory())
+                if len(self.cells) > self.compactAt:
+                    self._compact()
+
+        return cell
+
+    def _compact(self):
+        # 不在运行 Python 代码的线程不会再写它的格子，可以安全合并
+        alive = sys._current_frames().keys()
+        for cellKey, cell in list(self.cells.items()):
+            key, ident = cellKey
+            if ident is None or ident in alive:
+                continue
+
+            retired = self.cells.setdefault((key, None), [0] * len(cell))
+            for i, value in enumerate(cell):
+                retired[i] += value
+            del self.cells[cellKey]
+
+        self.compactAt = max(64, 2 * len(self.cells))
+
+    def items(self):
+        with self.lock:
+            return list(self.cells.items())
+
+
+class Counter(Metric):
+    """ Monotonically increasing counter """
+
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.cells = _ThreadCells(lambda: [0])
+
+    def inc(self, amount=1, **labels):
+        self.cells.get(self._key(labels))[0] += amount
+
+    def value(self, **labels):
+        key = self._key(labels)
+        return sum(cell[0] for (k, _), cell in self.cells.items() if k == key)
+
+    def samples(self):
+        totals = {}
+        for (key, _), cell in self.cells.items():
+            totals[key] = totals.get(key, 0) + cell[0]
+
+        for key, value in sorted(totals.items()):
+            yield "", key, (), value
+
+
+class Gauge(Metric):
+    """ Value which can go up and down, the last `set` wins """
+
+    type = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+
+        for key, value in values:
+            yield "", key, (), value
+
+
+class CollectedCounter(Gauge):
+    """ Counter whose totals are kept elsewhere, a collector copies them with `set` before every scrape """
+
+    type = "counter"
+
+
+class Histogram(Metric):
+    """ Histogram with fixed bucket upper bounds
+
+    Parameters
+    ----------
+    buckets: tuple
+        sorted upper bounds, `+Inf` is added automatically
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        n = len(self.buckets) + 1
+        # [每个桶的计数..., 总和, 样本数]
+        self.cells = _ThreadCells(lambda: [0] * n + [0.0, 0])
+
+    def observe(self, value, **labels):
+        cell = self.cells.get(self._key(labels))
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def count(self, **labels):
+        key = self._key(labels)
+        return sum(cell[-1] for (k, _), cell in self.cells.items() if k == key)
+
+    def samples(self):
+        totals = {}
+        for (key, _), cell in self.cells.items():
+            total = totals.setdefault(key, [0] * len(cell))
+            for i, v in enumerate(cell):
+                total[i] += v
+
+        bounds = self.buckets + (float("inf"),)
+        for key, total in sorted(totals.items()):
+            cumulative = 0
+            for bound, n in zip(bounds, total):
+                cumulative += n
+                yield "_bucket", key, (("le", _formatValue(bound)),), cumulative
+            yield "_sum", key, (), total[-2]
+            yield "_count", key, (), total[-1]
+
+
+class MetricsRegistry:
+    """ Registry of the metrics of the application
+
+    Metrics are created once by name, asking again returns the same object.
+    Collectors registered with `addCollector` run before every scrape, e.g.
+    to copy statistics kept elsewhere into gauges or collected counters.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}")
+
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def collectedCounter(self, name, help, labels=()) -> CollectedCounter:
+        return self._get(CollectedCounter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def addCollector(self, collector):
+        """ register a callable run before every scrape """
+        self.collectors.append(collector)
+
+    def expose(self) -> str:
+        """ all metrics in the Prometheus text format """
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.server.registry.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """ Serve `/metrics` of a registry, bound to localhost by default """
+
+    daemon_threads = True
+
+    def __init__(self, registry: MetricsRegistry, port=9108, host="127.0.0.1"):
+        super().__init__((host, port), MetricsHandler)
+        self.registry = registry
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+        logger.info(f"Serving metrics on http://{self.server_address[0]}:{self.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+metrics = MetricsRegistry()
+
+# 门户请求
+portalRequests = metrics.counter(
+    "ouc_net_portal_requests_total", "Portal requests by endpoint and HTTP status", ("endpoint", "code"))
+portalLatency = metrics.histogram(
+    "ouc_net_portal_request_seconds", "Latency of portal requests", ("endpoint",))
+loginAttempts = metrics.counter("ouc_net_login_attempts_total", "Login attempts")
+loginSuccesses = metrics.counter("ouc_net_login_successes_total", "Successful logins")
+loginLatency = metrics.histogram("ouc_net_login_seconds", "Latency of login attempts")
+
+# 网络探测与刷新
+probeRtt = metrics.histogram("ouc_net_probe_rtt_seconds", "Round trip time of reachability probes", ("target",))
+probes = metrics.counter("ouc_net_probes_total", "Reachability probes by target and result", ("target", "result"))
+refreshDuration = metrics.histogram("ouc_net_refresh_seconds", "Duration of network info refresh cycles")
+refreshes = metrics.counter("ouc_net_refreshes_total", "Network info refresh cycles by result", ("result",))
+networkOnline = metrics.gauge("ouc_net_online", "Whether the campus network is reachable")
+offlineSeconds = metrics.counter("ouc_net_offline_seconds_total", "Time spent offline")
+
+# 会话保活
+heartbeats = metrics.counter("ouc_net_heartbeats_total", "Keep-alive requests by kind and result", ("kind", "result"))
+sessionExpiries = metrics.counter("ouc_net_session_expiries_total", "Sessions found expired after being idle")
+heartbeatInterval = metrics.gauge("ouc_net_heartbeat_interval_seconds", "Current interval between keep-alive requests")
+
+# 账号健康检查
+accountStates = metrics.gauge("ouc_net_accounts", "Saved accounts by health state", ("state",))
+loginFailovers = metrics.counter("ouc_net_login_failovers_total", "Auto logins moved on to another account")
+
+# 在线设备管理
+deviceActions = metrics.counter(
+    "ouc_net_device_actions_total", "Unbind and kick requests of online sessions by result", ("action", "result"))
+
+# 预测的强制下线
+logoutWindows = metrics.counter("ouc_net_logout_windows_total", "Watched windows of predicted forced logouts")
+prelogins = metrics.counter("ouc_net_prelogins_total", "Logins after a forced logout found in a window", ("result",))
+preloginDowntime = metrics.histogram(
+    "ouc_net_prelogin_downtime_seconds", "Time from the last online check to the login after a forced logout")
+
+# 信号总线上的网络事件，发出与交付次数之差即合并掉的跨线程调用
+busEvents = metrics.counter(
+    "ouc_net_bus_events_total", "Network events on the signal bus emitted and delivered per subscriber",
+    ("event", "outcome"))
+
+# 限流器统计，抓取时从 portalLimiter 复制累计值
+rateLimiterRequests = metrics.collectedCounter(
+    "ouc_net_ratelimit_requests_total", "Portal rate limiter decisions by endpoint class and outcome",
+    ("endpoint", "outcome"))
+rateLimiterDelay = metrics.collectedCounter(
+    "ouc_net_ratelimit_delay_seconds_total", "Time requests waited for a token by endpoint class", ("endpoint",))
+
+
+def _collectRateLimiter():
+    for endpoint, stats in portalLimiter.stats().items():
+        for outcome in ("requests", "granted", "delayed", "dropped"):
+            rateLimiterRequests.set(stats[outcome], endpoint=endpoint, outcome=outcome)
+        rateLimiterDelay.set(stats["delay_seconds"], endpoint=endpoint)
+
+
+metrics.addCollector(_collectRateLimiter)
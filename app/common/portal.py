@@ -0,0 +1,414 @@
+# coding: utf-8
+import base64
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from loguru import logger
+
+from .rate_limit import portalLimiter, RateLimitedError
+from .metrics import (portalRequests, portalLatency, loginAttempts, loginSuccesses, loginLatency, heartbeats,
+                      deviceActions)
+from .portal_profile import PortalProfile, defaultProfile
+
+
+# loadOnlineRecord 每页的记录数和最多查询的页数
+DEVICE_PAGE_SIZE = 50
+DEVICE_MAX_PAGES = 4
+DEVICE_ACTIONS = ("unbind", "kick")
+
+
+class SourceAddressAdapter(HTTPAdapter):
+    """ HTTP adapter which binds every connection to a local source address """
+
+    def __init__(self, source_address: str, **kwargs):
+        self.source_address = (source_address, 0)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['source_address'] = self.source_address
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['source_address'] = self.source_address
+        return super().proxy_manager_for(*args, **kwargs)
+
+
+# 回调名由门户配置决定，如 dr1003
+JSONP_PATTERN = re.compile(r"^\s*[\w$.]+\(|\);?\s*$")
+
+
+# 部分版本的失败消息经过 base64 编码，如 dXNlcmlkIGVycm9yMQ== 即 userid error1
+BASE64_MESSAGE = re.compile(r"^(?:[A-Za-z0-9+/]{4})+(?:[A-Za-z0-9+/]{2}==|[A-Za-z0-9+/]{3}=)?$")
+
+
+def decode_message(msg: str) -> str:
+    """ message of a reply, decoded if the portal sent it in base64 """
+    if not msg or not BASE64_MESSAGE.match(msg):
+        return msg
+
+    try:
+        decoded = base64.b64decode(msg).decode("utf-8")
+    except ValueError:
+        return msg
+
+    return decoded if decoded.isprintable() else msg
+
+
+def parse_jsonp(text: str) -> dict:
+    """ parse Dr.COM JSONP reply, e.g. `dr1003({...});` """
+    return json.loads(JSONP_PATTERN.sub("", text))
+
+
+class PortalClient:
+    """ Dr.COM ePortal client
+
+    Parameters
+    ----------
+    source_address: str
+        local IPv4 address the requests are sent from, `None` lets the OS choose the route
+
+    portal_url: str
+        url of the page which reports the uid and IPv4 of the current session, from the profile by default
+
+    eportal_url: str
+        base url of the ePortal api, from the profile by default
+
+    timeout: float
+        timeout of every request in seconds
+
+    deadline: float
+        `time.monotonic()` by which all requests of the client have to finish,
+        each request gets at most the time left. `None` for no total budget
+
+    limiter: PortalRateLimiter
+        rate limiter shared by the clients, `None` disables rate limiting
+
+    profile: PortalProfile
+        endpoints of the portal, `defaultProfile()` by default
+    """
+
+    def __init__(self, source_address: str = None, portal_url=None, eportal_url=None, timeout=5,
+                 limiter=portalLimiter, profile: PortalProfile = None, deadline: float = None):
+        self.source_address = source_address
+        self.profile = profile or defaultProfile()
+        self.portal_url = portal_url or self.profile.portal_url
+        self.eportal_url = eportal_url or self.profile.eportal_url
+        self.timeout = timeout
+        self.deadline = deadline
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        if source_address:
+            adapter = SourceAddressAdapter(source_address)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+    @property
+    def userIP(self):
+        """ IPv4 reported to the portal as `wlan_user_ip` """
+        return self.source_address or "0.0.0.0"
+
+    def get(self, url, endpoint: str, method="GET"):
+        """ send request to the portal
+
+        Parameters
+        ----------
+        url: str
+            the request url
+
+        endpoint: str
+            rate limit class of the request: `identity`, `devices`, `login`, `logout` or `health`
+
+        method: str
+            HTTP method of the request
+        """
+        if self.limiter and not self.limiter.acquire(endpoint):
+            portalRequests.inc(endpoint=endpoint, code="limited")
+            raise RateLimitedError(f"{endpoint} request dropped by the rate limiter")
+
+        timeout = self.timeout
+        if self.deadline is not None:
+            timeout = min(timeout, self.deadline - time.monotonic())
+            if timeout <= 0:
+                portalRequests.inc(endpoint=endpoint, code="error")
+                raise requests.Timeout(f"{endpoint} request timed out: deadline exceeded")
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=timeout)
+        except Exception:
+            portalRequests.inc(endpoint=endpoint, code="error")
+            raise
+        finally:
+            portalLatency.observe(time.perf_counter() - start, endpoint=endpoint)
+
+        portalRequests.inc(endpoint=endpoint, code=response.status_code)
+        return response
+
+    def getDrcomUrl(self, type=None, uid=None, **values):
+        """ url of an endpoint of the profile, `id` is the portal page, `ip` defaults to the source address """
+        if type == "id":
+            return self.portal_url
+
+        values.setdefault("ip", self.userIP)
+        return self.profile.url(type, self.eportal_url, uid=uid, **values)
+
+    def fetchUserID(self, strict=False):
+        """ get uid and IPv4 of the current session from the portal page
+
+        With `strict` an unexpected status raises `requests.HTTPError` instead of
+        returning `None`s, so a page without a session can be told from a failed request.
+        """
+        uid = None
+        v4ip = None
+
+        response = self.get(self.getDrcomUrl("id"), "identity")
+        if strict and response.status_code != 200:
+            raise requests.HTTPError(f"portal page returned {response.status_code}", response=response)
+
+        if response.status_code == 200:
+            soup = BeautifulSoup(response.text, 'html.parser')
+
+            # 在页面脚本中按配置的正则提取 uid 和 v4ip
+            found = self.profile.parseIdentity(script.string or '' for script in soup.find_all('script'))
+            uid = found.get("uid")
+            v4ip = found.get("v4ip")
+
+        return uid, v4ip
+
+    def fetchDevices(self, uid=None, pageSize=DEVICE_PAGE_SIZE, maxPages=DEVICE_MAX_PAGES, endpoint="devices"):
+        """ get online records of the account, page by page until a page is not full
+
+        `endpoint` is the rate limit class of the pages, e.g. `health` for background checks
+        """
+        if uid is None:
+            uid, _ = self.fetchUserID()
+
+        records = []
+        for page in range(maxPages):
+            start = page * pageSize + 1
+            response = self.get(self.getDrcomUrl("devices", uid, start=start, end=start + pageSize - 1), endpoint)
+            if response.status_code != 200:
+                break
+
+            batch = parse_jsonp(response.text).get('records', [])
+            records.extend(batch)
+            if len(batch) < pageSize:
+                break
+
+        return records
+
+    def login(self, uid, password):
+        """ log in the account from the source address
+
+        Returns
+        -------
+        result: dict
+            `success`, `msg`, `code` (http status) and `elapsed` (seconds) of the attempt
+        """
+        url = self.getDrcomUrl("login", uid, password=password)
+        loginAttempts.inc()
+        result = self._send(url, "login")
+        # 连接错误的消息包含请求地址，其中的密码不能写入日志
+        query = url.partition("?")[2]
+        if query and query in result["msg"]:
+            result["msg"] = result["msg"].replace(query, "...")
+        loginLatency.observe(result["elapsed"])
+        if result["success"]:
+            loginSuccesses.inc()
+
+        return result
+
+    def logout(self):
+        """ log out the session of the source address """
+        return self._send(self.getDrcomUrl("logout"), "logout")
+
+    def unbind(self, uid, mac, ip=None):
+        """ unbind the MAC address of a device from the account, which also ends its session """
+        return self._send(self.getDrcomUrl("bind", uid, mac=mac or "000000000000", ip=ip or self.userIP), "logout")
+
+    def kick(self, ip):
+        """ log out the session of another IPv4, e.g. a stale device of the account """
+        return self._send(self.getDrcomUrl("logout", ip=ip), "logout")
+
+    def heartbeat(self, kind="head", uid=None):
+        """ send a cheap request which refreshes the idle timer of the session
+
+        Parameters
+        ----------
+        kind: str
+            `head` for a HEAD of the portal page, `identity` for a GET of it,
+            `devices` for the online records of the account
+
+        uid: str
+            account of the `devices` request, looked up on the portal page if `None`
+        """
+        start = time.perf_counter()
+        result = {"source": self.userIP, "success": False, "msg": "", "code": None}
+        try:
+            if kind == "devices":
+                response = self.get(
+                    self.getDrcomUrl("devices", uid or self.fetchUserID()[0], start=1, end=1), "devices")
+            else:
+                response = self.get(self.portal_url, "identity", "HEAD" if kind == "head" else "GET")
+            result["code"] = response.status_code
+            result["success"] = response.status_code < 400
+        except Exception as e:
+            result["msg"] = str(e)
+
+        result["elapsed"] = time.perf_counter() - start
+        heartbeats.inc(kind=kind, result="ok" if result["success"] else "fail")
+        return result
+
+    def _send(self, url, endpoint):
+        start = time.perf_counter()
+        result = {"source": self.userIP, "success": False, "msg": "", "code": None}
+        try:
+            response = self.get(url, endpoint)
+            result["code"] = response.status_code
+            if response.status_code == 200:
+                reply = parse_jsonp(response.text)
+                result["msg"] = decode_message(str(reply.get("msg", "")))
+                # 默认配置中 ret_code 2 表示该账号已经在线，也算成功
+                result["success"] = self.profile.isSuccess(reply)
+        except Exception as e:
+            result["msg"] = str(e)
+
+        result["elapsed"] = time.perf_counter() - start
+        return result
+
+
+def forEachInterface(sources: dict, action, **kwargs):
+    """ run an action on several interfaces concurrently
+
+    Parameters
+    ----------
+    sources: dict
+        interface name -> local IPv4 address, `None` means the default route
+
+    action: callable
+        called with the `PortalClient` bound to each source address, returns a result dict
+
+    **kwargs:
+        extra arguments passed to `PortalClient`
+
+    Returns
+    -------
+    results: dict
+        interface name -> result of the action
+    """
+    if not sources:
+        return {}
+
+    def run(item):
+        name, address = item
+        result = action(PortalClient(address, **kwargs))
+        result["interface"] = name
+        return name, result
+
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        return dict(executor.map(run, sources.items()))
+
+
+def loginInterfaces(uid, password, sources: dict, **kwargs):
+    """ log in the account on several interfaces concurrently """
+    results = forEachInterface(sources, lambda client: client.login(uid, password), **kwargs)
+    for name, result in results.items():
+        logger.info(f"Login {uid} via {name} ({result['source']}): {result['success']}, {result['msg']}")
+
+    return results
+
+
+def logoutInterfaces(sources: dict, **kwargs):
+    """ log out the sessions of several interfaces concurrently """
+    results = forEachInterface(sources, lambda client: client.logout(), **kwargs)
+    for name, result in results.items():
+        logger.info(f"Logout via {name} ({result['source']}): {result['success']}, {result['msg']}")
+
+    return results
+
+
+def manageDevices(action: str, uid, devices: list, max_workers=8, **kwargs):
+    """ unbind or kick sessions of the account concurrently, then confirm with fresh online records
+
+    Parameters
+    ----------
+    action: str
+        `unbind` to unbind the MAC addresses, `kick` to log out the IPv4s
+
+    uid: str
+        account the sessions belong to
+
+    devices: list
+        online records of the sessions, dicts with `online_ip` and `online_mac`
+
+    max_workers: int
+        maximum number of requests in flight, each worker reuses its own connection
+
+    **kwargs:
+        extra arguments passed to `PortalClient`. The requests go through the shared
+        `portalLimiter` in the `logout` and `devices` classes unless another `limiter` is given
+
+    Returns
+    -------
+    results: list
+        result dict of every device with its `ip` and `mac`, and `confirmed`
+        whether the session is gone from the records fetched afterwards,
+        `None` if they could not be fetched
+    """
+    if action not in DEVICE_ACTIONS:
+        raise ValueError(f"Unknown device action: {action}")
+
+    if not devices:
+        return []
+
+    local = threading.local()
+    clients = []
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = PortalClient(**kwargs)
+            clients.append(local.client)
+        return local.client
+
+    def run(device):
+        ip, mac = device.get("online_ip"), device.get("online_mac")
+        try:
+            result = client().unbind(uid, mac, ip) if action == "unbind" else client().kick(ip)
+        except Exception as e:
+            result = {"source": None, "success": False, "msg": str(e), "code": None}
+
+        result.update(ip=ip, mac=mac)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(devices)))) as executor:
+            results = list(executor.map(run, devices))
+
+        # 重新查询在线记录，确认会话确实已经下线
+        try:
+            remaining = {(record.get("online_ip"), record.get("online_mac")) for record in client().fetchDevices(uid)}
+        except Exception as e:
+            logger.error(f"Error confirming the {action} of {uid}: {e}")
+            remaining = None
+    finally:
+        for c in clients:
+            c.session.close()
+
+    for result in results:
+        result["confirmed"] = None if remaining is None else (result["ip"], result["mac"]) not in remaining
+        outcome = "unconfirmed" if result["success"] and result["confirmed"] is False else \
+            ("ok" if result["success"] else "fail")
+        deviceActions.inc(action=action, result=outcome)
+
+    confirmed = sum(1 for result in results if result["confirmed"])
+    logger.info(f"{action.capitalize()} {len(results)} sessions of {uid}: "
+                f"{sum(1 for result in results if result['success'])} accepted, {confirmed} confirmed")
+    return results
@@ -0,0 +1,189 @@
+# coding: utf-8
+"""
+Declarative description of a Dr.COM ePortal deployment.
+
+A profile is a JSON file with the urls of the portal, the path and ordered
+query parameters of every endpoint (callbacks and version fields included),
+the patterns which find the session on the portal page and the reply
+fields which mean success, optionally with the patterns which tell why a
+login failed. Another deployment is supported by loading
+another profile, see `app/resources/portal/ouc_drcom.json`.
+
+A parameter value is either literal or a single placeholder such as
+`{uid}`, `{password}` or `{ip}`. Templates are compiled once per base url:
+the literal part of the url is encoded and joined ahead of time, so a
+request only encodes its placeholder values.
+"""
+import json
+import os
+import re
+import threading
+from urllib.parse import quote
+
+
+DEFAULT_PROFILE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "portal", "ouc_drcom.json")
+REQUIRED_ENDPOINTS = ("devices", "login", "logout")
+PLACEHOLDER = re.compile(r"^\{(\w+)\}$")
+# 账号、IP 等常见取值无需编码，直接拼接
+UNRESERVED = re.compile(r"[A-Za-z0-9_.~-]*").fullmatch
+
+
+class ProfileError(ValueError):
+    """ The profile file is missing fields or malformed """
+
+
+def _encode(value) -> str:
+    # 密码等参数中的 &、=、+、# 必须编码，否则会截断或篡改查询串
+    value = "" if value is None else str(value)
+    return value if UNRESERVED(value) else quote(value, safe="")
+
+
+class RequestTemplate:
+    """ Url of one endpoint
+
+    Parameters
+    ----------
+    base: str
+        base url the path is appended to
+
+    path: str
+        path of the endpoint
+
+    params: list
+        `(name, value)` pairs in request order, names may repeat
+    """
+
+    def __init__(self, base: str, path: str, params: list):
+        self.chunks = []    # 已编码的固定部分，与占位符交替
+        self.names = []
+        fixed = base.rstrip("/") + path + "?"
+
+        for i, (name, value) in enumerate(params):
+            fixed += ("&" if i else "") + _encode(name) + "="
+            match = PLACEHOLDER.match(str(value))
+            if match:
+                self.chunks.append(fixed)
+                self.names.append(match.group(1))
+                fixed = ""
+            else:
+                fixed += _encode(value)
+
+        self.chunks.append(fixed)
+
+    def render(self, values: dict) -> str:
+        """ url with the placeholders replaced by the encoded values """
+        chunks = self.chunks
+        try:
+            return chunks[0] + "".join(
+                [_encode(values[name]) + chunk for name, chunk in zip(self.names, chunks[1:])])
+        except KeyError as e:
+            raise ProfileError(f"missing value of placeholder {e}") from None
+
+
+class PortalProfile:
+    """ Endpoints and reply conventions of one ePortal deployment
+
+    Parameters
+    ----------
+    data: dict
+        content of the profile file
+
+    path: str
+        file the profile was loaded from, for messages only
+    """
+
+    def __init__(self, data: dict, path: str = None):
+        self.path = path
+        try:
+            self.name = data.get("name", path or "portal")
+            self.portal_url = data["portal_url"]
+            self.eportal_url = data["eportal_url"]
+            self.endpoints = {
+                name: (spec["path"], [(str(k), "" if v is None else str(v)) for k, v in spec["params"]])
+                for name, spec in data["endpoints"].items()
+            }
+            self.identity = {field: re.compile(pattern) for field, pattern in data["identity"].items()}
+            self.success = [(field, str(value)) for field, value in data["success"]]
+            self.failures = [(kind, re.compile(pattern, re.I)) for kind, pattern in data.get("failures", {}).items()]
+        except (KeyError, TypeError, ValueError, re.error) as e:
+            raise ProfileError(f"Invalid portal profile {path or ''}: {e!r}") from None
+
+        missing = [name for name in REQUIRED_ENDPOINTS if name not in self.endpoints]
+        if missing:
+            raise ProfileError(f"Portal profile {self.name} lacks the endpoints {', '.join(missing)}")
+
+        self.templates = {}     # (base url, endpoint) -> RequestTemplate
+        self.lock = threading.Lock()
+
+    def template(self, endpoint: str, base: str = None) -> RequestTemplate:
+        key = (base or self.eportal_url, endpoint)
+        template = self.templates.get(key)
+        if template is None:
+            if endpoint not in self.endpoints:
+                raise ProfileError(f"Portal profile {self.name} has no endpoint {endpoint}")
+
+            path, params = self.endpoints[endpoint]
+            with self.lock:
+                template = self.templates.setdefault(key, RequestTemplate(key[0], path, params))
+
+        return template
+
+    def url(self, endpoint: str, base: str = None, **values) -> str:
+        """ url of the endpoint under `base`, the `eportal_url` of the profile by default """
+        return self.template(endpoint, base).render(values)
+
+    def isSuccess(self, reply: dict) -> bool:
+        """ whether a JSONP reply reports success """
+        return any(str(reply.get(field)) == value for field, value in self.success)
+
+    def classifyFailure(self, msg: str):
+        """ kind of the failure reported by the message of a login, e.g. `credentials` or `quota`, or `None` """
+        for kind, pattern in self.failures:
+            if msg and pattern.search(msg):
+                return kind
+
+        return None
+
+    def parseIdentity(self, texts) -> dict:
+        """ first match of every identity pattern in the texts, e.g. the scripts of the portal page """
+        found = {}
+        for text in texts:
+            for field, pattern in self.identity.items():
+                if field not in found:
+                    match = pattern.search(text)
+                    if match:
+                        found[field] = match.group(1)
+
+            if len(found) == len(self.identity):
+                break
+
+        return found
+
+
+def loadProfile(path: str = DEFAULT_PROFILE_PATH) -> PortalProfile:
+    """ read a profile file """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ProfileError(f"Cannot read portal profile {path}: {e}") from None
+
+    return PortalProfile(data, path)
+
+
+_default = None
+
+
+def defaultProfile() -> PortalProfile:
+    """ profile used by clients created without one, the bundled profile unless set """
+    global _default
+    if _default is None:
+        _default = loadProfile()
+
+    return _default
+
+
+def setDefaultProfile(profile: PortalProfile):
+    global _default
+    _default = profile
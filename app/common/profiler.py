@@ -0,0 +1,273 @@
+# coding: utf-8
+"""
+Opt-in profiling of worker jobs and the Qt event loop.
+
+Enabled by the `OUC_NET_PROFILE` environment variable or `Profile/Enabled`
+in the config. Every session writes to its own directory:
+
+    samples.folded      sampled stacks of every thread, for flamegraph.pl or speedscope
+    jobs/<name>.pstats  cProfile statistics of each kind of worker job
+    slow_events.json    events and queued slots which took more than 16 ms on the GUI thread
+    stalls.json         event loop stalls measured by a heartbeat timer
+
+Threads are named after the running job or, on the GUI thread, after the
+receiver and type of the event being delivered, so slow slots show up as
+their own towers in the flamegraph.
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from PySide6.QtCore import QObject, QTimer
+from PySide6.QtWidgets import QApplication
+
+from loguru import logger
+
+
+PROFILE_ENV = "OUC_NET_PROFILE"
+DEFAULT_PROFILE_DIR = os.path.join(os.path.expanduser("~"), "ouc_net_logs", "profiles")
+SLOW_EVENT_SECONDS = 0.016
+
+
+class SamplingProfiler(threading.Thread):
+    """ Sample the stacks of every thread at a fixed interval
+
+    Parameters
+    ----------
+    interval: float
+        seconds between two samples
+
+    maxDepth: int
+        frames kept from the top of each stack
+    """
+
+    def __init__(self, interval=0.005, maxDepth=64):
+        super().__init__(name="sampling-profiler", daemon=True)
+        self.interval = interval
+        self.maxDepth = maxDepth
+        self.labels = {}        # thread id -> 当前任务或事件
+        self.stacks = {}        # collapsed stack -> samples
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+
+                key = self._collapse(frame, names.get(ident) or f"thread-{ident}", self.labels.get(ident))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+            self.samples += 1
+
+    def _collapse(self, frame, thread, label):
+        frames = []
+        while frame is not None and len(frames) < self.maxDepth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+
+        frames.append(f"[{label}]" if label else "[idle]")
+        frames.append(thread)
+        return ";".join(reversed(frames))
+
+    def stop(self):
+        self.stopped.set()
+        self.join(1)
+
+    def writeCollapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """ Collect profiles of one run of the application
+
+    Parameters
+    ----------
+    directory: str
+        directory of the session output
+
+    interval: float
+        sampling interval in seconds
+
+    slowEvent: float
+        events taking longer than this many seconds on the GUI thread are recorded
+    """
+
+    def __init__(self, directory: str, interval=0.005, slowEvent=SLOW_EVENT_SECONDS):
+        self.directory = directory
+        self.slowEvent = slowEvent
+        self.sampler = SamplingProfiler(interval)
+        self.lock = threading.Lock()
+        self.jobs = {}          # job name -> pstats.Stats
+        self.jobTimes = {}      # job name -> [runs, seconds]
+        self.slowEvents = {}    # receiver.event -> [count, seconds, max seconds]
+        self.stalls = []        # (time since start, seconds)
+        self.started = time.monotonic()
+
+    def start(self):
+        os.makedirs(os.path.join(self.directory, "jobs"), exist_ok=True)
+        self.sampler.start()
+        logger.info(f"Profiling to {self.directory}")
+        return self
+
+    @contextmanager
+    def profileJob(self, name: str):
+        """ run a worker job under cProfile, statistics are merged per job name """
+        ident = threading.get_ident()
+        previous = self.sampler.labels.get(ident)
+        self.sampler.labels[ident] = name
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profile.enable()
+        except ValueError:
+            # 同一线程上嵌套的任务只做采样
+            profile = None
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            self.sampler.labels[ident] = previous
+
+            with self.lock:
+                times = self.jobTimes.setdefault(name, [0, 0.0])
+                times[0] += 1
+                times[1] += elapsed
+                if profile is not None:
+                    if name in self.jobs:
+                        self.jobs[name].add(profile)
+                    else:
+                        self.jobs[name] = pstats.Stats(profile)
+
+    def recordSlowEvent(self, name: str, seconds: float):
+        record = self.slowEvents.setdefault(name, [0, 0.0, 0.0])
+        record[0] += 1
+        record[1] += seconds
+        record[2] = max(record[2], seconds)
+
+    def recordStall(self, seconds: float):
+        self.stalls.append((round(time.monotonic() - self.started, 3), round(seconds, 4)))
+
+    def stop(self):
+        """ stop sampling and write the session output """
+        self.sampler.stop()
+        self.sampler.writeCollapsed(os.path.join(self.directory, "samples.folded"))
+
+        with self.lock:
+            for name, stats in self.jobs.items():
+                stats.dump_stats(os.path.join(self.directory, "jobs", f"{name}.pstats"))
+            jobs = {name: {"runs": n, "seconds": round(t, 4)} for name, (n, t) in self.jobTimes.items()}
+
+        slowEvents = sorted(
+            ({"event": name, "count": n, "seconds": round(t, 4), "max": round(m, 4)}
+             for name, (n, t, m) in self.slowEvents.items()),
+            key=lambda e: e["seconds"], reverse=True)
+        stalls = sorted(s for _, s in self.stalls)
+
+        with open(os.path.join(self.directory, "slow_events.json"), "w", encoding="utf-8") as f:
+            json.dump({"threshold": self.slowEvent, "jobs": jobs, "events": slowEvents}, f, indent=2)
+
+        with open(os.path.join(self.directory, "stalls.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "count": len(stalls),
+                "p50": stalls[len(stalls) // 2] if stalls else 0,
+                "p99": stalls[min(len(stalls) - 1, int(len(stalls) * 0.99))] if stalls else 0,
+                "max": stalls[-1] if stalls else 0,
+                "stalls": self.stalls,
+            }, f, indent=2)
+
+        logger.info(f"Profile written to {self.directory}, {self.sampler.samples} samples")
+
+
+session = None  # type: ProfileSession
+
+
+def isProfilingRequested(enabled=False):
+    """ whether profiling is enabled by the environment variable or the config """
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value:
+        return value not in ("0", "false", "no", "off")
+
+    return enabled
+
+
+def startSession(directory=DEFAULT_PROFILE_DIR, **kwargs) -> ProfileSession:
+    """ start a session in a new sub directory named after the start time """
+    global session
+    path = os.path.join(directory, time.strftime("%Y%m%d-%H%M%S"))
+    session = ProfileSession(path, **kwargs).start()
+    return session
+
+
+def stopSession():
+    global session
+    if session is not None:
+        session.stop()
+        session = None
+
+
+def profileJob(name: str):
+    """ profile a worker job if a session is running, otherwise do nothing """
+    return session.profileJob(name) if session is not None else nullcontext()
+
+
+class StallMonitor(QObject):
+    """ Heartbeat timer on the GUI thread, a late tick means the event loop was blocked """
+
+    def __init__(self, interval=50, parent=None):
+        super().__init__(parent)
+        self.interval = interval / 1000
+        self.last = time.perf_counter()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(interval)
+
+    def tick(self):
+        now = time.perf_counter()
+        stall = now - self.last - self.interval
+        self.last = now
+        if session is not None and stall > session.slowEvent:
+            session.recordStall(stall)
+
+
+class ProfiledApplication(QApplication):
+    """ QApplication timing the delivery of every event while a session is running """
+
+    def __init__(self, argv):
+        super().__init__(argv)
+        self.guiThread = threading.get_ident()
+        self.stallMonitor = StallMonitor(parent=self)
+        self.aboutToQuit.connect(stopSession)
+
+    def notify(self, receiver, event):
+        current = session
+        if current is None:
+            return super().notify(receiver, event)
+
+        labels = current.sampler.labels
+        previous = labels.get(self.guiThread)
+        eventType = event.type()
+        name = f"{type(receiver).__name__}.{getattr(eventType, 'name', int(eventType))}"
+        labels[self.guiThread] = name
+        start = time.perf_counter()
+        try:
+            return super().notify(receiver, event)
+        finally:
+            elapsed = time.perf_counter() - start
+            labels[self.guiThread] = previous
+            if elapsed > current.slowEvent:
+                current.recordSlowEvent(name, elapsed)
@@ -0,0 +1,218 @@
+# coding: utf-8
+import threading
+import time
+from itertools import count
+
+from loguru import logger
+
+
+class RateLimitedError(Exception):
+    """ Raised when a request is shed by the rate limiter """
+
+
+class TokenBucket:
+    """ Token bucket
+
+    Parameters
+    ----------
+    rate: float
+        tokens added per second
+
+    capacity: float
+        maximum number of tokens, i.e. the allowed burst
+
+    clock: callable
+        monotonic clock in seconds
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens=1.0):
+        """ seconds until `tokens` tokens are available, 0 if they are available now """
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+
+        return (tokens - self.tokens) / self.rate
+
+    def take(self, tokens=1.0):
+        self._refill()
+        self.tokens -= tokens
+
+    def tryAcquire(self, tokens=1.0):
+        """ take tokens if they are available now """
+        if self.delay(tokens) > 0:
+            return False
+
+        self.take(tokens)
+        return True
+
+
+class EndpointClass:
+    """ Rate limit class of one kind of portal request
+
+    Parameters
+    ----------
+    name: str
+        name of the class
+
+    priority: int
+        smaller value is served first when requests are queued
+
+    rate, capacity: float
+        token bucket of the class
+
+    shed: bool
+        whether a new request is dropped while another one of the class is already queued
+
+    maxDelay: float
+        longest time a request waits for a token before it is dropped
+    """
+
+    def __init__(self, name, priority, rate, capacity, shed=False, maxDelay=1.0, clock=time.monotonic):
+        self.name = name
+        self.priority = priority
+        self.bucket = TokenBucket(rate, capacity, clock)
+        self.shed = shed
+        self.maxDelay = maxDelay
+        self.waiting = 0
+
+        # metrics
+        self.requests = 0
+        self.granted = 0
+        self.delayed = 0
+        self.dropped = 0
+        self.delayTime = 0.0
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "granted": self.granted,
+            "delayed": self.delayed,
+            "dropped": self.dropped,
+            "delay_seconds": round(self.delayTime, 3),
+        }
+
+
+class PortalRateLimiter:
+    """ Shared rate limiter of the requests sent to the campus portal
+
+    Every request takes a token from its endpoint class and from a global
+    bucket. Queued requests are served by priority, so a login is never stuck
+    behind a refresh, and refreshes are shed instead of piling up.
+    """
+
+    def __init__(self, rate=2.0, capacity=6, classes: list = None, clock=time.monotonic):
+        self.clock = clock
+        self.bucket = TokenBucket(rate, capacity, clock)
+        self.condition = threading.Condition()
+        self.waiters = []  # [priority, seq, class]
+        self.seq = count()
+
+        if classes is None:
+            classes = [
+                EndpointClass("login", 0, 1.0, 3, shed=False, maxDelay=10.0, clock=clock),
+                EndpointClass("logout", 1, 1.0, 3, shed=False, maxDelay=10.0, clock=clock),
+                EndpointClass("devices", 2, 0.2, 2, shed=True, maxDelay=2.0, clock=clock),
+                EndpointClass("identity", 3, 1.0, 3, shed=True, maxDelay=1.0, clock=clock),
+                # 后台的账号健康检查，优先级最低，取不到令牌时放弃本轮
+                EndpointClass("health", 4, 0.5, 2, shed=True, maxDelay=5.0, clock=clock),
+            ]
+
+        self.classes = {c.name: c for c in classes}
+
+    def acquire(self, endpoint: str, timeout: float = None) -> bool:
+        """ wait for a token of the endpoint class
+
+        Parameters
+        ----------
+        endpoint: str
+            name of the endpoint class, e.g. `identity`, `devices`, `login`, `logout` or `health`
+
+        timeout: float
+            longest time to wait, defaults to `maxDelay` of the class
+
+        Returns
+        -------
+        granted: bool
+            `False` if the request was dropped
+        """
+        rateClass = self.classes[endpoint]
+        start = self.clock()
+        deadline = start + (rateClass.maxDelay if timeout is None else timeout)
+
+        with self.condition:
+            rateClass.requests += 1
+
+            # 同类请求已在排队，新的刷新请求直接丢弃
+            if rateClass.shed and rateClass.waiting:
+                return self._drop(rateClass, "already queued")
+
+            waiter = [rateClass.priority, next(self.seq), rateClass]
+            self.waiters.append(waiter)
+            rateClass.waiting += 1
+            waited = False
+
+            try:
+                while True:
+                    if self._isEligible(waiter):
+                        wait = max(self.bucket.delay(), rateClass.bucket.delay())
+                        if wait == 0:
+                            self.bucket.take()
+                            rateClass.bucket.take()
+                            break
+                    else:
+                        wait = None
+
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        return self._drop(rateClass, "no token in time")
+
+                    waited = True
+                    self.condition.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self.waiters.remove(waiter)
+                rateClass.waiting -= 1
+                self.condition.notify_all()
+
+            rateClass.granted += 1
+            if waited:
+                rateClass.delayed += 1
+                rateClass.delayTime += self.clock() - start
+
+            return True
+
+    def _isEligible(self, waiter):
+        """ a waiter is served if it is the oldest of its class and no
+        higher-priority class with tokens left is waiting """
+        priority, seq, rateClass = waiter
+        for p, s, c in self.waiters:
+            if c is rateClass and s < seq:
+                return False
+            if p < priority and c.bucket.delay() == 0:
+                return False
+
+        return True
+
+    def _drop(self, rateClass, reason):
+        rateClass.dropped += 1
+        logger.debug(f"Portal request {rateClass.name} dropped: {reason}")
+        return False
+
+    def stats(self) -> dict:
+        """ metrics of every endpoint class """
+        with self.condition:
+            return {name: c.stats() for name, c in self.classes.items()}
+
+
+portalLimiter = PortalRateLimiter()
@@ -1,5 +1,20 @@
 # coding: utf-8
-from PySide6.QtCore import QObject, Signal
+"""
+Signal bus of the application.
+
+Besides the navigation signals of the UI, the bus carries the network events
+published by the worker threads. A subscriber created with `subscribe`
+receives them on its own thread with optional debounce, throttle and
+latest-value-wins coalescing: the values of a burst are collected on the
+emitting thread and handed over with a single queued call, so a busy worker
+costs the GUI thread one call per burst instead of one per emission.
+"""
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal, QTimer, Qt
+
+from .metrics import busEvents
 
 
 class SignalBus(QObject):
@@ -9,5 +24,121 @@ class SignalBus(QObject):
     micaEnableChanged = Signal(bool)
     supportSignal = Signal()
 
+    # 网络事件，可在工作线程中发出
+    netSnapshot = Signal(dict)          # 网络信息
+    netStateChanged = Signal(bool)      # 在线状态的切换
+    loginResult = Signal(str, dict)     # 账号，各接口的登录结果，登录卡片据此排序补全的账号
+    devicesChanged = Signal(str, list)  # 账号，全部在线记录
+
+    NETWORK_EVENTS = ("netSnapshot", "netStateChanged", "loginResult", "devicesChanged")
+
+    def subscribe(self, event: str, slot, debounce=0, throttle=0, latest=True, parent=None):
+        """ receive a network event on the current thread
+
+        Parameters
+        ----------
+        event: str
+            name of the signal, one of `NETWORK_EVENTS`
+
+        slot: callable
+            called with the arguments of the event
+
+        debounce: int
+            milliseconds without a new emission before the slot is called
+
+        throttle: int
+            minimum milliseconds between two calls of the slot
+
+        latest: bool
+            only the last value of a burst is delivered, otherwise every value in order
+
+        parent: QObject
+            owner of the subscription, which ends with it
+
+        Returns
+        -------
+        subscription: BusSubscription
+        """
+        if event not in self.NETWORK_EVENTS:
+            raise ValueError(f"unknown network event {event}")
+
+        return BusSubscription(getattr(self, event), event, slot, debounce, throttle, latest, parent)
+
+
+class BusSubscription(QObject):
+    """ Delivery of one event to one slot
+
+    Emissions are received directly on the emitting thread and only stored
+    there. The first one of a burst wakes the subscription with a queued
+    call, later ones until the delivery only replace or extend the pending
+    values.
+    """
+
+    _wake = Signal()
+
+    def __init__(self, signal, event: str, slot, debounce=0, throttle=0, latest=True, parent=None):
+        super().__init__(parent)
+        self.signal = signal
+        self.name = event
+        self.slot = slot
+        self.debounce = debounce
+        self.throttle = throttle
+        self.latest = latest
+
+        self.lock = threading.Lock()
+        self.pending = []           # 待交付的参数，latest 时只保留最后一个
+        self.scheduled = False      # 已唤醒，交付前不再排队
+        self.lastArrival = 0.0
+        self.lastDelivery = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._flush)
+        self._wake.connect(self._flush, Qt.QueuedConnection)
+        self.signal.connect(self._receive, Qt.DirectConnection)
+
+    def _receive(self, *args):
+        """ called on the emitting thread """
+        busEvents.inc(event=self.name, outcome="emitted")
+        with self.lock:
+            self.lastArrival = time.monotonic()
+            if self.latest:
+                self.pending = [args]
+            else:
+                self.pending.append(args)
+
+            if self.scheduled:
+                return
+            self.scheduled = True
+
+        self._wake.emit()
+
+    def _flush(self):
+        """ deliver the pending values unless the debounce or throttle interval has not passed """
+        now = time.monotonic()
+        with self.lock:
+            wait = self.lastArrival + self.debounce / 1000 - now
+        if self.lastDelivery is not None:
+            wait = max(wait, self.lastDelivery + self.throttle / 1000 - now)
+
+        if wait > 0:
+            self.timer.start(max(1, int(wait * 1000 + 0.5)))
+            return
+
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.scheduled = False
+
+        self.lastDelivery = now
+        for args in pending:
+            busEvents.inc(event=self.name, outcome="delivered")
+            self.slot(*args)
+
+    def unsubscribe(self):
+        self.signal.disconnect(self._receive)
+        self.timer.stop()
+        with self.lock:
+            self.pending = []
+
 
-signalBus = SignalBus()
\ No newline at end of file
+signalBus = SignalBus()
@@ -1,73 +1,592 @@
 # coding: utf-8
-from queue import Queue
+import heapq
+import json
+import mmap
+import os
+import struct
+from itertools import islice
 
 
-class Trie:
-    """ String trie """
+# 序列化格式: 文件头 | 节点表 | 字符串池
+# 节点按层序存放，同一节点的子节点连续且按边的首字符排序
+TRIE_MAGIC = b"OUCTRIE\0"
+TRIE_VERSION = 1
+_HEADER = struct.Struct("<8sHHIIQQ")     # magic, version, reserved, nodes, keys, nodes offset, strings offset
+_NODE = struct.Struct("<9I2dB3x")        # label, key, value (offset, length), first child, children, first char, weight, best, flags
+_FIRST_CHAR = struct.Struct("<I")
+_FIRST_CHAR_OFFSET = 32
+_IS_END = 1
+_VALUE_IS_KEY = 2
 
-    def __init__(self):
+
+class TrieNode:
+    """ Node of a compressed trie, `label` is the edge from the parent
+
+    `weight` is the rank of the node's own item and `best` the highest
+    weight below the node, which lets ranked queries skip whole subtrees.
+    """
+
+    __slots__ = ("label", "children", "key", "value", "isEnd", "weight", "best")
+
+    def __init__(self, label=''):
+        self.label = label
+        self.children = None    # type: dict[str, TrieNode]
         self.key = ''
         self.value = None
-        self.children = [None] * 26
         self.isEnd = False
+        self.weight = 0.0
+        self.best = 0.0
+
+    def updateBest(self):
+        best = self.weight if self.isEnd else 0.0
+        if self.children:
+            best = max(best, max(c.best for c in self.children.values()))
+
+        self.best = best
+
+
+class Trie:
+    """ String trie
+
+    Keys are case folded, so any Unicode string works, including student IDs
+    with digits. Chains of single-child nodes are merged into one edge, leaves
+    don't allocate a children dict.
+    """
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
 
-    def insert(self, key: str, value):
-        """ insert item """
-        key = key.lower()
+    def __contains__(self, key):
+        return self._find(key.casefold()) is not None
 
-        node = self
-        for c in key:
-            i = ord(c) - 97
-            if not 0 <= i < 26:
-                return
+    def insert(self, key: str, value, weight: float = None):
+        """ insert item, the original key is kept for display
 
-            if not node.children[i]:
-                node.children[i] = Trie()
+        Parameters
+        ----------
+        key: str
+            the key of item
 
-            node = node.children[i]
+        value:
+            the value of item
+
+        weight: float
+            rank used by `items(ranked=True)`, larger comes first, the current weight is kept if `None`
+        """
+        folded = key.casefold()
+        path = [self.root]
+        node = self.root
+        i = 0
+
+        while i < len(folded):
+            child = node.children.get(folded[i]) if node.children else None
+            if child is None:
+                child = TrieNode(folded[i:])
+                if node.children is None:
+                    node.children = {}
+                node.children[folded[i]] = child
+                node = child
+                path.append(node)
+                break
+
+            # 计算公共前缀，必要时拆分边
+            label = child.label
+            j = 1
+            n = min(len(label), len(folded) - i)
+            while j < n and label[j] == folded[i + j]:
+                j += 1
+
+            if j < len(label):
+                middle = TrieNode(label[:j])
+                child.label = label[j:]
+                middle.children = {child.label[0]: child}
+                middle.best = child.best
+                node.children[folded[i]] = middle
+                child = middle
+
+            node = child
+            path.append(node)
+            i += j
+
+        if not node.isEnd:
+            self.size += 1
+            node.weight = 0.0
 
         node.isEnd = True
         node.key = key
         node.value = value
+        if weight is not None:
+            self._setWeight(path, weight)
+
+    def _setWeight(self, path, weight):
+        node = path[-1]
+        previous = node.weight
+        node.weight = weight
+        if weight >= previous:
+            # 权重只增不减时，沿路径取最大值即可
+            for node in path:
+                if node.best < weight:
+                    node.best = weight
+        else:
+            self._updateBest(path)
+
+    def setWeight(self, key: str, weight: float):
+        """ set the rank of an item, e.g. the time it was last used """
+        folded = key.casefold()
+        path = self._path(folded)
+        if path is None:
+            return False
+
+        self._setWeight(path, weight)
+        return True
+
+    @staticmethod
+    def _updateBest(path):
+        for node in reversed(path):
+            node.updateBest()
+
+    def remove(self, key: str):
+        """ remove item, returns whether the key existed """
+        path = self._path(key.casefold())
+        if path is None:
+            return False
+
+        node = path[-1]
+        node.isEnd = False
+        node.key = ''
+        node.value = None
+        node.weight = 0.0
+        self.size -= 1
+
+        # 删除空叶子，合并只剩一个子节点的中间节点
+        path = list(path)
+        while len(path) > 1:
+            node = path[-1]
+            parent = path[-2]
+            if not node.isEnd and not node.children:
+                del parent.children[node.label[0]]
+                if not parent.children:
+                    parent.children = None
+                path.pop()
+                continue
+
+            if not node.isEnd and len(node.children) == 1:
+                child = next(iter(node.children.values()))
+                child.label = node.label + child.label
+                parent.children[node.label[0]] = child
+                path[-1] = child
+            break
+
+        self._updateBest(path)
+        return True
+
+    def _path(self, folded):
+        """ nodes from the root to the folded key, `None` if the key is not stored """
+        node = self.root
+        path = [node]
+        i = 0
+        while i < len(folded):
+            node = node.children.get(folded[i]) if node.children else None
+            if node is None or not folded.startswith(node.label, i):
+                return None
+            path.append(node)
+            i += len(node.label)
+
+        return path if node.isEnd else None
+
+    def _find(self, folded):
+        """ node of the folded key, `None` if the key is not stored """
+        node = self.root
+        i = 0
+        while i < len(folded):
+            node = node.children.get(folded[i]) if node.children else None
+            if node is None or not folded.startswith(node.label, i):
+                return None
+            i += len(node.label)
+
+        return node if node.isEnd else None
 
     def get(self, key, default=None):
         """ get value of key """
-        node = self.searchPrefix(key)
-        if not (node and node.isEnd):
+        node = self._find(key.casefold())
+        if node is None:
             return default
 
         return node.value
 
     def searchPrefix(self, prefix):
-        """ search node matchs the prefix """
-        prefix = prefix.lower()
-        node = self
-        for c in prefix:
-            i = ord(c) - 97
-            if not (0 <= i < 26 and node.children[i]):
+        """ search node matchs the prefix, every key below the node starts with the prefix """
+        prefix = prefix.casefold()
+        node = self.root
+        i = 0
+        while i < len(prefix):
+            node = node.children.get(prefix[i]) if node.children else None
+            if node is None:
                 return None
 
-            node = node.children[i]
+            # 前缀可能在边的中间结束
+            n = min(len(node.label), len(prefix) - i)
+            if node.label[:n] != prefix[i:i + n]:
+                return None
+            i += n
 
         return node
 
-    def items(self, prefix):
-        """ search items match the prefix """
+    def iterItems(self, prefix=''):
+        """ iterate items matching the prefix in lexicographic order of the folded keys
+
+        Nodes are visited lazily, stopping the iteration early leaves the rest
+        of the subtree untouched.
+        """
         node = self.searchPrefix(prefix)
         if not node:
-            return []
+            return
+
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.isEnd:
+                yield node.key, node.value
+
+            if node.children:
+                stack.extend(sorted(node.children.values(), key=lambda c: c.label, reverse=True))
+
+    def iterRanked(self, prefix=''):
+        """ iterate items matching the prefix by descending weight, ties in lexicographic order
+
+        Subtrees are expanded best-first by their highest weight, so taking
+        the top k items only visits the branches that can contain them.
+        """
+        node = self.searchPrefix(prefix)
+        if not node:
+            return
+
+        # (-weight, folded path, is item, node)，同权重时路径短的前缀先出队
+        heap = [(-node.best, "", 1, node)]
+        while heap:
+            negWeight, path, isNode, node = heapq.heappop(heap)
+            if not isNode:
+                yield node.key, node.value
+                continue
+
+            if node.isEnd:
+                heapq.heappush(heap, (-node.weight, path, 0, node))
+
+            if node.children:
+                for child in node.children.values():
+                    heapq.heappush(heap, (-child.best, path + child.label, 1, child))
+
+    def items(self, prefix, limit: int = None, ranked=False):
+        """ search items match the prefix
+
+        Parameters
+        ----------
+        prefix: str
+            the prefix of keys
+
+        limit: int
+            maximum number of items, `None` returns every item
+
+        ranked: bool
+            whether to return the items by descending weight instead of lexicographic order
+        """
+        iterator = self.iterRanked(prefix) if ranked else self.iterItems(prefix)
+        return list(islice(iterator, limit))
+
+    def fuzzy(self, text: str, k: int = 1, limit: int = None, prefix=False):
+        """ search items within `k` edits (Levenshtein distance) of the text
+
+        One row of the edit distance matrix is computed per trie character and
+        shared by every key below it, branches whose row minimum exceeds `k`
+        are pruned.
+
+        Parameters
+        ----------
+        text: str
+            the text to match, case folded like the keys
+
+        k: int
+            maximum number of insertions, deletions and substitutions
+
+        limit: int
+            maximum number of items, `None` returns every match
 
-        q = Queue()
-        result = []
-        q.put(node)
+        prefix: bool
+            match keys starting with something within `k` edits of the text, for type-ahead
 
-        while not q.empty():
-            node = q.get()
+        Returns
+        -------
+        items: list
+            `(key, value, distance)` tuples ordered by distance, then descending weight, then key
+        """
+        text = text.casefold()
+        matches = []
+        row = list(range(len(text) + 1))
+        found = min(row[-1], k + 1) if prefix else k + 1
+        if self.root.isEnd and min(found, row[-1]) <= k:
+            matches.append((min(found, row[-1]), self.root))
+        self._fuzzy(self.root, text, row, k, prefix, found, matches)
+
+        def rank(match):
+            return match[0], -match[1].weight, match[1].key.casefold()
+
+        matches = heapq.nsmallest(limit, matches, key=rank) if limit is not None else sorted(matches, key=rank)
+        return [(node.key, node.value, distance) for distance, node in matches]
+
+    def _fuzzy(self, node, text, row, k, prefix, found, matches):
+        """ `found` is the smallest distance of a prefix on the path in prefix mode, `k + 1` otherwise """
+        if not node.children:
+            return
+
+        for child in node.children.values():
+            current = row
+            bound = found
+            for char in child.label:
+                previous = current
+                current = [previous[0] + 1]
+                for j in range(1, len(text) + 1):
+                    cost = previous[j - 1] + (text[j - 1] != char)
+                    current.append(min(cost, previous[j] + 1, current[j - 1] + 1))
+
+                if prefix and current[-1] < bound:
+                    bound = current[-1]
+
+                # 更深处的距离不会小于本行最小值
+                if min(current) >= bound:
+                    if bound <= k:
+                        self._collect(child, bound, matches)
+                    break
+            else:
+                distance = bound if prefix else current[-1]
+                if child.isEnd and distance <= k:
+                    matches.append((distance, child))
+                self._fuzzy(child, text, current, k, prefix, bound, matches)
+
+    @staticmethod
+    def _collect(node, distance, matches):
+        stack = [node]
+        while stack:
+            node = stack.pop()
             if node.isEnd:
-                result.append((node.key, node.value))
+                matches.append((distance, node))
+            if node.children:
+                stack.extend(node.children.values())
+
+    def save(self, path: str):
+        """ write the trie in the flat format read by `MappedTrie`, values must be JSON serializable
+
+        The file is replaced atomically, so processes mapping the old file keep
+        a consistent view.
+        """
+        order = [self.root]
+        firstChild = []
+        i = 0
+        while i < len(order):
+            node = order[i]
+            firstChild.append(len(order))
+            if node.children:
+                order.extend(sorted(node.children.values(), key=lambda c: c.label))
+            i += 1
+
+        strings = bytearray()
+
+        def addString(text):
+            data = text.encode("utf-8")
+            offset = len(strings)
+            strings.extend(data)
+            return offset, len(data)
+
+        nodes = bytearray()
+        for node, child in zip(order, firstChild):
+            label = addString(node.label)
+            flags = 0
+            key = value = (0, 0)
+            if node.isEnd:
+                flags |= _IS_END
+                key = addString(node.key)
+                if node.value == node.key:
+                    flags |= _VALUE_IS_KEY
+                else:
+                    value = addString(json.dumps(node.value, ensure_ascii=False, separators=(",", ":")))
+
+            nodes.extend(_NODE.pack(*label, *key, *value, child, len(node.children or ()),
+                                    ord(node.label[0]) if node.label else 0, node.weight, node.best, flags))
+
+        nodesOffset = _HEADER.size
+        header = _HEADER.pack(TRIE_MAGIC, TRIE_VERSION, 0, len(order), self.size,
+                              nodesOffset, nodesOffset + len(nodes))
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(nodes)
+            f.write(strings)
+
+        os.replace(tmp, path)
+
+
+class MappedTrie:
+    """ Read-only trie answering queries straight from a file written by `Trie.save`
+
+    Opening the file only maps it, no node objects are built, and pages of
+    the same file are shared by every process mapping it. Nodes are
+    addressed by their index in the node table.
+
+    Parameters
+    ----------
+    path: str
+        path of the serialized trie
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mm) < _HEADER.size:
+            self.mm.close()
+            raise ValueError(f"{path} is not a serialized trie")
+
+        magic, version, _, self.nodeCount, self.size, self.nodesOffset, self.stringsOffset = \
+            _HEADER.unpack_from(self.mm, 0)
+        if magic != TRIE_MAGIC or version != TRIE_VERSION:
+            self.mm.close()
+            raise ValueError(f"{path} is not a serialized trie of version {TRIE_VERSION}")
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self._find(key.casefold()) is not None
+
+    def _node(self, index):
+        return _NODE.unpack_from(self.mm, self.nodesOffset + index * _NODE.size)
+
+    def _string(self, offset, length):
+        start = self.stringsOffset + offset
+        return self.mm[start:start + length].decode("utf-8")
+
+    def _label(self, node):
+        return self._string(node[0], node[1])
+
+    def _item(self, node):
+        key = self._string(node[2], node[3])
+        if node[11] & _VALUE_IS_KEY:
+            return key, key
+
+        return key, json.loads(self._string(node[4], node[5]))
+
+    def _child(self, node, char):
+        """ index of the child whose edge starts with `char`, binary search over the sorted children """
+        lo, hi = node[6], node[6] + node[7]
+        code = ord(char)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            first = _FIRST_CHAR.unpack_from(self.mm, self.nodesOffset + mid * _NODE.size + _FIRST_CHAR_OFFSET)[0]
+            if first < code:
+                lo = mid + 1
+            elif first > code:
+                hi = mid
+            else:
+                return mid
+
+        return None
+
+    def _find(self, folded):
+        index = 0
+        node = self._node(0)
+        i = 0
+        while i < len(folded):
+            index = self._child(node, folded[i])
+            if index is None:
+                return None
+
+            node = self._node(index)
+            label = self._label(node)
+            if not folded.startswith(label, i):
+                return None
+            i += len(label)
+
+        return node if node[11] & _IS_END else None
+
+    def get(self, key, default=None):
+        """ get value of key """
+        node = self._find(key.casefold())
+        if node is None:
+            return default
+
+        return self._item(node)[1]
+
+    def searchPrefix(self, prefix):
+        """ index of the node matchs the prefix, every key below the node starts with the prefix """
+        prefix = prefix.casefold()
+        index = 0
+        node = self._node(0)
+        i = 0
+        while i < len(prefix):
+            index = self._child(node, prefix[i])
+            if index is None:
+                return None
+
+            node = self._node(index)
+            label = self._label(node)
+            n = min(len(label), len(prefix) - i)
+            if label[:n] != prefix[i:i + n]:
+                return None
+            i += n
+
+        return index
+
+    def iterItems(self, prefix=''):
+        """ iterate items matching the prefix in lexicographic order of the folded keys """
+        index = self.searchPrefix(prefix)
+        if index is None:
+            return
+
+        stack = [index]
+        while stack:
+            node = self._node(stack.pop())
+            if node[11] & _IS_END:
+                yield self._item(node)
+
+            if node[7]:
+                stack.extend(range(node[6] + node[7] - 1, node[6] - 1, -1))
+
+    def iterRanked(self, prefix=''):
+        """ iterate items matching the prefix by descending weight, ties in lexicographic order """
+        index = self.searchPrefix(prefix)
+        if index is None:
+            return
+
+        heap = [(-self._node(index)[10], "", 1, index)]
+        while heap:
+            _, path, isNode, index = heapq.heappop(heap)
+            node = self._node(index)
+            if not isNode:
+                yield self._item(node)
+                continue
+
+            if node[11] & _IS_END:
+                heapq.heappush(heap, (-node[9], path, 0, index))
 
-            for c in node.children:
-                if c:
-                    q.put(c)
+            for child in range(node[6], node[6] + node[7]):
+                childNode = self._node(child)
+                heapq.heappush(heap, (-childNode[10], path + self._label(childNode), 1, child))
 
-        return result
+    def items(self, prefix, limit: int = None, ranked=False):
+        """ search items match the prefix, see `Trie.items` """
+        iterator = self.iterRanked(prefix) if ranked else self.iterItems(prefix)
+        return list(islice(iterator, limit))
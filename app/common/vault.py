@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+Encryption of the saved passwords.
+
+The passwords of the account store are sealed with AES-GCM under a key
+derived from a passphrase with scrypt, whose cost is tunable. The key is
+derived once when the vault is unlocked and kept only in memory until it is
+locked again, so a login costs the AES-GCM decryption of its own password,
+a few microseconds, and never a key derivation.
+
+A sealed password is the string `vault1:<base64 of nonce and ciphertext>`,
+bound to its account by passing the uid as associated data, so a sealed
+password copied to another account does not open. It passes unchanged
+through the account list and the account combo box and is only opened when
+the password is used. Passwords typed or imported by the user are always
+sealed, even if they look like a sealed password.
+"""
+import base64
+import hashlib
+import os
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+
+PREFIX = "vault1:"
+DEFAULT_COST = 15       # scrypt 的 N = 2 ** cost，约 32 MB 内存
+MIN_COST, MAX_COST = 14, 20
+NONCE_SIZE = 12
+SALT_SIZE = 16
+# 解锁时用该明文验证口令
+CHECK_PLAINTEXT = b"ouc-net credential vault"
+
+
+class VaultError(Exception):
+    """ The vault cannot seal or open a password """
+
+
+class VaultLocked(VaultError):
+    """ The vault has to be unlocked first """
+
+
+class WrongPassphrase(VaultError):
+    """ The passphrase does not open the vault """
+
+
+def isSealed(value) -> bool:
+    return isinstance(value, str) and value.startswith(PREFIX)
+
+
+class CredentialVault:
+    """ Key derivation and AES-GCM sealing of passwords
+
+    Parameters
+    ----------
+    salt: bytes
+        salt of the key derivation
+
+    cost: int
+        log2 of the scrypt work factor N, every step doubles time and memory
+
+    r, p: int
+        block size and parallelism of scrypt
+
+    check: bytes
+        `CHECK_PLAINTEXT` sealed under the key, verifies the passphrase on unlock
+    """
+
+    def __init__(self, salt: bytes, cost=DEFAULT_COST, r=8, p=1, check: bytes = None):
+        self.salt = salt
+        self.cost = cost
+        self.r = r
+        self.p = p
+        self.check = check
+        self._aead = None   # 仅保存在内存中，锁定时丢弃
+
+    @classmethod
+    def create(cls, passphrase: str, cost=DEFAULT_COST):
+        """ new vault for the passphrase, returned unlocked """
+        if not passphrase:
+            raise VaultError("empty passphrase")
+
+        vault = cls(os.urandom(SALT_SIZE), min(max(cost, MIN_COST), MAX_COST))
+        vault._aead = AESGCM(vault.derive(passphrase))
+        vault.check = vault._seal(CHECK_PLAINTEXT)
+        return vault
+
+    @property
+    def locked(self):
+        return self._aead is None
+
+    def derive(self, passphrase: str) -> bytes:
+        """ 256 bit key of the passphrase, the expensive step done once per session """
+        n = 1 << self.cost
+        return hashlib.scrypt(passphrase.encode("utf-8"), salt=self.salt, n=n, r=self.r, p=self.p,
+                              maxmem=256 * n * self.r + (1 << 20), dklen=32)
+
+    def unlock(self, passphrase: str):
+        aead = AESGCM(self.derive(passphrase))
+        try:
+            aead.decrypt(self.check[:NONCE_SIZE], self.check[NONCE_SIZE:], None)
+        except InvalidTag:
+            raise WrongPassphrase("wrong passphrase") from None
+
+        self._aead = aead
+
+    def lock(self):
+        self._aead = None
+
+    def _seal(self, data: bytes, associated: bytes = None) -> bytes:
+        if self._aead is None:
+            raise VaultLocked("the credential vault is locked")
+
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + self._aead.encrypt(nonce, data, associated)
+
+    def seal(self, password: str, uid: str) -> str:
+        """ sealed form of the password of the account """
+        return PREFIX + base64.b64encode(self._seal(password.encode("utf-8"), uid.encode("utf-8"))).decode("ascii")
+
+    def open(self, value: str, uid: str) -> str:
+        """ plaintext of a password sealed for the account """
+        if not isSealed(value):
+            raise VaultError("not a sealed password")
+        if self._aead is None:
+            raise VaultLocked("the credential vault is locked")
+
+        try:
+            data = base64.b64decode(value[len(PREFIX):])
+            return self._aead.decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], uid.encode("utf-8")).decode("utf-8")
+        except (InvalidTag, ValueError):
+            raise VaultError("corrupted sealed password") from None
@@ -0,0 +1,376 @@
+# coding:utf-8
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QEvent, QSize
+from PySide6.QtGui import QPainter, QColor
+from PySide6.QtWidgets import QWidget, QHBoxLayout, QStyleOptionViewItem, QAbstractItemView
+
+from qfluentwidgets import (ListView, ListItemDelegate, LineEdit, PasswordLineEdit, FluentIcon,
+                            isDarkTheme, themeColor, getFont)
+
+from ..common.vault import VaultError
+
+
+class AccountRow:
+    """ Account of one row, `savedUid` is the uid in the account store
+
+    `password` is the value from the store, sealed if a vault is enabled,
+    until the user types a new one, `edited` tells which of them it holds.
+    """
+
+    __slots__ = ("uid", "password", "auto", "savedUid", "edited")
+
+    def __init__(self, uid='', password='', auto=False, savedUid=None):
+        self.uid = uid
+        self.password = password
+        self.auto = auto
+        self.savedUid = savedUid
+        self.edited = savedUid is None
+
+
+class AccountListModel(QAbstractListModel):
+    """ Account list model
+
+    The rows only hold plain data, widgets are created by the delegate for the
+    row being edited. Unsaved edits are tracked so that saving writes only the
+    changed accounts. Passwords may be sealed by the vault of the account
+    store, `reveal` opens the password of a row with its saved uid.
+    """
+
+    UidRole = Qt.UserRole + 1
+    PasswordRole = Qt.UserRole + 2
+    AutoRole = Qt.UserRole + 3
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []         # type: list[AccountRow]
+        self._byUid = {}        # saved uid -> row
+        self._autoRow = None    # 自动登录账号所在的行
+        self._dirty = set()     # 待写入的行
+        self._removed = set()   # 待删除的已保存账号
+        self.reveal = lambda uid, password: password
+        self.locked = lambda: False     # 密码库锁定时不能输入新的密码
+        self.loadRows = lambda: ()      # 批量导入后重新读取存储中的 (uid, password, auto)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = self._rows[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole, self.UidRole):
+            return row.uid
+        elif role == self.PasswordRole:
+            return row.password
+        elif role == self.AutoRole:
+            return row.auto
+        elif role == Qt.CheckStateRole:
+            return Qt.Checked if row.auto else Qt.Unchecked
+
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+
+        row = self._rows[index.row()]
+        if role in (Qt.EditRole, self.UidRole):
+            if value == row.uid:
+                return False
+            row.uid = value
+        elif role == self.PasswordRole:
+            if row.edited and value == row.password:
+                return False
+            row.password = value
+            row.edited = True
+        elif role in (self.AutoRole, Qt.CheckStateRole):
+            auto = value == Qt.Checked if role == Qt.CheckStateRole else bool(value)
+            if auto == row.auto:
+                return False
+            self._setAuto(row, auto)
+        else:
+            return False
+
+        self._dirty.add(row)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def _setAuto(self, row: AccountRow, auto: bool):
+        """ only one account logs in automatically, the previous one is found in O(1) """
+        row.auto = auto
+        if not auto:
+            if self._autoRow is row:
+                self._autoRow = None
+            return
+
+        previous = self._autoRow
+        self._autoRow = row
+        if previous is not None and previous is not row:
+            previous.auto = False
+            self._dirty.add(previous)
+            # 只通知视图重绘可见的行，无需查找上一个账号的位置
+            self.dataChanged.emit(self.index(0), self.index(len(self._rows) - 1), [self.AutoRole])
+
+    def revealPassword(self, index):
+        """ plaintext password of the row, `None` while the vault is locked or the password cannot be opened """
+        # 新建的行也没有可用的密钥加密输入的密码
+        if self.locked():
+            return None
+
+        try:
+            return self._plaintext(self._rows[index.row()])
+        except VaultError:
+            return None
+
+    def _plaintext(self, row: AccountRow):
+        return row.password if row.edited else self.reveal(row.savedUid, row.password)
+
+    def setAccounts(self, accounts: dict):
+        """ replace the rows with `{uid: [password, auto]}` from the account store """
+        self.beginResetModel()
+        self._rows = [AccountRow(uid, password, bool(auto), uid) for uid, (password, auto) in accounts.items()]
+        self._byUid = {row.uid: row for row in self._rows}
+        self._autoRow = next((row for row in self._rows if row.auto), None)
+        self._dirty.clear()
+        self._removed.clear()
+        self.endResetModel()
+
+    def addAccount(self, uid='', password='', auto=False) -> QModelIndex:
+        """ append an unsaved account and return its index """
+        n = len(self._rows)
+        self.beginInsertRows(QModelIndex(), n, n)
+        row = AccountRow(uid, password)
+        self._rows.append(row)
+        self._dirty.add(row)
+        if auto:
+            self._setAuto(row, True)
+        self.endInsertRows()
+        return self.index(n)
+
+    def removeRows(self, position, count, parent=QModelIndex()):
+        if parent.isValid() or position < 0 or position + count > len(self._rows):
+            return False
+
+        self.beginRemoveRows(parent, position, position + count - 1)
+        for row in self._rows[position:position + count]:
+            self._forget(row)
+        del self._rows[position:position + count]
+        self.endRemoveRows()
+        return True
+
+    def _forget(self, row: AccountRow):
+        self._dirty.discard(row)
+        if row.savedUid is not None:
+            self._removed.add(row.savedUid)
+            self._byUid.pop(row.savedUid, None)
+        if self._autoRow is row:
+            self._autoRow = None
+
+    def isModified(self):
+        return bool(self._dirty or self._removed)
+
+    def pendingChanges(self):
+        """ returns `(upserts, removed)`, upserts are `(uid, password, auto)` tuples with plaintext passwords
+
+        Raises `VaultLocked` if a changed row keeps a sealed password, e.g. a renamed account,
+        which has to be sealed again for its new uid.
+        """
+        removed = set(self._removed)
+        upserts = []
+        for row in self._dirty:
+            if row.savedUid is not None and row.savedUid != row.uid:
+                removed.add(row.savedUid)
+            if row.uid:
+                upserts.append((row.uid, self._plaintext(row), row.auto))
+
+        # 自动登录账号最后写入，避免被同一批次中的其他账号覆盖
+        upserts.sort(key=lambda item: item[2])
+        upsertUids = {item[0] for item in upserts}
+        return upserts, [uid for uid in removed if uid not in upsertUids]
+
+    def markSaved(self):
+        for row in self._dirty:
+            if row.savedUid is not None:
+                self._byUid.pop(row.savedUid, None)
+            if row.uid:
+                if row.uid != row.savedUid and not row.edited:
+                    # 保存的密码绑定了原来的账号，改名后只能使用明文
+                    row.password = self._plaintext(row)
+                    row.edited = True
+                row.savedUid = row.uid
+                self._byUid[row.uid] = row
+
+        self._dirty.clear()
+        self._removed.clear()
+
+    def applyDelta(self, delta: dict):
+        """ apply the delta of AccountStore, rows with unsaved edits are kept """
+        if "reset" in delta:
+            # 批量导入后整体替换，有未保存的修改时按增量合并
+            accounts = {uid: [password, auto] for uid, password, auto in self.loadRows()}
+            if not self.isModified():
+                self.setAccounts(accounts)
+                return
+            delta = {"upserted": accounts, "removed": []}
+
+        for uid in delta["removed"]:
+            row = self._byUid.get(uid)
+            if row is not None and row not in self._dirty:
+                self.removeRows(self._rows.index(row), 1)
+                self._removed.discard(uid)
+
+        for uid, (password, auto) in delta["upserted"].items():
+            row = self._byUid.get(uid)
+            if row is None:
+                n = len(self._rows)
+                self.beginInsertRows(QModelIndex(), n, n)
+                row = AccountRow(uid, password, False, uid)
+                self._rows.append(row)
+                self._byUid[uid] = row
+                self.endInsertRows()
+            elif row in self._dirty or (row.password == password and row.auto == auto):
+                continue
+
+            row.password = password
+            row.edited = False
+            if row.auto != auto:
+                row.auto = auto
+                if auto:
+                    if self._autoRow is not None and self._autoRow is not row:
+                        self._autoRow.auto = False
+                    self._autoRow = row
+                elif self._autoRow is row:
+                    self._autoRow = None
+
+        if delta["upserted"]:
+            self.dataChanged.emit(self.index(0), self.index(len(self._rows) - 1))
+
+
+class AccountEditor(QWidget):
+    """ Editor of the uid and password of one row """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.uidLineEdit = LineEdit(self)
+        self.passwordLineEdit = PasswordLineEdit(self)
+        self.hBoxLayout = QHBoxLayout(self)
+        self.revealed = None    # 编辑前的明文密码
+
+        self.uidLineEdit.setPlaceholderText("账号")
+        self.passwordLineEdit.setPlaceholderText("密码")
+        self.hBoxLayout.setContentsMargins(0, 0, 0, 0)
+        self.hBoxLayout.setSpacing(8)
+        self.hBoxLayout.addWidget(self.uidLineEdit, 1)
+        self.hBoxLayout.addWidget(self.passwordLineEdit, 1)
+        self.setFocusProxy(self.uidLineEdit)
+
+
+class AccountItemDelegate(ListItemDelegate):
+    """ Paints account rows and creates an editor only for the edited row """
+
+    ROW_HEIGHT = 48
+    UID_X = 48
+    PASSWORD_X = 280
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def initStyleOption(self, option: QStyleOptionViewItem, index):
+        super().initStyleOption(option, index)
+        # 文字和复选框由 paint 绘制
+        option.text = ""
+        option.features &= ~QStyleOptionViewItem.HasCheckIndicator
+
+    def deleteRect(self, option):
+        rect = option.rect
+        return QRect(rect.right() - 40, rect.center().y() - 8, 16, 16)
+
+    def checkRect(self, option):
+        rect = option.rect
+        return QRect(rect.x() + 10, rect.y(), 30, rect.height())
+
+    def paint(self, painter: QPainter, option, index):
+        super().paint(painter, option, index)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = option.rect
+        textColor = QColor(255, 255, 255) if isDarkTheme() else QColor(0, 0, 0)
+        hintColor = QColor(255, 255, 255, 140) if isDarkTheme() else QColor(0, 0, 0, 110)
+
+        painter.setFont(getFont(14))
+        uid = index.data(AccountListModel.UidRole)
+        painter.setPen(textColor if uid else hintColor)
+        uidRect = QRect(rect.x() + self.UID_X, rect.y(), self.PASSWORD_X - self.UID_X - 16, rect.height())
+        painter.drawText(uidRect, Qt.AlignVCenter | Qt.AlignLeft, uid or "新账号")
+
+        password = index.data(AccountListModel.PasswordRole)
+        painter.setPen(hintColor)
+        passwordRect = QRect(rect.x() + self.PASSWORD_X, rect.y(), 160, rect.height())
+        painter.drawText(passwordRect, Qt.AlignVCenter | Qt.AlignLeft, "●" * min(len(password), 12) if password else "未设置密码")
+
+        if index.data(AccountListModel.AutoRole):
+            painter.setPen(themeColor())
+            painter.setFont(getFont(12))
+            autoRect = QRect(rect.x() + self.PASSWORD_X + 176, rect.y(), 80, rect.height())
+            painter.drawText(autoRect, Qt.AlignVCenter | Qt.AlignLeft, "自动登录")
+
+        FluentIcon.DELETE.render(painter, self.deleteRect(option))
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            pos = event.position().toPoint()
+            if self.deleteRect(option).adjusted(-8, -8, 8, 8).contains(pos):
+                model.removeRows(index.row(), 1)
+                return True
+            if self.checkRect(option).contains(pos):
+                model.setData(index, not index.data(AccountListModel.AutoRole), AccountListModel.AutoRole)
+                return True
+
+        return super().editorEvent(event, model, option, index)
+
+    def createEditor(self, parent, option, index):
+        editor = AccountEditor(parent)
+        editor.uidLineEdit.returnPressed.connect(lambda: self._commitAndClose(editor))
+        editor.passwordLineEdit.returnPressed.connect(lambda: self._commitAndClose(editor))
+        return editor
+
+    def _commitAndClose(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
+    def setEditorData(self, editor: AccountEditor, index):
+        editor.uidLineEdit.setText(index.data(AccountListModel.UidRole))
+        # 只在编辑时解密这一行的密码，密码库锁定时不能修改密码
+        editor.revealed = index.model().revealPassword(index)
+        editor.passwordLineEdit.setEnabled(editor.revealed is not None)
+        editor.passwordLineEdit.setPlaceholderText("密码" if editor.revealed is not None else "密码库已锁定")
+        editor.passwordLineEdit.setText(editor.revealed or "")
+
+    def setModelData(self, editor: AccountEditor, model, index):
+        model.setData(index, editor.uidLineEdit.text().strip(), AccountListModel.UidRole)
+        password = editor.passwordLineEdit.text()
+        if editor.revealed is not None and password != editor.revealed:
+            model.setData(index, password, AccountListModel.PasswordRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        rect = option.rect
+        editor.setGeometry(rect.x() + self.UID_X - 8, rect.y() + 6,
+                           self.PASSWORD_X + 160 - self.UID_X + 8, rect.height() - 12)
+
+
+class AccountListView(ListView):
+    """ Virtualized account list, only visible rows are painted """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.accountDelegate = AccountItemDelegate(self)
+        self.setItemDelegate(self.accountDelegate)
+        self.setUniformItemSizes(True)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed |
+                             QAbstractItemView.SelectedClicked)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
@@ -7,7 +7,7 @@ from qfluentwidgets import (ScrollArea, PushButton, ToolButton, FluentIcon,
                             isDarkTheme, IconWidget, Theme, ToolTipFilter, TitleLabel, CaptionLabel,
                             StrongBodyLabel, BodyLabel, toggleTheme, InfoBar, InfoBarIcon, InfoBarPosition)
 
-from .net_info import NetInfoCard, IDManagerCard
+from .net_info import NetInfoCard, IDManagerCard, DeviceManagerCard
 
 from ..common.config import cfg, FEEDBACK_URL, HELP_URL, EXAMPLE_URL
 from ..common.icon import Icon
@@ -106,6 +106,12 @@ class GalleryInterface(ScrollArea):
         self.vBoxLayout.addWidget(card)
         return card
 
+    def addDeviceManagerCard(self, title):
+        """ add online device card """
+        card = DeviceManagerCard(title, self)
+        self.vBoxLayout.addWidget(card)
+        return card
+
     def scrollToCard(self, index: int):
         """ scroll to example card """
         w = self.vBoxLayout.itemAt(index).widget()
@@ -1,6 +1,6 @@
 # coding: utf-8
 from typing import List
-from PySide6.QtCore import Qt, QUrl, QSize, QTimer
+from PySide6.QtCore import Qt, QUrl, QSize, QTimer, QEvent
 from PySide6.QtGui import QIcon, QDesktopServices, QAction
 from PySide6.QtWidgets import QApplication,  QSystemTrayIcon, QMenu
 
@@ -63,6 +63,7 @@ class MainWindow(FluentWindow):
 
         self.setAttribute(Qt.WA_DeleteOnClose, False)
         self.tray_icon.activated.connect(self.on_tray_icon_activated)
+        QApplication.instance().applicationStateChanged.connect(self.onApplicationStateChanged)
 
         # enable acrylic effect
         self.navigationInterface.setAcrylicEnabled(True)
@@ -78,6 +79,7 @@ class MainWindow(FluentWindow):
 
     def restore_window(self):
         """恢复窗口"""
+        self.oucNet.setBackgroundMode(False)
         self.show()
         self.activateWindow()  # 确保恢复时窗口激活
 
@@ -148,10 +150,24 @@ class MainWindow(FluentWindow):
         """当关闭窗口时，不退出应用，而是将其隐藏到托盘"""
         e.ignore()  # 忽略关闭事件
         self.hide()     # 隐藏主窗口
+        self.oucNet.setBackgroundMode(True)
         # self.themeListener.terminate()
         # self.themeListener.deleteLater()
         # super().closeEvent(e)
 
+    def changeEvent(self, e):
+        super().changeEvent(e)
+        # 最小化时进入后台模式
+        if e.type() == QEvent.WindowStateChange and hasattr(self, 'oucNet'):
+            self.oucNet.setBackgroundMode(self.isMinimized() or not self.isVisible())
+
+    def onApplicationStateChanged(self, state):
+        """ enter background mode when the session is locked or suspended """
+        if state in (Qt.ApplicationHidden, Qt.ApplicationSuspended):
+            self.oucNet.setBackgroundMode(True)
+        elif state == Qt.ApplicationActive and self.isVisible() and not self.isMinimized():
+            self.oucNet.setBackgroundMode(False)
+
     def _onThemeChangedFinished(self):
         super()._onThemeChangedFinished()
         # retry
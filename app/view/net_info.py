@@ -1,20 +1,33 @@
 # This Python file uses the following encoding: utf-8
+import time
 from typing import List, Union
 
 from qfluentwidgets.common.icon import FluentIconBase
 
-from PySide6.QtCore import Qt, Signal, QObject
+from PySide6.QtCore import Qt, Signal, QObject, QModelIndex, QStringListModel, QThread
 
 from PySide6.QtGui import QPixmap, QPainter, QColor, QPainterPath, QFont, QIcon
 
-from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QFrame, QApplication
+from PySide6.QtWidgets import (QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QFrame, QApplication, QCompleter,
+                               QListWidgetItem, QFileDialog)
 
-from qfluentwidgets import (IconWidget, BodyLabel, InfoBarIcon, FluentIcon, HyperlinkLabel, PushButton, EditableComboBox ,InfoBar, InfoBarPosition, CheckBox, LineEdit, PasswordLineEdit, PrimaryPushButton,HeaderCardWidget, CardGroupWidget )
+from qfluentwidgets import (IconWidget, BodyLabel, InfoBarIcon, FluentIcon, HyperlinkLabel, PushButton, EditableComboBox ,InfoBar, InfoBarPosition, CheckBox, LineEdit, PasswordLineEdit, PrimaryPushButton,HeaderCardWidget, CardGroupWidget, ListWidget,
+                            MessageBoxBase, SubtitleLabel, CaptionLabel, SearchLineEdit )
 
 from loguru import logger
-import requests
-import json
-import os
+
+from ..common.portal import loginInterfaces, logoutInterfaces
+from ..common.account_store import AccountStore
+from ..common.config import cfg
+from ..common.signal_bus import signalBus
+from ..common.vault import VaultLocked, VaultError, WrongPassphrase
+from ..common.trie import Trie
+from ..components.account_list import AccountListModel, AccountListView, AccountItemDelegate
+
+# 无线网卡名称中常见的关键字
+WIRELESS_KEYWORDS = ("wi-fi", "wlan", "wireless", "airport")
+# 输入达到该长度且前缀匹配不足时，允许一处输入错误
+FUZZY_MIN_LENGTH = 4
 
 class GroupHeaderCardWidget(HeaderCardWidget):
     """ Group header card widget """
@@ -96,8 +109,9 @@ class GroupHeaderCardWidget(HeaderCardWidget):
         group = self.groupIndexes.get(group_index)
 
         if group:
-            # 从布局中移除控件
+            # 从布局中移除控件，隐藏后不会在删除前再被绘制
             self.groupLayout.removeWidget(group)
+            group.hide()
             # 删除控件
             group.deleteLater()
 
@@ -108,11 +122,13 @@ class GroupHeaderCardWidget(HeaderCardWidget):
             # 清除group_index索引
             if group_index in self.groupIndexes:
                 del self.groupIndexes[group_index]
+
     def removeAll(self):
         """Remove all groups/widgets."""
         for group in self.groupWidgets:
             # 从布局中移除控件
             self.groupLayout.removeWidget(group)
+            group.hide()
             # 删除控件
             group.deleteLater()
 
@@ -122,15 +138,52 @@ class GroupHeaderCardWidget(HeaderCardWidget):
         # 清空groupIndexes字典
         self.groupIndexes.clear()
 
+        # 从第一格重新排列，否则每次重建都会在网格末尾追加空行
+        self.currentRow = 0
+        self.currentColumn = 0
+
+    def setGroups(self, groups: list):
+        """ replace all groups in one batch
+
+        Parameters
+        ----------
+        groups: list
+            arguments of `addGroup` for every group, e.g. `(icon, title, content)`
+        """
+        # 容器可见时新的group会逐个显示，每显示一个都要重新布局前面所有的group，
+        # 先隐藏容器，加完后一次性显示
+        hidden = self.view.isHidden()
+        self.view.hide()
+        self.removeAll()
+
+        for args in groups:
+            self.addGroup(*args)
+
+        if not hidden:
+            self.view.show()
+
 class NetInfoCard(GroupHeaderCardWidget):
     """ System requirements card """
 
+    loginSucceeded = Signal(str)    # 登录成功的账号
+    loginFinished = Signal(str, dict)   # 账号，各接口的登录结果，同一线程内立即送达
+
     def __init__(self, title, netInfo, parent=None):
         super().__init__(parent)
         self.setTitle(title)
         self.setBorderRadius(8)
 
         self.netInfo = self.format_info(netInfo)
+        self.interfaces = {}  # 在线接口名称 -> IPv4地址
+        self.uids = {}
+        self.revealPassword = lambda uid, password: password   # 由账号库替换，解密密码库中的密码
+        self.loadRows = lambda: ()      # 由账号库替换，批量导入后重新读取所有账号
+
+        # 账号的搜索索引
+        self.accountIndex = Trie()
+        self.accountUsed = {}   # uid -> 最近一次登录成功的时间，用于补全排序
+        # 手动登录、自动切换账号和强制下线后的重新登录都从总线记录
+        self.loginSubscription = signalBus.subscribe("loginResult", self.recordAccountUse, latest=False, parent=self)
 
         self.copyipv4Button = PushButton(FluentIcon.COPY, "复制")
         self.copyipv6Button = PushButton(FluentIcon.COPY, "复制")
@@ -150,9 +203,16 @@ class NetInfoCard(GroupHeaderCardWidget):
         self.chooseButton.setFixedWidth(120)
         self.comboBox_selectID.setFixedWidth(160)
 
+        # 输入账号时只显示前缀匹配的前几个账号
+        self.accountCompleter = QCompleter(QStringListModel(self), self.comboBox_selectID)
+        self.accountCompleter.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.accountCompleter.setMaxVisibleItems(10)
+        self.comboBox_selectID.setCompleter(self.accountCompleter)
+        self.comboBox_selectID.textEdited.connect(self.filterAccounts)
+
         # 获取用户id
         self.comboBox_selectNetInterface.setFixedWidth(160)
-        self.comboBox_selectNetInterface.addItems(["无线网络", "有线网络"])
+        self.comboBox_selectNetInterface.addItems(["无线网络", "有线网络", "全部网络"])
         self.comboBox_selectNetInterface.setCurrentIndex(0)
 
 
@@ -229,6 +289,9 @@ class NetInfoCard(GroupHeaderCardWidget):
     def update_info(self, netInfo):
         """ Update net info """
         self.format_info(netInfo)
+        # 离线时保留上一次的接口地址，便于自动登录时绑定
+        if 'interfaces' in self.netInfo:
+            self.interfaces = self.netInfo['interfaces']
 
         self.groupWidgets[0].setContent(self.netInfo['IP'])
         if isinstance(self.netInfo['IPv6'], list):
@@ -245,72 +308,121 @@ class NetInfoCard(GroupHeaderCardWidget):
         self.groupWidgets[4].setContent(self.netInfo['MAC'].upper())
         self.groupWidgets[5].setContent(self.netInfo['id'])
     
-    def signinClicked(self):
+    def selectedSources(self):
+        """ interface name -> source IPv4 of the interfaces matching comboBox_selectNetInterface
 
-        uid = self.comboBox_selectID.currentText()
+        If no matching interface is known, the default route is used.
+        """
+        selection = self.comboBox_selectNetInterface.currentText()
+
+        sources = {}
+        for name, ipv4 in self.interfaces.items():
+            wireless = any(keyword in name.lower() for keyword in WIRELESS_KEYWORDS)
+            if selection == "全部网络" or (selection == "无线网络") == wireless:
+                sources[name] = ipv4
+
+        if not sources:
+            logger.warning(f"No online interface for {selection}, use default route")
+            sources[selection] = None
+
+        return sources
+
+    def loginCredentials(self, uid=None):
+        """ `(uid, password, sources)` of a login with the account, the selected one by default """
+        uid = uid or self.comboBox_selectID.currentText()
 
         try:
-            password = self.uids[uid][0]
-            logger.info(f"pass for {uid}: {password}")
+            # 密码在此处才解密，只解密本次登录的账号
+            password = self.revealPassword(uid, self.uids[uid][0])
+        except VaultLocked:
+            password = None
+            logger.warning(f"Credential vault is locked, cannot log in {uid}")
         except Exception as e: 
             password = None
             logger.error(f"No Password for {uid}, for: {e}")
 
+        return uid, password, self.selectedSources()
+
+    def signinClicked(self):
+        return self.signin()
+
+    def signin(self, uid=None):
+        """ log in the account, the selected one by default, on the selected interfaces """
+        uid, password, sources = self.loginCredentials(uid)
+
         net_interface = self.comboBox_selectNetInterface.currentText()
 
-        logger.info(f"Sign in clicked, id: {uid}, interface: {net_interface}, password: {password}")
+        logger.info(f"Sign in clicked, id: {uid}, interface: {net_interface}")
+        if password is None:
+            # 没有保存的密码或密码库已锁定，不发送必然失败的登录请求，也不记为账号故障
+            return {}
+
+        results = loginInterfaces(uid, password, sources)
+        # 账号健康状态需在返回前记录，自动切换账号紧接着读取；总线上的事件只用于补全排序
+        self.loginFinished.emit(uid, results)
+        signalBus.loginResult.emit(uid, results)
+        self.showLoginResults(uid, results)
+        return results
+
+    def showLoginResults(self, uid: str, results: dict):
+        """ show the results of a login of the account, on the GUI thread """
+        if any(result["success"] for result in results.values()):
+            self.loginSucceeded.emit(uid)
+
+        for name, result in results.items():
+            if result["success"]:
+                InfoBar.success(
+                    title='登录',
+                    content=f"已通过{name}成功登录了{uid}",
+                    orient=Qt.Horizontal,
+                    isClosable=True,
+                    position=InfoBarPosition.TOP,
+                    duration=2000,
+                    parent=self.window()
+                )
+            else:
+                logger.debug(f"login failed via {name}: {result['code']}, {result['msg']}")
 
-        url = f"https://xha.ouc.edu.cn:802/eportal/portal/login?callback=dr1003&login_method=1&user_account={uid}&user_password={password}&wlan_user_ip=0.0.0.0&wlan_user_ipv6=&wlan_user_mac=&wlan_ac_ip=&wlan_ac_name=&jsVersion=4.1&terminal_type=1&lang=zh-cn&v=5927&lang=zh"
-        response = requests.get(url)
-        # 检查响应状态
-        if response.status_code == 200:
-            logger.info("login action send successfully")
-            logger.debug(f"replay: {response.text}")
-            InfoBar.success(
-                title='登录',
-                content=f"已成功登录了{uid}",
-                orient=Qt.Horizontal,
-                isClosable=True,
-                position=InfoBarPosition.TOP,
-                duration=2000,
-                parent=self.window()
-            )
-        else:
-            logger.debug(f"login failed: {response.status_code}")
+    def recordAccountUse(self, uid: str, results: dict):
+        """ rank the account first in the completion after it logged in """
+        if uid in self.uids and any(result["success"] for result in results.values()):
+            self.accountUsed[uid] = time.time()
+            self.accountIndex.setWeight(uid, self.accountUsed[uid])
 
     def signoutClicked(self):
 
         uid = self.comboBox_selectID.currentText()
 
-        currentuid = self.netInfo
-
         net_interface = self.comboBox_selectNetInterface.currentText()
 
-        logger.info(f"Sign in clicked, id: {uid}, interface: {uid}")
-        
-        url = f"https://xha.ouc.edu.cn:802/eportal/portal/logout?callback=dr1006&login_method=1&user_account=drcom&user_password=123&ac_logout=0&register_mode=1&wlan_user_ip=0.0.0.0&wlan_user_ipv6=&wlan_vlan_id=1&wlan_user_mac=000000000000&wlan_ac_ip=&wlan_ac_name=&jsVersion=4.1&bas_ip=xha.ouc.edu.cn&type=1&v=1798&lang=zh"
-        response = requests.get(url)
-        # 检查响应状态
-        if response.status_code == 200:
-            logger.info("login action send successfully")
-            logger.debug(f"replay: {response.text}")
-            InfoBar.success(
-                title='注销',
-                content=f"已注销了{self.netInfo['IP']}",
-                orient=Qt.Horizontal,
-                isClosable=True,
-                position=InfoBarPosition.TOP,
-                duration=2000,
-                parent=self.window()
-            )
-        else:
-            logger.debug(f"login failed: {response.status_code}")
+        logger.info(f"Sign out clicked, id: {uid}, interface: {net_interface}")
+
+        results = logoutInterfaces(self.selectedSources())
+        for name, result in results.items():
+            if result["success"]:
+                InfoBar.success(
+                    title='注销',
+                    content=f"已注销了{name}上的{result['source']}",
+                    orient=Qt.Horizontal,
+                    isClosable=True,
+                    position=InfoBarPosition.TOP,
+                    duration=2000,
+                    parent=self.window()
+                )
+            else:
+                logger.debug(f"logout failed via {name}: {result['code']}, {result['msg']}")
+
+        return results
 
     def updateuids(self, uids_dict:dict):
 
         self.uids = uids_dict
         self.comboBox_selectID.clear()
         self.comboBox_selectID.addItems(uids_dict.keys())
+
+        self.accountIndex = Trie()
+        for uid in uids_dict:
+            self.accountIndex.insert(uid, uid, self.accountUsed.get(uid))
         try:
             self.comboBox_selectID.setText([key for key, value in uids_dict.items() if value[1] is True][0])
         except IndexError as e:
@@ -318,129 +430,241 @@ class NetInfoCard(GroupHeaderCardWidget):
         except Exception as e:
             logger.error(f"Failed to set default id: {e}")
 
-        logger.info(f"Get uids: {self.uids}")
+        logger.info(f"Get {len(self.uids)} uids")
         # self.comboBox_selectID.setText()
-        
-class IDManagerCard(GroupHeaderCardWidget):
-    """ System requirements card """
 
-    changed_uids = Signal(dict)
+    def applyAccountDelta(self, delta: dict):
+        """ apply the delta emitted by AccountStore to the account list """
+        if "reset" in delta:
+            self.updateuids({uid: [password, auto] for uid, password, auto in self.loadRows()})
+            return
+
+        for uid in delta["removed"]:
+            self.uids.pop(uid, None)
+            self.accountIndex.remove(uid)
+            index = self.comboBox_selectID.findText(uid)
+            if index >= 0:
+                self.comboBox_selectID.removeItem(index)
+
+        for uid, values in delta["upserted"].items():
+            if uid not in self.uids:
+                self.comboBox_selectID.addItem(uid)
+                self.accountIndex.insert(uid, uid, self.accountUsed.get(uid))
+
+            self.uids[uid] = values
+            if values[1]:
+                self.comboBox_selectID.setText(uid)
+
+    def filterAccounts(self, text: str):
+        """ show the accounts starting with the typed text, most recently used first,
+        followed by accounts one typo away """
+        n = self.accountCompleter.maxVisibleItems()
+        matches = [uid for uid, _ in self.accountIndex.items(text, n, ranked=True)]
+        if len(matches) < n and len(text) >= FUZZY_MIN_LENGTH:
+            for uid, _, _ in self.accountIndex.fuzzy(text, 1, n, prefix=True):
+                if len(matches) >= n:
+                    break
+                if uid not in matches:
+                    matches.append(uid)
+
+        self.accountCompleter.model().setStringList(matches)
+
+
+class PassphraseThread(QThread):
+    """ Runs the key derivation of the vault, which takes up to seconds, off the GUI thread """
+
+    def __init__(self, submit, parent=None):
+        super().__init__(parent)
+        self.submit = submit
+        self.passphrase = ""
+        self.error = None
+
+    def run(self):
+        self.error = None
+        try:
+            self.submit(self.passphrase)
+        except WrongPassphrase:
+            self.error = "口令错误"
+        except VaultError as e:
+            self.error = str(e)
+        except Exception as e:
+            logger.error(f"Error deriving the vault key: {e}")
+            self.error = f"操作失败：{e}"
+        finally:
+            self.passphrase = ""
+
+
+class PassphraseDialog(MessageBoxBase):
+    """ Dialog asking for the passphrase of the credential vault
+
+    Parameters
+    ----------
+    title: str
+        title of the dialog
+
+    submit: callable
+        called with the passphrase on a worker thread, the dialog stays open with the message if it raises `VaultError`
+
+    confirm: bool
+        whether the passphrase is typed twice, for a new passphrase
+    """
+
+    def __init__(self, title, submit, confirm=False, parent=None):
+        super().__init__(parent)
+        self.submit = submit
+        self.titleLabel = SubtitleLabel(title, self)
+        self.passphraseEdit = PasswordLineEdit(self)
+        self.passphraseEdit.setPlaceholderText("口令")
+        self.confirmEdit = PasswordLineEdit(self) if confirm else None
+        self.errorLabel = CaptionLabel("", self)
+        self.errorLabel.setTextColor("#cf1010", QColor(255, 28, 32))
+        self.errorLabel.hide()
+
+        self.viewLayout.addWidget(self.titleLabel)
+        self.viewLayout.addWidget(self.passphraseEdit)
+        if self.confirmEdit is not None:
+            self.confirmEdit.setPlaceholderText("确认口令")
+            self.viewLayout.addWidget(self.confirmEdit)
+        self.viewLayout.addWidget(self.errorLabel)
+        self.widget.setMinimumWidth(360)
+        self.passphraseEdit.setFocus()
+
+        self.deriveThread = PassphraseThread(submit, self)
+        self.deriveThread.finished.connect(self.onDerived)
+
+    def showError(self, text: str):
+        self.errorLabel.setText(text)
+        self.errorLabel.show()
+        return False
+
+    def validate(self):
+        passphrase = self.passphraseEdit.text()
+        if not passphrase:
+            return self.showError("请输入口令")
+        if self.confirmEdit is not None and self.confirmEdit.text() != passphrase:
+            return self.showError("两次输入的口令不一致")
+
+        # 口令正确时才关闭对话框，密钥只在这里派生一次，在后台线程中进行
+        self.errorLabel.hide()
+        self.setDeriving(True)
+        self.deriveThread.passphrase = passphrase
+        self.deriveThread.start()
+        return False
+
+    def setDeriving(self, deriving: bool):
+        for widget in (self.yesButton, self.cancelButton, self.passphraseEdit, self.confirmEdit):
+            if widget is not None:
+                widget.setEnabled(not deriving)
+
+    def onDerived(self):
+        self.setDeriving(False)
+        if self.deriveThread.error is None:
+            self.accept()
+        else:
+            self.showError(self.deriveThread.error)
+
+    def reject(self):
+        # 派生密钥时不能取消，否则后台完成的解锁不会反映到界面上
+        if not self.deriveThread.isRunning():
+            super().reject()
+
+
+class IDManagerCard(HeaderCardWidget):
+    """ Account manager card """
+
+    changed_accounts = Signal(dict)  # AccountStore 的增量变更
+    importRequested = Signal(str)    # 导入的文件
+    exportRequested = Signal(str)    # 导出的文件
+    vaultChanged = Signal(bool)      # 密码库是否锁定
+
+    ROSTER_FILTER = "CSV (*.csv);;JSON (*.json);;JSON Lines (*.jsonl)"
+
+    # 列表最多显示的行数，更多的账号通过滚动查看
+    maxVisibleRows = 8
 
     def __init__(self, title, ids : dict = None, columns_num=1, parent=None):
         super().__init__(parent)
         self.setTitle(title)
         self.setBorderRadius(8)
 
-        self._postInit(columns_num = columns_num)
+        self.store = AccountStore()
+        self.store.subscribe(self.changed_accounts.emit)
 
-        if ids is None:
-            self.ids = {}
-        else:
-            self.ids = ids
-        
-        self.user_data_path = os.path.join(os.path.expanduser("~"), "net_ids.json")
-        self.load_data()
+        # 只为可见的行绘制内容，只为正在编辑的行创建控件
+        self.model = AccountListModel(self)
+        self.accountView = AccountListView(self)
+        self.accountView.setModel(self.model)
+        self.viewLayout.setContentsMargins(16, 12, 16, 0)
+        self.viewLayout.addWidget(self.accountView)
 
-        self.changed_uids.emit(self.ids)
+        self.model.modelReset.connect(self.adjustViewHeight)
+        self.model.rowsInserted.connect(self.adjustViewHeight)
+        self.model.rowsRemoved.connect(self.adjustViewHeight)
+        self.changed_accounts.connect(self.model.applyDelta)
 
-        self.line_uid = {}
-        self.line_password = {}
-        self.checkbox = {}
-        self.line_delete = {}
-        self.line_save = {}
-        
         self.button_create = PrimaryPushButton(FluentIcon.ADD, "新建账号")
         self.button_save = PrimaryPushButton(FluentIcon.SAVE, "保存")
         self.button_reset = PushButton(FluentIcon.RETURN, "重置")
-        self.button_create.clicked.connect(lambda: self.createClicked(index=None))
+        self.button_create.clicked.connect(self.createClicked)
         self.button_save.clicked.connect(self.saveClicked)
         self.button_reset.clicked.connect(self.resetClicked)
+        self.button_import = PushButton(FluentIcon.FOLDER_ADD, "导入")
+        self.button_export = PushButton(FluentIcon.SAVE_AS, "导出")
+        self.button_import.clicked.connect(self.importClicked)
+        self.button_export.clicked.connect(self.exportClicked)
+        self.button_vault = PushButton(FluentIcon.CERTIFICATE, "加密")
+        self.button_vault.clicked.connect(self.vaultClicked)
+        self.model.reveal = self.store.reveal
+        self.model.locked = lambda: self.store.locked
+        self.model.loadRows = self.store.iterRows
+        self.updateVaultButton()
 
         # 设置底部工具栏布局
         self.bottomLayout = QHBoxLayout()
         self.bottomLayout.setSpacing(10)
         self.bottomLayout.setContentsMargins(24, 15, 24, 20)
+        self.bottomLayout.addWidget(self.button_import, 0, Qt.AlignLeft)
+        self.bottomLayout.addWidget(self.button_export, 0, Qt.AlignLeft)
+        self.bottomLayout.addWidget(self.button_vault, 0, Qt.AlignLeft)
         self.bottomLayout.addStretch(1)
         self.bottomLayout.addWidget(self.button_create, 0, Qt.AlignRight)
         self.bottomLayout.addWidget(self.button_save, 0, Qt.AlignRight)
         self.bottomLayout.addWidget(self.button_reset, 0, Qt.AlignRight)
         self.bottomLayout.setAlignment(Qt.AlignVCenter)
 
-        # 添加组件到分组中
-        for index, (uid, values) in enumerate(self.ids.items()):
-            password, auto = values
-            self.createIDitem(index, uid, password, auto)
+        self.model.setAccounts(self.load_data(return_data=True))
 
         # 添加底部工具栏
         self.vBoxLayout.addLayout(self.bottomLayout)
 
-    def createIDitem(self, index, uid = '', password = '', auto = False):
-        
-        self.line_uid[index] = LineEdit()
-        self.line_uid[index].setText(uid)
-
-        self.line_password[index] = PasswordLineEdit()
-        self.line_password[index].setText(password)
-
-        self.checkbox[index] = CheckBox("自动登录")
-        self.checkbox[index].setChecked(auto)
-        self.checkbox[index].stateChanged.connect(self.on_checkbox_state_changed)
-
-        self.line_delete[index] = PushButton(FluentIcon.DELETE, "删除")
-        self.line_delete[index].clicked.connect(lambda: self.removeGroup(index))
-        self.line_save[index] = PrimaryPushButton(FluentIcon.SAVE, "保存")
-
-        return self.addGroup(FluentIcon.INFO, "账号","账号",[self.line_uid[index],self.line_password[index], self.checkbox[index], self.line_delete[index]],group_index=index )
-
-    def on_checkbox_state_changed(self):
-        # 获取当前状态改变的checkbox
-        sender = self.sender()
-        
-        # 遍历所有的checkbox
-        if sender.isChecked():
-            # 遍历所有的checkbox
-            for key, checkbox in self.checkbox.items():
-                # 如果当前checkbox不是发送信号的checkbox，并且它被勾选，则取消勾选
-                if checkbox != sender and checkbox.isChecked():
-                    checkbox.setChecked(False)
+    def adjustViewHeight(self):
+        rows = min(max(self.model.rowCount(), 1), self.maxVisibleRows)
+        self.accountView.setFixedHeight(rows * AccountItemDelegate.ROW_HEIGHT + 8)
 
     def resetClicked(self):
         """ Reset clicked """
-        self.line_uid = {}
-        self.line_password = {}
-        self.checkbox = {}
-        self.line_delete = {}
-        self.line_save = {}
-        self.removeAll()
+        self.model.setAccounts(self.load_data(return_data=True))
 
-        for index, (uid, values) in enumerate(self.ids.items()):
-            password, auto = values 
-            self.createIDitem(index, uid, password, auto)
+    def createClicked(self):
+        index = self.model.addAccount()
+        logger.info(f"Create clicked, new row: {index.row()}")
 
-    def createClicked(self, index = None ):
-        logger.info(f"raw index: {index}, (type: {type(index)})")
-        if index is None or not isinstance(index, int):
-            logger.info(f"get index: {index}")
-            index = self.groupCount()
-        
-        logger.info(f"Create clicked, new index: {index}")
-        self.createIDitem(index = index)
+        self.accountView.scrollTo(index)
+        self.accountView.setCurrentIndex(index)
+        self.accountView.edit(index)
 
     def saveClicked(self):
         """ Save clicked """
-        ids = {}
-        counts = self.groupCount()
-
-        for i in range(counts):
-            uid = self.line_uid[i].text()
-            password = self.line_password[i].text()
-            auto = self.checkbox[i].isChecked()
-            ids[uid] = [password, auto]
-        
-        self.ids = ids
-        self.save_data()
-        self.changed_uids.emit(self.ids)
-        logger.info(f"Save clicked, ids: {self.ids}")
+        # 先提交正在编辑的行
+        self.accountView.setCurrentIndex(QModelIndex())
+        try:
+            self.save_data()
+        except VaultLocked:
+            self.showFileError("密码库已锁定，请先解锁")
+            return
+        except Exception as e:
+            self.showFileError(f"保存失败：{e}")
+            return
 
         InfoBar.success(
             title='成功',
@@ -451,26 +675,328 @@ class IDManagerCard(GroupHeaderCardWidget):
             duration=2000,
             parent=self.window()
         )
-    
+
+    def importClicked(self):
+        """ import a roster file in the background, unsaved edits have to be saved or reset first """
+        self.accountView.setCurrentIndex(QModelIndex())
+        if self.model.isModified():
+            self.showFileError("有未保存的修改，请先保存或重置")
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self.window(), "导入账号", "", self.ROSTER_FILTER)
+        if path:
+            self.setBusy(True)
+            self.importRequested.emit(path)
+
+    def exportClicked(self):
+        path, _ = QFileDialog.getSaveFileName(self.window(), "导出账号", "net_ids.csv", self.ROSTER_FILTER)
+        if path:
+            self.setBusy(True)
+            self.exportRequested.emit(path)
+
+    def updateVaultButton(self):
+        if self.store.vault is None:
+            self.button_vault.setText("加密")
+        else:
+            self.button_vault.setText("解锁" if self.store.locked else "锁定")
+
+        # 锁定时无法加密新的密码，不能新建和保存账号
+        self.button_create.setEnabled(not self.store.locked)
+        self.button_save.setEnabled(not self.store.locked)
+
+    def vaultClicked(self):
+        """ encrypt the passwords with a new passphrase, or lock or unlock the vault """
+        if self.store.vault is not None and not self.store.locked:
+            self.store.lockVault()
+            self.updateVaultButton()
+            self.vaultChanged.emit(True)
+            self.showVaultResult("密码库已锁定")
+            return
+
+        if self.store.locked:
+            dialog = PassphraseDialog("解锁密码库", self.store.unlock, parent=self.window())
+            result = "密码库已解锁"
+        else:
+            self.accountView.setCurrentIndex(QModelIndex())
+            if self.model.isModified():
+                self.showFileError("有未保存的修改，请先保存或重置")
+                return
+
+            dialog = PassphraseDialog(
+                "设置密码库口令", lambda passphrase: self.store.enableVault(passphrase, cfg.get(cfg.vaultCost)),
+                confirm=True, parent=self.window())
+            result = "已加密保存的密码，每次启动时需要输入口令解锁"
+
+        if dialog.exec():
+            self.updateVaultButton()
+            self.vaultChanged.emit(False)
+            self.showVaultResult(result)
+
+    def showVaultResult(self, content: str):
+        InfoBar.success(
+            title='成功',
+            content=content,
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=2000,
+            parent=self.window()
+        )
+
+    def setBusy(self, busy: bool):
+        for button in (self.button_import, self.button_export, self.button_reset):
+            button.setEnabled(not busy)
+        self.button_save.setEnabled(not busy and not self.store.locked)
+
+    def showFileResult(self, content: str):
+        self.setBusy(False)
+        InfoBar.success(
+            title='成功',
+            content=content,
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=3000,
+            parent=self.window()
+        )
+
+    def showFileError(self, content: str):
+        self.setBusy(False)
+        InfoBar.error(
+            title='失败',
+            content=content,
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=5000,
+            parent=self.window()
+        )
+
     def save_data(self):
-        """将数据保存到本地JSON文件"""
+        """将修改过的账号保存到本地账号库，失败时抛出异常并保留未保存的修改"""
+        upserts, removed = self.model.pendingChanges()
         try:
-            with open(self.user_data_path, "w") as f:
-                json.dump(self.ids, f)
-            logger.info(f"Data saved to: {self.user_data_path}")
+            self.store.removeMany(removed)
+            self.store.upsertMany(upserts)
         except Exception as e:
-            print(f"Error saving data: {e}")
+            logger.error(f"Error saving data: {e}")
+            raise
+
+        self.model.markSaved()
+        logger.info(f"Data saved to: {self.store.path}, {len(upserts)} changed, {len(removed)} removed")
 
     def load_data(self, return_data = False):
-        """从本地JSON文件读取数据"""
+        """从本地账号库读取数据"""
         try:
-            if os.path.exists(self.user_data_path):
-                with open(self.user_data_path, "r") as f:
-                    self.ids = json.load(f)
-                logger.info(f"Data loaded from: {self.user_data_path}")
-                if return_data:return self.ids
-            else:
-                logger.info("No saved data found.")
-                self.ids = {}
+            self.ids = self.store.all()
+            logger.info(f"Data loaded from: {self.store.path}")
         except Exception as e:
-            logger.info(f"Error loading data: {e}")
\ No newline at end of file
+            logger.error(f"Error loading data: {e}")
+            self.ids = {}
+
+        if return_data:return self.ids
+
+
+class DeviceManagerCard(HeaderCardWidget):
+    """ Online sessions of the selected account, the checked ones are kicked or unbound in one go
+
+    The filter box shows the sessions with a field starting with the typed
+    text, or with a typo of it. The index is built once per query, typing
+    only looks it up.
+    """
+
+    refreshRequested = Signal()
+    actionRequested = Signal(str, list)     # unbind 或 kick，选中的在线记录
+
+    # 列表最多显示的行数，更多的会话通过滚动查看
+    maxVisibleRows = 8
+    rowHeight = 36
+
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.setTitle(title)
+        self.setBorderRadius(8)
+
+        self.uid = None
+        self.records = []   # 最近一次查询到的在线记录
+        self.ownIP = None   # 本机的会话默认不勾选
+        self.deviceIndex = Trie()   # 记录的各字段 -> 所在的行
+
+        self.searchEdit = SearchLineEdit(self)
+        self.searchEdit.setPlaceholderText("按 IP、MAC 或设备名筛选")
+        self.searchEdit.textChanged.connect(self.filterDevices)
+        self.deviceList = ListWidget(self)
+        self.deviceList.itemChanged.connect(self.updateButtons)
+        self.viewLayout.setContentsMargins(16, 12, 16, 0)
+        self.viewLayout.setSpacing(8)
+        self.viewLayout.addWidget(self.searchEdit)
+        self.viewLayout.addWidget(self.deviceList)
+
+        self.hintLabel = BodyLabel("点击刷新查询当前账号的在线设备")
+        self.selectAllBox = CheckBox("全选")
+        self.selectAllBox.clicked.connect(self.selectAll)
+        self.refreshButton = PushButton(FluentIcon.SYNC, "刷新")
+        self.refreshButton.clicked.connect(self.refreshClicked)
+        self.kickButton = PushButton(FluentIcon.POWER_BUTTON, "下线")
+        self.kickButton.clicked.connect(lambda: self.actionClicked("kick"))
+        self.unbindButton = PrimaryPushButton(FluentIcon.REMOVE, "解绑")
+        self.unbindButton.clicked.connect(lambda: self.actionClicked("unbind"))
+
+        # 设置底部工具栏布局
+        self.bottomLayout = QHBoxLayout()
+        self.bottomLayout.setSpacing(10)
+        self.bottomLayout.setContentsMargins(24, 15, 24, 20)
+        self.bottomLayout.addWidget(self.selectAllBox, 0, Qt.AlignLeft)
+        self.bottomLayout.addWidget(self.hintLabel, 0, Qt.AlignLeft)
+        self.bottomLayout.addStretch(1)
+        self.bottomLayout.addWidget(self.refreshButton, 0, Qt.AlignRight)
+        self.bottomLayout.addWidget(self.kickButton, 0, Qt.AlignRight)
+        self.bottomLayout.addWidget(self.unbindButton, 0, Qt.AlignRight)
+        self.bottomLayout.setAlignment(Qt.AlignVCenter)
+
+        # 添加底部工具栏
+        self.vBoxLayout.addLayout(self.bottomLayout)
+        self.setDevices(None, [])
+
+    def setDevices(self, uid, devices: list):
+        """ show the online records of the account """
+        self.uid = uid
+        self.records = list(devices)
+        self.updateDeviceIndex()
+        self.deviceList.blockSignals(True)
+        self.deviceList.setUpdatesEnabled(False)
+        self.deviceList.clear()
+        for device in devices:
+            ip, mac = device.get("online_ip", ""), device.get("online_mac", "")
+            own = self.ownIP is not None and ip == self.ownIP
+            item = QListWidgetItem(f"{ip}    {mac.upper()}" + ("    (本机)" if own else ""))
+            item.setData(Qt.UserRole, device)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked if own else Qt.Checked)
+            self.deviceList.addItem(item)
+        self.deviceList.setUpdatesEnabled(True)
+        self.deviceList.blockSignals(False)
+
+        rows = min(max(len(devices), 1), self.maxVisibleRows)
+        self.deviceList.setFixedHeight(rows * self.rowHeight + 8)
+        if uid is not None:
+            self.hintLabel.setText(f"{uid} 有 {len(devices)} 个在线会话")
+        self.filterDevices(self.searchEdit.text())
+        self.setBusy(False)
+
+    def updateDeviceIndex(self):
+        """ index the text fields of the records, only called when the records change """
+        self.deviceIndex = Trie()
+        for row, device in enumerate(self.records):
+            for field, value in device.items():
+                if field == "user_account" or not isinstance(value, str) or not value:
+                    continue
+
+                rows = self.deviceIndex.get(value)
+                if rows is None:
+                    self.deviceIndex.insert(value, [row])
+                elif rows[-1] != row:
+                    rows.append(row)
+
+    def searchDevices(self, text: str) -> set:
+        """ rows of the records with a field starting with the text, or with a typo of it """
+        rows = set()
+        for _, matched in self.deviceIndex.items(text):
+            rows.update(matched)
+
+        if not rows and len(text) >= FUZZY_MIN_LENGTH:
+            for _, matched, _ in self.deviceIndex.fuzzy(text, 1, prefix=True):
+                rows.update(matched)
+
+        return rows
+
+    def filterDevices(self, text: str):
+        text = text.strip()
+        rows = self.searchDevices(text) if text else None
+        for row in range(self.deviceList.count()):
+            self.deviceList.item(row).setHidden(rows is not None and row not in rows)
+        self.updateButtons()
+
+    def visibleItems(self):
+        items = (self.deviceList.item(row) for row in range(self.deviceList.count()))
+        return [item for item in items if not item.isHidden()]
+
+    def selectedDevices(self) -> list:
+        """ checked records, sessions hidden by the filter are left alone """
+        return [item.data(Qt.UserRole) for item in self.visibleItems() if item.checkState() == Qt.Checked]
+
+    def selectAll(self, checked: bool):
+        self.deviceList.blockSignals(True)
+        for item in self.visibleItems():
+            item.setCheckState(Qt.Checked if checked else Qt.Unchecked)
+        self.deviceList.blockSignals(False)
+        self.updateButtons()
+
+    def updateButtons(self, *args):
+        selected = len(self.selectedDevices())
+        self.kickButton.setEnabled(selected > 0)
+        self.unbindButton.setEnabled(selected > 0)
+        self.selectAllBox.setChecked(selected > 0 and selected == len(self.visibleItems()))
+
+    def setBusy(self, busy: bool, text: str = None):
+        """ disable the buttons while a query or an action runs """
+        self.refreshButton.setEnabled(not busy)
+        self.selectAllBox.setEnabled(not busy)
+        self.deviceList.setEnabled(not busy)
+        if busy:
+            self.kickButton.setEnabled(False)
+            self.unbindButton.setEnabled(False)
+        else:
+            self.updateButtons()
+
+        if text:
+            self.hintLabel.setText(text)
+
+    def refreshClicked(self):
+        self.setBusy(True, "正在查询在线设备")
+        self.refreshRequested.emit()
+
+    def actionClicked(self, action: str):
+        devices = self.selectedDevices()
+        if not devices:
+            return
+
+        logger.info(f"{action.capitalize()} clicked, {len(devices)} sessions of {self.uid}")
+        self.setBusy(True, f"正在{'解绑' if action == 'unbind' else '下线'} {len(devices)} 个会话")
+        self.actionRequested.emit(action, devices)
+
+    def showError(self, message: str):
+        self.setBusy(False, message)
+
+    def applyResults(self, action: str, results: list):
+        """ show the outcome of an action, the sessions confirmed gone leave the list """
+        gone = {(result["ip"], result["mac"]) for result in results if result["confirmed"]}
+        items = (self.deviceList.item(row) for row in range(self.deviceList.count()))
+        devices = [item.data(Qt.UserRole) for item in items]
+        self.setDevices(self.uid, [
+            device for device in devices if (device.get("online_ip"), device.get("online_mac")) not in gone])
+
+        confirmed = len(gone)
+        failed = len(results) - confirmed
+
+        name = "解绑" if action == "unbind" else "下线"
+        if failed:
+            InfoBar.warning(
+                title=name,
+                content=f"已{name} {confirmed} 个会话，{failed} 个会话仍然在线",
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=4000,
+                parent=self.window()
+            )
+        else:
+            InfoBar.success(
+                title=name,
+                content=f"已{name} {confirmed} 个会话",
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=2000,
+                parent=self.window()
+            )
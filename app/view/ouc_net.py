@@ -8,26 +8,48 @@ from .gallery_interface import GalleryInterface
 
 from .net_info import NetInfoCard
 
+from ..common.portal import PortalClient, manageDevices, loginInterfaces
+from ..common.portal_profile import defaultProfile
+from ..common.account_health import AccountHealthChecker
+from ..common.account_io import importAccounts, exportAccounts, AccountFileError
+from ..common.vault import VaultError, VaultLocked
+from ..common.rate_limit import RateLimitedError
+from ..common.config import cfg
+from ..common.signal_bus import signalBus
+from ..common.profiler import profileJob
+from ..common.keepalive import IdleTimeoutEstimator
+from ..common.logout_predictor import LogoutPredictor, TransitionLog
+from ..common.metrics import (probeRtt, probes, refreshDuration, refreshes, networkOnline, offlineSeconds,
+                              sessionExpiries, heartbeatInterval, logoutWindows, prelogins, preloginDowntime,
+                              accountStates, loginFailovers)
+
 import requests
 import re
-import json
 from bs4 import BeautifulSoup
 import subprocess
 import yaml
 import platform
+import time
 
 from loguru import logger
 
 class NetworkUpdateThread(QThread):
     """后台线程，用于更新网络信息"""
-    update_signal = Signal(dict)  # 用信号发送网络信息到主线程
+    IP_URL = "http://ip.ouc.edu.cn"
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
+        self.portal = PortalClient()
 
     def run(self):
+        with profileJob("refresh"):
+            self.refresh()
+
+    def refresh(self):
         """在后台线程执行网络信息更新"""
+        start = time.perf_counter()
+        result = "ok"
         try:
                 if self.parent.network_was_down:
                     logger.info(f"Network is down, skip fetching network data")
@@ -43,70 +65,25 @@ class NetworkUpdateThread(QThread):
                                         }
                 else:
                     new_netinfo = self.fetchNetworkData()
-                self.update_signal.emit(new_netinfo)
+                signalBus.netSnapshot.emit(new_netinfo)
+        except RateLimitedError as e:
+            result = "limited"
+            logger.info(f"Skip fetching network data: {e}")
         except Exception as e:
+            result = "error"
             logger.error(f"Error fetching network data: {e}")
+        finally:
+            refreshDuration.observe(time.perf_counter() - start)
+            refreshes.inc(result=result)
     
-    def getDrcomUrl(self, type=None, id = None):
-        if type == "id":
-            return "https://xha.ouc.edu.cn"
-        elif type == "devices":
-            uid , _ = self.fetchUserID()
-            return f"https://xha.ouc.edu.cn:802/eportal/portal/page/loadOnlineRecord?callback=dr1004&lang=zh-CN&program_index=ctshNw1713845951&page_index=V5fmKw1713845966&user_account={uid}&wlan_user_ip=0.0.0.0&wlan_user_mac=000000000000&start_time=2010-01-01&end_time=2100-01-01&start_rn=1&end_rn=5&jsVersion=4.1&v=3747&lang=zh"
-        elif type == "bind":
-            uid , _ = self.fetchUserID()
-            return f"https://xha.ouc.edu.cn:802/eportal/portal/mac/custom?callback=dr1002&lang=zh-CN&program_index=ctshNw1713845951&page_index=V5fmKw1713845966&user_account={uid}&wlan_user_ip=0.0.0.0&wlan_user_mac=000000000000&jsVersion=4.1&v=8569&lang=zh"
-
     def fetchUserID(self):
-        response = requests.get(self.getDrcomUrl("id"))
-
-        if response.status_code == 200:
-            # 使用 BeautifulSoup 解析 HTML 内容
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 查找所有的 <script> 标签
-            scripts = soup.find_all('script')
-
-            # 正则表达式用于提取 uid 和 v4ip
-            uid_pattern = re.compile(r"uid='([^']+)'")
-            v4ip_pattern = re.compile(r"v4ip='([^']+)'")
-
-            # 从每个 <script> 中查找匹配的内容
-            uid = None
-            v4ip = None
-
-            for script in scripts:
-                # 搜索 uid 和 v4ip
-                if not uid:
-                    uid_match = uid_pattern.search(script.string if script.string else '')
-                    if uid_match:
-                        uid = uid_match.group(1)
-                if not v4ip:
-                    v4ip_match = v4ip_pattern.search(script.string if script.string else '')
-                    if v4ip_match:
-                        v4ip = v4ip_match.group(1)
-
-                if uid and v4ip:
-                    break
-        return uid, v4ip
+        return self.portal.fetchUserID()
 
     def fetchDevices(self):
-        response = requests.get(self.getDrcomUrl("devices"))
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            match = re.match(r"(dr\d+)(?=\()", soup.text)
-            if match:
-                cleaned_response = re.sub(r"^dr\d+\(|\);$", "", soup.text)
-            else:
-                print("未匹配到数据")
-
-            json_data = json.loads(cleaned_response)
-            records = json_data['records']
-        return records
+        return self.portal.fetchDevices()
     
     def fetchIP(self):
-        url = "http://ip.ouc.edu.cn"
-        response = requests.get(url)
+        response = requests.get(self.IP_URL)
 
         if response.status_code == 200:
             # 使用 BeautifulSoup 解析 HTML 内容
@@ -267,7 +244,7 @@ class NetworkUpdateThread(QThread):
 
         logger.info(f"Fetching network status data...")
         online_interface, net_status = self.get_network_info()
-        logger.debug(f"Online interface: {online_interface}, Net status: {net_status}")
+        logger.debug("Online interface: {}, Net status: {}", online_interface, net_status)
 
         if len(online_interface) == 0:
             return {
@@ -280,7 +257,8 @@ class NetworkUpdateThread(QThread):
                 "id": "Unknown",
                 "device": []
             }
-        elif len(online_interface) == 1:
+        else:
+            # 多个接口同时在线时，以第一个接口为主，其余接口记录在interfaces中
             if ipv4 is None:
                 ipv4 = net_status[online_interface[0]]['ipv4']
             logger.debug(f"Final IPv4: {ipv4}")
@@ -301,6 +279,7 @@ class NetworkUpdateThread(QThread):
                 "interface": net_type,
                 "DNS": dns,
                 "id": uid,
+                "interfaces": {net_type: net_status[net_type]['ipv4'] for net_type in online_interface},
                 "device": [
                     {
                         "name": "DESKTOP-AAAAAA",
@@ -316,7 +295,7 @@ class NetworkUpdateThread(QThread):
                     },
                 ]
             }
-            logger.debug(f"Return data: {return_res}")
+            logger.debug("Return data: {}", return_res)
             return return_res
 
 class NetworkOnline(QThread):
@@ -325,14 +304,19 @@ class NetworkOnline(QThread):
 
     network_offline_signal = Signal(bool)
 
-    network_change_signal = Signal(bool)  # 用信号发送网络状态变化到主线程
+    PROBE_TARGETS = {"baidu": "www.baidu.com", "ouc": "211.64.142.5", "ouc_w": "192.168.101.201"}
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         self.last_status = False
+        self.lastProbe = None   # 上一次探测的时间，用于统计离线时长
 
     def run(self):
+        with profileJob("probe"):
+            self.probe()
+
+    def probe(self):
         try:
             is_online = False
             online_baidu, online_ouc, online_ouc_w = self.checkNetworkOnline()
@@ -342,68 +326,61 @@ class NetworkOnline(QThread):
                 is_online = False
                 self.network_offline_signal.emit(is_online)
 
+            self.recordStatus(is_online)
             self.network_status_signal.emit(is_online)
             if is_online != self.last_status:
-                self.network_change_signal.emit(is_online)
+                signalBus.netStateChanged.emit(is_online)
                 self.last_status = is_online
         except Exception as e:
             logger.error(f"Error check network status: {e}")
-    
-    def checkNetworkOnline(self):
-        try:
-            # ping baidu
-            param = "-n" if platform.system().lower() == "windows" else "-c"
-            command = ["ping", param, "1", "www.baidu.com"]  
-            logger.info(f"Start ping Baidu")
-            if platform.system() == 'Darwin':
-                baidu_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            elif platform.system() == 'Windows':
-                baidu_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
-                                                 creationflags=subprocess.CREATE_NO_WINDOW)
-
-            # ping ouc dns
-            param = "-n" if platform.system().lower() == "windows" else "-c"
-            command = ["ping", param, "1", "211.64.142.5"]
-            logger.info(f"Start ping OUC")
-            if platform.system() == 'Darwin':
-                ouc_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            elif platform.system() == 'Windows':
-                ouc_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
-                                               creationflags=subprocess.CREATE_NO_WINDOW)
-    
-            # ping ouc west
-            param = "-n" if platform.system().lower() == "windows" else "-c"
-            command = ["ping", param, "1", "192.168.101.201"]
-            logger.info(f"Start ping OUC-W")
-            if platform.system() == 'Darwin':
-                ouc_w_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            elif platform.system() == 'Windows':
-                ouc_w_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
-                                                 creationflags=subprocess.CREATE_NO_WINDOW)
-
-            baidu_result = baidu_process.wait(timeout=5)
-            ouc_result = ouc_process.wait(timeout=5)
-            ouc_w_result = ouc_w_process.wait(timeout=5)
-
-            if baidu_result == 0:
-                online_baidu = True
-            else:
-                online_baidu = False
-            logger.info(f"Finish ping Baidu: {online_baidu}")
 
-            if ouc_result == 0:
-                online_ouc = True
-            else:
-                online_ouc = False
+    def recordStatus(self, is_online):
+        """ 统计在线状态，两次探测之间的时间按上一次的状态计入离线时长 """
+        now = time.monotonic()
+        if self.lastProbe is not None and not self.last_status:
+            offlineSeconds.inc(now - self.lastProbe)
 
-            logger.info(f"Finish ping OUC: {online_ouc}")
+        self.lastProbe = now
+        networkOnline.set(1 if is_online else 0)
 
-            if ouc_w_result == 0:
-                online_ouc_w = True
-            else:
-                online_ouc_w = False
+    def startPing(self, host):
+        param = "-n" if platform.system().lower() == "windows" else "-c"
+        command = ["ping", param, "1", host]
+        if platform.system() == 'Windows':
+            return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                    creationflags=subprocess.CREATE_NO_WINDOW)
+
+        return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def waitPing(self, name, process, start):
+        """ 等待 ping 结束并记录往返时间，优先使用 ping 输出中的 time=xx ms """
+        try:
+            output, _ = process.communicate(timeout=5)
+            online = process.returncode == 0
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            output, online = "", False
+
+        probes.inc(target=name, result="ok" if online else "fail")
+        if online:
+            match = re.search(r"[=<]\s*([\d.]+)\s*ms", output)
+            probeRtt.observe(float(match.group(1)) / 1000 if match else time.perf_counter() - start, target=name)
 
-            logger.info(f"Finish ping OUC-W: {online_ouc_w}")
+        logger.info(f"Finish ping {name}: {online}")
+        return online
+
+    def checkNetworkOnline(self):
+        try:
+            # 同时 ping 百度、OUC DNS 和 OUC 西区
+            start = time.perf_counter()
+            processes = {}
+            for name, host in self.PROBE_TARGETS.items():
+                logger.info(f"Start ping {name}")
+                processes[name] = self.startPing(host)
+
+            results = {name: self.waitPing(name, process, start) for name, process in processes.items()}
+            online_baidu, online_ouc, online_ouc_w = results["baidu"], results["ouc"], results["ouc_w"]
         except Exception as e:
             logger.error(f"checkNetwork Failed: {e}")
             online_baidu = online_ouc = online_ouc_w = False
@@ -411,8 +388,212 @@ class NetworkOnline(QThread):
 
 
 
+class KeepAliveThread(QThread):
+    """后台线程，发送心跳请求刷新门户会话的空闲计时"""
+    heartbeat_signal = Signal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.portal = PortalClient()
+        self.kind = "head"
+        self.uid = None
+
+    def run(self):
+        with profileJob("heartbeat"):
+            result = self.portal.heartbeat(self.kind, self.uid)
+
+        logger.debug(f"Heartbeat {self.kind}: {result['success']}, {result['code']} {result['msg']}")
+        self.heartbeat_signal.emit(result)
+
+
+class PreloginThread(QThread):
+    """后台线程，在预测的强制下线时段内高频检查会话，下线后立即重新登录"""
+    logout_signal = Signal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.uid = None
+        self.password = None
+        self.sources = {}
+        self.end = 0.0          # 时段结束的时间戳
+        self.interval = 1.0
+
+    def run(self):
+        with profileJob("prelogin"):
+            self.watch()
+
+    def watch(self):
+        # 时段开始时建立连接并备好账号密码，下线后只需一次登录请求
+        clients = {name: PortalClient(address) for name, address in self.sources.items()}
+        lastOnline = dict.fromkeys(clients)
+
+        while clients and time.time() < self.end and not self.isInterruptionRequested():
+            for name, client in list(clients.items()):
+                checked = time.time()
+                try:
+                    uid, _ = client.fetchUserID(strict=True)
+                except Exception as e:
+                    # 请求失败说明接口本身断开或被限流，不是门户的强制下线
+                    logger.debug(f"Watch via {name} failed: {e}")
+                    continue
+
+                if uid:
+                    lastOnline[name] = checked
+                    continue
+
+                if lastOnline[name] is None:
+                    # 时段开始时已不在线，交给常规的自动登录
+                    clients.pop(name)
+                    continue
+
+                result = client.login(self.uid, self.password)
+                self.logout_signal.emit({
+                    "interface": name, "lower": lastOnline[name], "upper": checked,
+                    "login": time.time(), "result": result,
+                })
+                signalBus.loginResult.emit(self.uid, {name: result})
+                clients.pop(name)
+
+            self.msleep(int(self.interval * 1000))
+
+
+class SigninThread(QThread):
+    """后台线程，自动登录：依次尝试候选账号，账号本身的故障时换下一个账号"""
+    result_signal = Signal(str, dict)   # 最后尝试的账号，各接口的登录结果
+
+    def __init__(self, health: AccountHealthChecker, parent=None):
+        super().__init__(parent)
+        self.health = health
+        self.reveal = None
+        self.accounts = []      # (账号, 保存的密码)，密码在尝试该账号时才解密
+        self.sources = {}
+
+    def run(self):
+        with profileJob("signin"):
+            try:
+                uid, results = self.failover()
+            except Exception as e:
+                logger.error(f"Auto sign in Failed: {e}")
+                return
+
+        if uid is not None:
+            self.result_signal.emit(uid, results)
+
+    def failover(self):
+        uid, results = None, {}
+        for i, (candidate, saved) in enumerate(self.accounts):
+            try:
+                password = self.reveal(candidate, saved)
+            except VaultLocked:
+                logger.warning(f"Credential vault is locked, cannot log in {candidate}")
+                break
+            except VaultError as e:
+                logger.error(f"Cannot open the password of {candidate}: {e}")
+                continue
+
+            if i:
+                loginFailovers.inc()
+                logger.info(f"Fail over to account {candidate}")
+
+            uid = candidate
+            results = loginInterfaces(uid, password, self.sources)
+            # 先记录健康状态再判断是否换账号，总线上的事件只用于补全排序
+            self.health.recordLogin(uid, results, defaultProfile().classifyFailure)
+            signalBus.loginResult.emit(uid, results)
+            if any(result["success"] for result in results.values()):
+                break
+
+            # 网络等其他故障不再继续尝试
+            if self.health.get(uid).healthy:
+                break
+
+        return uid, results
+
+
+class DeviceThread(QThread):
+    """后台线程，查询账号的在线设备，或批量解绑、下线选中的会话"""
+    results_signal = Signal(str, list)      # 操作，每个会话的结果
+    error_signal = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.portal = PortalClient()
+        self.uid = None
+        self.action = None      # None 表示只查询在线记录
+        self.devices = []
+        self.concurrency = 8
+
+    def run(self):
+        with profileJob("devices"):
+            try:
+                if self.action is None:
+                    uid = self.uid or self.portal.fetchUserID()[0]
+                    signalBus.devicesChanged.emit(uid, self.portal.fetchDevices(uid))
+                else:
+                    results = manageDevices(self.action, self.uid, self.devices, self.concurrency,
+                                            timeout=self.portal.timeout, limiter=self.portal.limiter)
+                    self.results_signal.emit(self.action, results)
+            except RateLimitedError as e:
+                self.error_signal.emit("请求过于频繁，请稍后再试")
+                logger.info(f"Skip device request: {e}")
+            except Exception as e:
+                self.error_signal.emit(f"查询失败：{e}")
+                logger.error(f"Error managing devices of {self.uid}: {e}")
+
+
+class AccountFileThread(QThread):
+    """后台线程，批量导入或导出账号文件"""
+    result_signal = Signal(str)
+    error_signal = Signal(str)
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.action = "import"
+        self.path = None
+
+    def run(self):
+        with profileJob("account_file"):
+            try:
+                if self.action == "import":
+                    report = importAccounts(self.store, self.path)
+                    content = f"导入 {report.rows} 个账号，新增 {report.added} 个"
+                    if report.invalid:
+                        content += f"，跳过 {report.invalid} 行无效数据"
+                else:
+                    content = f"已导出 {exportAccounts(self.store, self.path)} 个账号"
+                self.result_signal.emit(content)
+            except AccountFileError as e:
+                self.error_signal.emit(str(e))
+            except VaultLocked:
+                self.error_signal.emit("密码库已锁定，请先解锁")
+            except Exception as e:
+                self.error_signal.emit(f"处理文件失败：{e}")
+                logger.error(f"Error processing {self.path}: {e}")
+
+
+class AccountHealthThread(QThread):
+    """后台线程，并发检查所有已保存账号的在线会话数"""
+    health_signal = Signal(dict)    # 账号 -> 状态
+
+    def __init__(self, checker: AccountHealthChecker, parent=None):
+        super().__init__(parent)
+        self.checker = checker
+        self.uids = []
+
+    def run(self):
+        with profileJob("account_health"):
+            self.checker.check(self.uids)
+
+        # 每轮只查询一部分账号，统计包含全部账号的缓存状态
+        self.health_signal.emit({uid: self.checker.get(uid).state for uid in self.uids})
+
+
 class OUCNet(GalleryInterface):
 
+    PRELOGIN_MAX_WAIT = 600     # 长时间等待分段进行，跨过休眠和时钟调整后重新计算
+    NETINFO_THROTTLE = 500      # 网络信息最多每 500 ms 刷新一次界面，只显示最新的一次
+
     def __init__(self, parent=None):
         super().__init__(
             title="OUC Net",
@@ -425,19 +606,93 @@ class OUCNet(GalleryInterface):
         self.netInfoCard = self.addNetInfoCard("网络状态")
 
         self.idManagerCard = self.addIDManagerCard("ID管理")
+        self.deviceCard = self.addDeviceManagerCard("在线设备")
         self.update_uids()
 
-        # 初始化uids信号
-        self.idManagerCard.changed_uids.connect(self.update_uids)
+        # 账号变更时只同步增量
+        self.idManagerCard.changed_accounts.connect(self.netInfoCard.applyAccountDelta)
+
+        # 账号健康检查：后台并发查询所有账号，自动登录跳过已知失败的账号
+        self.accountHealth = AccountHealthChecker(
+            ttl=2 * cfg.get(cfg.accountCheckInterval), deviceLimit=cfg.get(cfg.accountDeviceLimit),
+            batch=cfg.get(cfg.accountCheckBatch))
+        self.threadAccountHealth = AccountHealthThread(self.accountHealth, self)
+        self.threadAccountHealth.health_signal.connect(self.onAccountHealth)
+        # 后台模式下照常运行：自动登录在后台同样依赖账号状态，每几分钟才唤醒一次
+        self.accountHealthTimer = QTimer(self)
+        self.accountHealthTimer.setTimerType(Qt.VeryCoarseTimer)
+        self.accountHealthTimer.timeout.connect(self.countWakeup)
+        self.accountHealthTimer.timeout.connect(self.startAccountCheck)
+        self.accountHealthTimer.start(cfg.get(cfg.accountCheckInterval) * 1000)
+        self.idManagerCard.changed_accounts.connect(self.onAccountsChanged)
+        self.netInfoCard.loginFinished.connect(self.onLoginFinished)
+        self.startAccountCheck()
+
+        # 自动登录在后台线程中逐个尝试候选账号，界面只处理最终结果
+        self.threadSignin = SigninThread(self.accountHealth, self)
+        self.threadSignin.result_signal.connect(self.onSigninFinished)
+        self.threadSignin.finished.connect(lambda: self.replySignin(RuntimeError("no account could be logged in")))
+        self.signinWaiters = []     # 等待本轮登录结果的本地套接字请求
 
         # 初始化网络更新线程
         self.threadUpdateNetInfo = NetworkUpdateThread(self)
-        self.threadUpdateNetInfo.update_signal.connect(self.updateNetInfo)
+        self.netInfoSubscription = signalBus.subscribe(
+            "netSnapshot", self.updateNetInfo, throttle=self.NETINFO_THROTTLE, parent=self)
 
         self.threadUpdateNetStatus = NetworkOnline(self)
-        self.threadUpdateNetStatus.network_change_signal.connect(self.handleNetworkStatus)
+        self.netStateSubscription = signalBus.subscribe("netStateChanged", self.handleNetworkStatus, parent=self)
         self.threadUpdateNetStatus.network_offline_signal.connect(self.startSignin)
 
+        # 会话保活：在门户的空闲超时之前发送心跳，超时时间从掉线记录中学习
+        self.keepAlive = IdleTimeoutEstimator(fixed=cfg.get(cfg.keepAliveInterval) or None)
+        self.keepAlive.restore(cfg.get(cfg.keepAliveLearned))
+        self.threadKeepAlive = KeepAliveThread(self)
+        self.threadKeepAlive.heartbeat_signal.connect(self.onHeartbeat)
+        # 后台模式下照常运行：心跳推迟会话就会超时掉线，间隔为学习到的超时时间的一部分
+        self.keepAliveTimer = QTimer(self)
+        self.keepAliveTimer.setSingleShot(True)
+        self.keepAliveTimer.setTimerType(Qt.CoarseTimer)
+        self.keepAliveTimer.timeout.connect(self.countWakeup)
+        self.keepAliveTimer.timeout.connect(self.startHeartbeat)
+        self.threadUpdateNetStatus.network_status_signal.connect(self.onProbeStatus)
+        self.netInfoCard.loginSucceeded.connect(self.onSessionRefreshed)
+
+        # 密码库：启动时解锁一次，之后登录只解密所用账号的密码
+        self.netInfoCard.revealPassword = self.idManagerCard.store.reveal
+        self.netInfoCard.loadRows = self.idManagerCard.store.iterRows
+        self.idManagerCard.vaultChanged.connect(self.onVaultChanged)
+        if self.idManagerCard.store.locked:
+            QTimer.singleShot(0, self.idManagerCard.vaultClicked)
+
+        # 账号文件的导入导出，整个文件在一个事务中写入，界面只刷新一次
+        self.threadAccountFile = AccountFileThread(self.idManagerCard.store, self)
+        self.threadAccountFile.result_signal.connect(self.idManagerCard.showFileResult)
+        self.threadAccountFile.error_signal.connect(self.idManagerCard.showFileError)
+        self.idManagerCard.importRequested.connect(lambda path: self.startAccountFile("import", path))
+        self.idManagerCard.exportRequested.connect(lambda path: self.startAccountFile("export", path))
+
+        # 在线设备管理
+        self.threadDevices = DeviceThread(self)
+        self.devicesSubscription = signalBus.subscribe("devicesChanged", self.deviceCard.setDevices, parent=self)
+        self.threadDevices.results_signal.connect(self.deviceCard.applyResults)
+        self.threadDevices.error_signal.connect(self.deviceCard.showError)
+        self.deviceCard.refreshRequested.connect(self.refreshDevices)
+        self.deviceCard.actionRequested.connect(self.startDeviceAction)
+
+        # 预测强制下线：在学习到的下线时刻前后高频检查会话，下线后立即重新登录
+        self.logoutPredictor = LogoutPredictor(TransitionLog())
+        self.preloginHandled = 0.0  # 已处理的时段的结束时间
+        self.threadPrelogin = PreloginThread(self)
+        self.threadPrelogin.logout_signal.connect(self.onForcedLogout)
+        self.threadPrelogin.finished.connect(self.schedulePrelogin)
+        # 后台模式下照常运行：只在预测的下线时段开始时唤醒，最长等待 PRELOGIN_MAX_WAIT 秒
+        self.preloginTimer = QTimer(self)
+        self.preloginTimer.setSingleShot(True)
+        self.preloginTimer.setTimerType(Qt.PreciseTimer)
+        self.preloginTimer.timeout.connect(self.countWakeup)
+        self.preloginTimer.timeout.connect(self.startPrelogin)
+        self.schedulePrelogin()
+
         # 定时连接网络
         # self.signinTimer  = QTimer(self)
         # self.signinTimer.timeout.connect(self.startSignin)
@@ -445,17 +700,31 @@ class OUCNet(GalleryInterface):
 
         # 定时更新网络通断
         self.netInfoUpdateTimer  = QTimer(self)
+        self.netInfoUpdateTimer.timeout.connect(self.countWakeup)
         self.netInfoUpdateTimer.timeout.connect(self.startNetworkUpdate)
         self.netInfoUpdateTimer.start(3000) 
 
         # 定时更新网络信息
         self.networkStatusCheckTimer  = QTimer(self)
+        self.networkStatusCheckTimer.timeout.connect(self.countWakeup)
         self.networkStatusCheckTimer.timeout.connect(self.startCheckNetworkOnline)
         self.networkStatusCheckTimer.start(5000)
 
+        # 后台模式下两个定时器合并为一个低频定时器，只检测网络通断
+        self.backgroundTimer = QTimer(self)
+        self.backgroundTimer.setTimerType(Qt.VeryCoarseTimer)
+        self.backgroundTimer.timeout.connect(self.countWakeup)
+        self.backgroundTimer.timeout.connect(self.startCheckNetworkOnline)
+
         self.time_elapsed = 0
         self.network_was_down = False
         self.login_counts_limits = 5
+
+        self.isBackground = False
+        self.pendingNetInfo = None  # 后台模式下收到的最新网络信息
+        self.netInfoUpdated = None  # 最近一次收到网络信息的时间
+        self.wakeups = 0
+        self.wakeupsSince = time.monotonic()
     
     def update_uids(self, uids_dict: dict = None):
         try:
@@ -469,11 +738,85 @@ class OUCNet(GalleryInterface):
             logger.error(f"Error updating uids: {e}")
 
     def startSignin(self):
+        """ log in automatically in the background, failing over to the next account """
+        self.signinAccounts(None)
+
+    def signinAccounts(self, candidates: list = None):
+        """ try `candidates` in order in `SigninThread`, the auto login candidates by default """
+        if self.threadSignin.isRunning():
+            return
+
         try:
             logger.info(f"Start sign in")
-            self.netInfoCard.signinClicked()
+            candidates = candidates or self.signinCandidates()
+            if not candidates:
+                logger.warning("No healthy account to log in, waiting for the failures to expire")
+                self.replySignin(RuntimeError("no healthy account to log in"))
+                return
+
+            uids = self.netInfoCard.uids
+            self.threadSignin.accounts = [(uid, uids[uid][0]) for uid in candidates if uid in uids]
+            self.threadSignin.reveal = self.netInfoCard.revealPassword
+            self.threadSignin.sources = self.netInfoCard.selectedSources()
+            self.threadSignin.start()
         except Exception as e:
             logger.error(f"Auto sign in Failed: {e}")
+            self.replySignin(e)
+
+    def onSigninFinished(self, uid: str, results: dict):
+        self.netInfoCard.showLoginResults(uid, results)
+        success = any(result["success"] for result in results.values())
+        if success and uid != self.netInfoCard.comboBox_selectID.currentText():
+            self.netInfoCard.comboBox_selectID.setText(uid)
+
+        self.replySignin({"uid": uid, "success": success, "results": results})
+
+    def replySignin(self, reply):
+        """ answer the local socket requests waiting for the login round, `reply` is a dict or an exception """
+        waiters, self.signinWaiters = self.signinWaiters, []
+        for respond in waiters:
+            respond(reply)
+
+    def signinCandidates(self) -> list:
+        """ accounts auto login tries in order, the selected one first unless it is known to fail """
+        preferred = self.netInfoCard.comboBox_selectID.currentText()
+        if not cfg.get(cfg.accountFailover):
+            return [preferred] if preferred else []
+
+        return self.accountHealth.candidates(preferred, list(self.netInfoCard.uids))
+
+    def startAccountCheck(self):
+        """ validate the saved accounts in the background """
+        if self.threadAccountHealth.isRunning() or not self.netInfoCard.uids:
+            return
+
+        self.threadAccountHealth.uids = list(self.netInfoCard.uids)
+        self.threadAccountHealth.start()
+
+    def onAccountHealth(self, states: dict):
+        counts = {}
+        for state in states.values():
+            counts[state] = counts.get(state, 0) + 1
+
+        for state in ("ok", "unknown", "credentials", "quota", "devices"):
+            accountStates.set(counts.get(state, 0), state=state)
+
+    def onAccountsChanged(self, delta: dict):
+        """ forget the health of changed accounts, e.g. a new password, and check them again """
+        if "reset" in delta:
+            self.accountHealth.invalidate()
+
+        for uid in list(delta["upserted"]) + delta["removed"]:
+            self.accountHealth.invalidate(uid)
+
+        QTimer.singleShot(0, self.startAccountCheck)
+
+    def onLoginFinished(self, uid: str, results: dict):
+        self.accountHealth.recordLogin(uid, results, defaultProfile().classifyFailure)
+
+    def accountsSummary(self) -> dict:
+        """ cached health of the saved accounts for the local socket """
+        return {"accounts": self.accountHealth.summary(), "candidates": self.signinCandidates()}
 
     def startNetworkUpdate(self):
         """启动后台线程来更新网络信息"""
@@ -486,26 +829,285 @@ class OUCNet(GalleryInterface):
         else:
             # 20秒过后，停止定时器并切换到网络检测模式
             logger.info(f"Switching to network status check mode")
+            self.netInfoUpdateTimer.stop()
     
     def startCheckNetworkOnline(self):
         """启动后台线程来检查网络通断"""
         self.threadUpdateNetStatus.start()
 
+    def onProbeStatus(self, is_online):
+        """ feed the probe results to the idle timeout estimator and the logout predictor """
+        if self.logoutPredictor.observe(is_online):
+            self.schedulePrelogin()
+
+        if is_online:
+            self.keepAlive.online()
+            if not self.keepAliveTimer.isActive() and not self.threadKeepAlive.isRunning():
+                self.scheduleHeartbeat()
+            return
+
+        bounds = self.keepAlive.offline()
+        self.keepAliveTimer.stop()
+        if bounds is None:
+            return
+
+        sessionExpiries.inc()
+        lower, upper = bounds
+        logger.info(f"Session expired {lower:.0f}-{upper:.0f} s after the last refresh, "
+                    f"idle timeout is at least {self.keepAlive.timeout:.0f} s, "
+                    f"heartbeat every {self.keepAlive.interval():.0f} s")
+        if round(self.keepAlive.timeout) != cfg.get(cfg.keepAliveLearned):
+            cfg.set(cfg.keepAliveLearned, round(self.keepAlive.timeout))
+
+    def onSessionRefreshed(self, uid=None):
+        """ a login or heartbeat refreshed the session, plan the next heartbeat """
+        if uid:
+            self.threadKeepAlive.uid = uid
+        self.keepAlive.activity()
+        self.scheduleHeartbeat()
+
+    def scheduleHeartbeat(self):
+        due = self.keepAlive.due()
+        if due is None or not cfg.get(cfg.keepAliveEnabled):
+            self.keepAliveTimer.stop()
+            return
+
+        heartbeatInterval.set(self.keepAlive.interval())
+        self.keepAliveTimer.start(int(due * 1000))
+
+    def startHeartbeat(self):
+        if not self.threadKeepAlive.isRunning():
+            self.threadKeepAlive.kind = cfg.get(cfg.keepAliveRequest)
+            self.threadKeepAlive.start()
+
+    def onHeartbeat(self, result: dict):
+        if result["success"]:
+            self.onSessionRefreshed()
+        elif self.keepAlive.lastActivity is not None:
+            # 心跳失败时不刷新计时，稍后重试，直到探测发现会话已失效
+            self.keepAliveTimer.start(int(self.keepAlive.minimum * 1000))
+
+    def onVaultChanged(self, locked: bool):
+        """ log in once the vault is unlocked, the auto login was skipped while it was locked """
+        if not locked and not self.threadUpdateNetStatus.isRunning():
+            self.startCheckNetworkOnline()
+
+    def startAccountFile(self, action: str, path: str):
+        if self.threadAccountFile.isRunning():
+            return
+
+        self.threadAccountFile.action = action
+        self.threadAccountFile.path = path
+        self.threadAccountFile.start()
+
+    def refreshDevices(self):
+        """ query the online records of the selected account """
+        if self.threadDevices.isRunning():
+            return
+
+        ip = self.netInfoCard.netInfo.get("IP")
+        self.deviceCard.ownIP = ip if ip and ip != "Unknown" else None
+        self.threadDevices.uid = self.netInfoCard.comboBox_selectID.currentText() or None
+        self.threadDevices.action = None
+        self.threadDevices.start()
+
+    def startDeviceAction(self, action: str, devices: list):
+        """ unbind or kick the sessions selected on the device card """
+        if self.threadDevices.isRunning():
+            return
+
+        self.threadDevices.uid = self.deviceCard.uid
+        self.threadDevices.action = action
+        self.threadDevices.devices = devices
+        self.threadDevices.concurrency = cfg.get(cfg.deviceConcurrency)
+        self.threadDevices.start()
+
+    def schedulePrelogin(self):
+        """ wait for the next window of a predicted forced logout """
+        self.preloginTimer.stop()
+        if not cfg.get(cfg.preloginEnabled) or self.threadPrelogin.isRunning():
+            return
+
+        window = self.logoutPredictor.nextWindow(max(time.time(), self.preloginHandled))
+        if window is None:
+            return
+
+        delay = min(max(window[0] - time.time(), 0), self.PRELOGIN_MAX_WAIT)
+        self.preloginTimer.start(int(delay * 1000))
+
+    def startPrelogin(self):
+        now = time.time()
+        window = self.logoutPredictor.nextWindow(max(now, self.preloginHandled))
+        if window is None or window[0] > now:
+            self.schedulePrelogin()
+            return
+
+        self.preloginHandled = window[1]
+        candidates = self.signinCandidates()
+        uid, password, sources = self.netInfoCard.loginCredentials(candidates[0] if candidates else None)
+        if not uid or password is None:
+            logger.info("No account to log in, skip watching the predicted forced logout")
+            self.schedulePrelogin()
+            return
+
+        logoutWindows.inc()
+        logger.info(f"Watching the session until {time.strftime('%H:%M:%S', time.localtime(window[1]))} "
+                    f"for a predicted forced logout")
+        thread = self.threadPrelogin
+        thread.uid, thread.password, thread.sources = uid, password, sources
+        thread.end = window[1]
+        thread.interval = cfg.get(cfg.preloginInterval)
+        thread.start()
+
+    def onForcedLogout(self, event: dict):
+        """ the watch found the session dropped and logged in again """
+        self.logoutPredictor.recordLogout(event["lower"], event["upper"])
+        result = event["result"]
+        self.onLoginFinished(self.threadPrelogin.uid, {event["interface"]: result})
+        prelogins.inc(result="ok" if result["success"] else "fail")
+        if not result["success"]:
+            logger.warning(f"Login after the forced logout via {event['interface']} failed: "
+                           f"{result['code']}, {result['msg']}")
+            return
+
+        downtime = event["login"] - event["lower"]
+        preloginDowntime.observe(downtime)
+        logger.info(f"Forced logout via {event['interface']}, logged in {self.threadPrelogin.uid} again "
+                    f"{downtime:.2f} s after the last online check")
+        self.onSessionRefreshed(self.threadPrelogin.uid)
+
+    def countWakeup(self):
+        self.wakeups += 1
+
+    def wakeupsPerMinute(self):
+        """ timer wakeups per minute since the last mode switch """
+        minutes = (time.monotonic() - self.wakeupsSince) / 60
+        return self.wakeups / minutes if minutes > 0 else 0.0
+
+    def setBackgroundMode(self, isBackground: bool):
+        """ Enter or leave background mode
+
+        In background mode the UI is not refreshed and the network probe runs
+        on a single coarse timer. Leaving it shows the latest snapshot at once
+        and starts a fresh refresh.
+
+        The heartbeat, account check and forced logout timers keep running
+        on purpose, since the session and the auto login depend on them in
+        the background as well. They wake up at most every few minutes, or
+        only inside a predicted logout window, and count in the wakeups. The
+        debounce and throttle timers of the bus are single shot timers armed
+        by an event, nothing emits the throttled snapshots while the refresh
+        timer is stopped.
+        """
+        if isBackground == self.isBackground:
+            return
+
+        mode = "background" if self.isBackground else "foreground"
+        logger.info(f"Wakeups per minute in {mode}: {self.wakeupsPerMinute():.1f}")
+        self.wakeups = 0
+        self.wakeupsSince = time.monotonic()
+        self.isBackground = isBackground
+
+        if isBackground:
+            logger.info("Enter background mode")
+            self.netInfoUpdateTimer.stop()
+            self.networkStatusCheckTimer.stop()
+            self.backgroundTimer.start(cfg.get(cfg.backgroundProbeInterval) * 1000)
+            return
+
+        logger.info("Leave background mode")
+        self.backgroundTimer.stop()
+
+        if self.pendingNetInfo is not None:
+            self.updateNetInfo(self.pendingNetInfo)
+            self.pendingNetInfo = None
+
+        self.time_elapsed = 0
+        self.startNetworkUpdate()
+        self.startCheckNetworkOnline()
+        self.netInfoUpdateTimer.start(3000)
+        self.networkStatusCheckTimer.start(5000)
+
     def updateNetInfo(self, new_netinfo):
         """更新UI上的网络信息"""
+        self.netInfoUpdated = time.time()
+        if self.isBackground:
+            self.pendingNetInfo = new_netinfo
+            return
+
         try:
             # 更新self.netinfo并刷新UI
             self.netInfoCard.update_info(new_netinfo)
         except Exception as e:
             logger.error(f"Error updating network info: {e}")
     
+    def snapshot(self) -> dict:
+        """ latest state for the local socket, answered from memory without asking the portal """
+        netInfo = dict(self.pendingNetInfo or self.netInfoCard.netInfo)
+        netInfo.pop("device", None)
+        lastProbe = self.threadUpdateNetStatus.lastProbe
+        timer = self.keepAliveTimer
+
+        return {
+            "online": self.threadUpdateNetStatus.last_status,
+            "background": self.isBackground,
+            "updated": self.netInfoUpdated,
+            "probe_age": round(time.monotonic() - lastProbe, 1) if lastProbe is not None else None,
+            "network": netInfo,
+            "keepalive": {
+                "timeout": self.keepAlive.timeout,
+                "interval": self.keepAlive.interval(),
+                "next": round(timer.remainingTime() / 1000, 1) if timer.isActive() else None,
+            },
+            "prelogin": {
+                "patterns": len(self.logoutPredictor.patterns()),
+                "window": self.logoutPredictor.nextWindow(),
+                "watching": self.threadPrelogin.isRunning(),
+            },
+        }
+
+    def devices(self) -> list:
+        """ online records of the selected account for the local socket, from the latest query of the device card """
+        uid = self.netInfoCard.comboBox_selectID.currentText() or self.deviceCard.uid
+        if self.deviceCard.uid is None or self.deviceCard.uid != uid:
+            raise ValueError(f"online devices of {uid or 'the account'} have not been queried yet, "
+                             f"refresh the device list first")
+
+        return list(self.deviceCard.records)
+
+    def loginCommand(self, args: dict, respond):
+        """ log in for the local socket, a deferred handler of `InstanceServer`
+
+        `uid` logs in that account only, otherwise the auto login candidates
+        are tried in turn. The login runs in `SigninThread`; with `wait` the
+        reply carries the results of the round and is sent when it finishes,
+        otherwise it is sent right away. A request arriving during a round
+        waits for that round.
+        """
+        uid = args.get("uid")
+        if uid:
+            if uid not in self.netInfoCard.uids:
+                raise ValueError(f"unknown account: {uid}")
+            self.netInfoCard.comboBox_selectID.setText(uid)
+
+        candidates = [uid] if uid else None
+        if not args.get("wait"):
+            QTimer.singleShot(0, lambda: self.signinAccounts(candidates))
+            respond({"queued": True})
+            return
+
+        self.signinWaiters.append(respond)
+        self.signinAccounts(candidates)
+
     def handleNetworkStatus(self, is_online):
         """根据网络状态决定是否继续更新"""
 
         logger.info(f"Network status changed: {is_online}")
 
         self.time_elapsed = 0  # 重置计时器
-        self.networkStatusCheckTimer.start(5000) 
+        if not self.isBackground:
+            self.networkStatusCheckTimer.start(5000) 
+            self.netInfoUpdateTimer.start(3000)
 
         if is_online:
             if self.network_was_down:
@@ -0,0 +1,62 @@
+# coding: utf-8
+"""
+Command-line client of the running OUC Net instance.
+
+    python cli.py status
+    python cli.py login [uid]
+    python cli.py devices
+    python cli.py accounts
+
+The state is answered by the running instance from its latest refresh, so
+polling does not reach the portal. Only the standard library is imported,
+not Qt, requests or bs4. The reply is printed as JSON; the exit status is
+0 on success, 1 if the instance reported an error and 2 if no instance is
+running.
+"""
+import argparse
+import json
+import sys
+
+from app.common.ipc import request, InstanceNotRunning
+
+
+LOGIN_TIMEOUT = 30.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ouc-net", description="Query and control the running OUC Net instance")
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds to wait for the instance")
+    parser.add_argument("--compact", action="store_true", help="print the JSON on one line")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="network and login status")
+    login = commands.add_parser("login", help="log in now and wait for the result")
+    login.add_argument("uid", nargs="?", help="account to log in, the selected one by default")
+    login.add_argument("--no-wait", action="store_true", help="return without waiting for the result")
+    commands.add_parser("devices", help="online devices of the account")
+    commands.add_parser("accounts", help="health of the saved accounts and the auto login order")
+    args = parser.parse_args(argv)
+
+    payload = {}
+    timeout = args.timeout
+    if args.command == "login":
+        payload = {"uid": args.uid, "wait": not args.no_wait}
+        if not args.no_wait:
+            timeout = max(timeout, LOGIN_TIMEOUT)
+
+    try:
+        reply = request(args.command, payload, timeout=timeout)
+        code = 0 if reply.get("ok") else 1
+    except InstanceNotRunning:
+        reply = {"ok": False, "error": "OUC Net is not running"}
+        code = 2
+    except (OSError, ValueError) as e:
+        reply = {"ok": False, "error": f"no reply from OUC Net: {e}"}
+        code = 1
+
+    json.dump(reply, sys.stdout, ensure_ascii=False, indent=None if args.compact else 2)
+    sys.stdout.write("\n")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
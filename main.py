@@ -1,25 +1,94 @@
 # This Python file uses the following encoding: utf-8
 import sys
 import os
-from PySide6.QtWidgets import QApplication
-from PySide6.QtCore import Qt, QTranslator
+import argparse
 
-from qfluentwidgets import FluentTranslator
+from app.common.ipc import request, InstanceNotRunning
 
-from app.common.config import cfg
-from app.view.main_window import MainWindow
+
+def parseArgs():
+    """ options of the application, the remaining arguments are left to Qt """
+    parser = argparse.ArgumentParser(description="OUC校园网工具")
+    parser.add_argument("--login", action="store_true", help="log in now, in the running instance if there is one")
+    return parser.parse_known_args()
+
+
+def forwardToInstance(args) -> bool:
+    """ forward the command to the running instance, `False` if there is none """
+    command = "login" if args.login else "show"
+    try:
+        reply = request(command)
+    except InstanceNotRunning:
+        return False
+    except (OSError, ValueError) as e:
+        # 已有实例占用了套接字但没有及时应答，不再启动第二个
+        print(f"OUC Net is already running but did not answer: {e}", file=sys.stderr)
+        return True
+
+    if not reply.get("ok"):
+        print(f"OUC Net is already running: {reply.get('error')}", file=sys.stderr)
+
+    return True
 
 
 if __name__ == "__main__":
 
+    args, qtArgs = parseArgs()
+
+    # 已有实例在运行时只转发命令，不导入 Qt 也不创建窗口
+    if forwardToInstance(args):
+        sys.exit(0)
+
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import Qt, QTranslator, QTimer
+
+    from qfluentwidgets import FluentTranslator
+    from loguru import logger
+
+    from app.common.config import cfg
+    from app.common.log import setupLogging
+    from app.common.metrics import metrics, MetricsServer
+    from app.common.profiler import isProfilingRequested, startSession, ProfiledApplication
+    from app.common.instance import InstanceServer
+    from app.common.portal_profile import loadProfile, setDefaultProfile, ProfileError
+    from app.view.main_window import MainWindow
+
+    setupLogging(level=cfg.get(cfg.logLevel), maxSize=cfg.get(cfg.logMaxSize))
+
+    # 其他部署的门户通过 Portal/Profile 指定描述文件
+    if cfg.get(cfg.portalProfile):
+        try:
+            setDefaultProfile(loadProfile(cfg.get(cfg.portalProfile)))
+        except ProfileError as e:
+            logger.error(f"{e}, using the bundled portal profile")
+
     # enable dpi scale
     if cfg.get(cfg.dpiScale) != "Auto":
         os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "0"
         os.environ["QT_SCALE_FACTOR"] = str(cfg.get(cfg.dpiScale))
 
-    app = QApplication(sys.argv)
+    # 设置 OUC_NET_PROFILE=1 或开启 Profile/Enabled 后记录性能数据
+    argv = sys.argv[:1] + qtArgs
+    if isProfilingRequested(cfg.get(cfg.profileEnabled)):
+        startSession()
+        app = ProfiledApplication(argv)
+    else:
+        app = QApplication(argv)
     app.setAttribute(Qt.AA_DontCreateNativeWidgetSiblings)
 
+    # 在创建窗口前占用本地套接字，同时启动的另一个实例会把命令转发过来
+    instance = InstanceServer(parent=app)
+    if not instance.listen() and forwardToInstance(args):
+        logger.info("Another instance is running, forwarded the command")
+        sys.exit(0)
+
+    # 本机 Prometheus 指标，默认关闭
+    if cfg.get(cfg.metricsEnabled):
+        try:
+            MetricsServer(metrics, cfg.get(cfg.metricsPort)).start()
+        except OSError as e:
+            logger.error(f"Failed to serve metrics: {e}")
+
     # internationalization
     locale = cfg.get(cfg.language).value
     translator = FluentTranslator(locale)
@@ -34,4 +103,15 @@ if __name__ == "__main__":
     w = MainWindow()
     w.show()
 
+    # 本地套接字的命令，show 在回复之后执行；login 在后台线程中登录，等待结果时登录结束才回复
+    instance.addHandler("show", lambda args: QTimer.singleShot(0, w.restore_window))
+    instance.addHandler("login", w.oucNet.loginCommand, deferred=True)
+    instance.addHandler("status", lambda args: w.oucNet.snapshot())
+    instance.addHandler("devices", lambda args: {"devices": w.oucNet.devices()})
+    instance.addHandler("accounts", lambda args: w.oucNet.accountsSummary())
+    instance.setReady()
+    if args.login:
+        instance.dispatch("login", {})
+
+    app.aboutToQuit.connect(instance.close)
     sys.exit(app.exec())
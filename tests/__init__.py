@@ -0,0 +1,9 @@
+# coding: utf-8
+"""
+Behavior tests, run with `python -m pytest tests` or `python -m unittest discover tests`.
+
+The widget tests use the offscreen Qt platform unless another one is set.
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
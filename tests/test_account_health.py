@@ -0,0 +1,122 @@
+# coding: utf-8
+import os
+import socket
+import sys
+import time
+import unittest
+
+from PySide6.QtWidgets import QApplication
+
+from app.common.account_health import AccountHealthChecker, OK, UNKNOWN, CREDENTIALS
+from app.common.portal_profile import defaultProfile
+from app.common.rate_limit import PortalRateLimiter, EndpointClass
+from app.view.ouc_net import SigninThread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+from portal_stub import PortalStub  # noqa: E402
+
+
+ACCOUNTS = {f"u{i}": f"p{i}" for i in range(5)}
+
+
+def unusedPort():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = PortalStub(accounts=ACCOUNTS).start()
+        self.addCleanup(self.stub.stop)
+
+    def usePortal(self, portal_url, eportal_url):
+        profile = defaultProfile()
+        self.addCleanup(setattr, profile, "portal_url", profile.portal_url)
+        self.addCleanup(setattr, profile, "eportal_url", profile.eportal_url)
+        profile.portal_url, profile.eportal_url = portal_url, eportal_url
+
+
+class FailoverTest(StubCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def signin(self, accounts):
+        health = AccountHealthChecker()
+        thread = SigninThread(health)
+        thread.accounts = accounts
+        thread.reveal = lambda uid, password: password
+        thread.sources = {"lo": None}
+
+        results = []
+        thread.result_signal.connect(lambda uid, result: results.append((uid, result)))
+        thread.start()
+        deadline = time.monotonic() + 10
+        while not thread.isFinished() and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+        self.app.processEvents()
+        thread.wait()
+        return health, results
+
+    def test_fails_over_after_a_wrong_password(self):
+        self.usePortal(self.stub.portal_url, self.stub.eportal_url)
+        health, results = self.signin([("u0", "wrong"), ("u1", "p1"), ("u2", "p2")])
+
+        self.assertEqual([uid for uid, _ in results], ["u1"])
+        self.assertTrue(results[0][1]["lo"]["success"])
+        # 健康状态在决定是否换账号之前已记录
+        self.assertEqual(health.get("u0").state, CREDENTIALS)
+        self.assertEqual(health.get("u1").state, OK)
+        self.assertEqual(health.get("u2").state, UNKNOWN)
+        self.assertEqual(health.candidates("u0", list(ACCOUNTS))[:1], ["u1"])
+
+    def test_network_failure_does_not_fail_over(self):
+        port = unusedPort()
+        self.usePortal(f"http://127.0.0.1:{port}/", f"http://127.0.0.1:{port}/eportal/portal")
+        health, results = self.signin([("u0", "p0"), ("u1", "p1")])
+
+        self.assertEqual([uid for uid, _ in results], ["u0"])
+        self.assertFalse(results[0][1]["lo"]["success"])
+        self.assertEqual(health.get("u0").state, UNKNOWN)
+
+
+class HealthCheckTest(StubCase):
+
+    def checker(self, rate=100.0, capacity=100, **kwargs):
+        limiter = PortalRateLimiter(classes=[EndpointClass("health", 4, rate, capacity, shed=True, maxDelay=0.0)])
+        return AccountHealthChecker(limiter=limiter, portal_url=self.stub.portal_url,
+                                    eportal_url=self.stub.eportal_url, timeout=2, **kwargs)
+
+    def test_batches_rotate_through_the_accounts(self):
+        checker = self.checker(batch=2)
+
+        seen = []
+        for _ in range(3):
+            seen.append(sorted(checker.check(list(ACCOUNTS))))
+
+        self.assertEqual([len(uids) for uids in seen], [2, 2, 2])
+        self.assertEqual(set(seen[0] + seen[1] + seen[2]), set(ACCOUNTS))
+        self.assertTrue(all(checker.get(uid).state == OK for uid in ACCOUNTS))
+
+    def test_pass_stops_once_a_query_is_shed(self):
+        checker = self.checker(rate=0.001, capacity=1, batch=5)
+
+        self.assertEqual(len(checker.check(list(ACCOUNTS))), 1)
+        self.assertEqual(sum(1 for uid in ACCOUNTS if checker.get(uid).state == OK), 1)
+
+    def test_login_failure_outlives_a_health_check(self):
+        checker = self.checker()
+        checker.recordLogin("u0", {"lo": {"success": False, "msg": "账号或密码错误"}},
+                            defaultProfile().classifyFailure)
+
+        checker.check(list(ACCOUNTS))
+        self.assertEqual(checker.get("u0").state, CREDENTIALS)
+        self.assertNotIn("u0", checker.candidates("u0", list(ACCOUNTS)))
+
+
+if __name__ == "__main__":
+    unittest.main()
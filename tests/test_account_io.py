@@ -0,0 +1,85 @@
+# coding: utf-8
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.common.account_io import importAccounts, exportAccounts, readRows, AccountFileError
+from app.common.account_store import AccountStore
+
+
+class AccountFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.store = AccountStore(self.path("ids.db"), legacy_path=None)
+        self.addCleanup(self.store.close)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def write(self, name, text):
+        with open(self.path(name), "w", encoding="utf-8") as f:
+            f.write(text)
+        return self.path(name)
+
+    def test_csv_with_header_and_invalid_rows(self):
+        path = self.write("roster.csv", "password,uid,auto\npa,a,0\npb,b,yes\n,,1\nx,has space,0\npa2,a,0\n")
+
+        report = importAccounts(self.store, path)
+        self.assertEqual((report.rows, report.added, report.invalid), (3, 2, 2))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+        self.assertEqual(self.store.all(), {"a": ["pa2", False], "b": ["pb", True]})
+
+    def test_csv_without_header(self):
+        path = self.write("roster.csv", "a,pa\nb,pb,1\n")
+
+        importAccounts(self.store, path)
+        self.assertEqual(self.store.all(), {"a": ["pa", False], "b": ["pb", True]})
+
+    def test_json_formats(self):
+        legacy = self.write("old.json", json.dumps({"a": ["pa", True], "b": "pb"}))
+        rows = self.write("rows.json", json.dumps([{"uid": "c", "password": "pc"}, ["d", "pd", 1], 5]))
+        lines = self.write("rows.jsonl", '{"uid": "e", "password": "pe"}\n\nnot json\n')
+
+        importAccounts(self.store, legacy)
+        self.assertEqual(importAccounts(self.store, rows).invalid, 1)
+        self.assertEqual(importAccounts(self.store, lines).invalid, 1)
+        self.assertEqual(self.store.all(), {
+            "a": ["pa", False], "b": ["pb", False], "c": ["pc", False], "d": ["pd", True], "e": ["pe", False]})
+
+    def test_json_is_read_in_chunks(self):
+        accounts = {f"2302{i:05d}": [f"password-{i}", False] for i in range(3000)}
+        path = self.write("big.json", json.dumps(accounts))
+
+        self.assertEqual(sum(1 for _ in readRows(path)), 3000)
+        self.assertEqual(importAccounts(self.store, path, batchSize=128).added, 3000)
+
+    def test_malformed_file_imports_nothing(self):
+        path = self.write("broken.json", '{"a": ["pa", false], "b": ')
+
+        with self.assertRaises(AccountFileError):
+            importAccounts(self.store, path)
+        self.assertEqual(self.store.count(), 0)
+
+    def test_unknown_format(self):
+        with self.assertRaises(AccountFileError):
+            importAccounts(self.store, self.write("roster.txt", "a,pa\n"))
+
+    def test_export_and_import_round_trip(self):
+        self.store.upsertMany([("a", "p,\"a\"", False), ("张三", "pb", True)])
+
+        for name in ("out.csv", "out.json", "out.jsonl"):
+            with self.subTest(format=name):
+                self.assertEqual(exportAccounts(self.store, self.path(name)), 2)
+
+                copy = AccountStore(self.path(name + ".db"), legacy_path=None)
+                self.addCleanup(copy.close)
+                importAccounts(copy, self.path(name))
+                self.assertEqual(copy.all(), self.store.all())
+
+
+if __name__ == "__main__":
+    unittest.main()
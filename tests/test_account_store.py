@@ -0,0 +1,109 @@
+# coding: utf-8
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.common.account_store import AccountStore
+from app.components.account_list import AccountListModel
+
+
+class AccountStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.store = AccountStore(os.path.join(self.dir, "ids.db"), legacy_path=None)
+        self.addCleanup(self.store.close)
+        self.deltas = []
+        self.store.subscribe(self.deltas.append)
+
+    def test_upsert_sends_only_the_delta(self):
+        self.store.upsert("a", "pa")
+        self.store.upsert("b", "pb")
+
+        self.assertEqual(self.deltas, [
+            {"upserted": {"a": ["pa", False]}, "removed": []},
+            {"upserted": {"b": ["pb", False]}, "removed": []},
+        ])
+        self.assertEqual(self.store.get("a"), ["pa", False])
+        self.assertIsNone(self.store.get("c"))
+
+    def test_only_one_auto_login_account(self):
+        self.store.upsert("a", "pa", True)
+        self.store.upsert("b", "pb", True)
+
+        self.assertEqual(self.store.autoLoginUid(), "b")
+        self.assertEqual(self.deltas[-1]["upserted"], {"a": ["pa", False], "b": ["pb", True]})
+
+    def test_remove_reports_existing_accounts_only(self):
+        self.store.upsertMany([("a", "pa", False), ("b", "pb", False)])
+        self.deltas.clear()
+
+        self.store.removeMany(["a", "missing"])
+        self.assertEqual(self.deltas, [{"upserted": {}, "removed": ["a"]}])
+        self.store.remove("missing")
+        self.assertEqual(len(self.deltas), 1)
+
+    def test_replace_writes_the_differences(self):
+        self.store.upsertMany([("a", "pa", False), ("b", "pb", True)])
+        self.deltas.clear()
+
+        self.store.replace({"b": ["pb", True], "c": ["pc", False]})
+        self.assertEqual(self.deltas, [
+            {"upserted": {}, "removed": ["a"]},
+            {"upserted": {"c": ["pc", False]}, "removed": []},
+        ])
+        self.assertEqual(self.store.all(), {"b": ["pb", True], "c": ["pc", False]})
+
+    def test_failed_transaction_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.transaction() as cursor:
+                cursor.execute("INSERT INTO accounts (uid, password, updated_at) VALUES ('a', 'pa', 0)")
+                raise RuntimeError("abort")
+
+        self.assertEqual(self.store.count(), 0)
+
+    def test_import_rows_sends_one_reset(self):
+        self.store.upsert("a", "old")
+        self.deltas.clear()
+
+        counts = self.store.importRows(((f"u{i}", f"p{i}", i == 3) for i in range(10)), batchSize=4)
+        self.assertEqual(counts, {"rows": 10, "added": 10})
+        self.assertEqual(len(self.deltas), 1)
+        self.assertIs(self.deltas[0]["reset"], True)
+        self.assertEqual(self.store.count(), 11)
+        self.assertEqual(self.store.autoLoginUid(), "u3")
+        self.assertEqual(list(self.store.iterRows(batchSize=3))[:2], [("a", "old", False), ("u0", "p0", False)])
+
+    def test_reset_listeners_read_the_rows_again(self):
+        model = AccountListModel()
+        model.loadRows = self.store.iterRows
+        self.store.subscribe(model.applyDelta)
+        uids = lambda: [model.data(model.index(i)) for i in range(model.rowCount())]
+
+        self.store.upsert("a", "pa")
+        self.store.importRows([("b", "pb", True), ("c", "pc", False)])
+        self.assertEqual(uids(), ["a", "b", "c"])
+        self.assertFalse(model.isModified())
+
+        # 有未保存的修改时导入的账号按增量合并
+        model.addAccount("new", "pn")
+        self.store.importRows([("d", "pd", False)])
+        self.assertEqual(uids(), ["a", "b", "c", "new", "d"])
+
+    def test_legacy_json_is_imported_once(self):
+        legacy = os.path.join(self.dir, "net_ids.json")
+        with open(legacy, "w") as f:
+            json.dump({"a": ["pa", True], "b": ["pb", False]}, f)
+
+        store = AccountStore(os.path.join(self.dir, "legacy.db"), legacy_path=legacy)
+        self.addCleanup(store.close)
+        self.assertEqual(store.all(), {"a": ["pa", True], "b": ["pb", False]})
+        self.assertFalse(os.path.exists(legacy))
+        self.assertTrue(os.path.exists(legacy + ".bak"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# coding: utf-8
+import unittest
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication
+
+from app.view.net_info import DeviceManagerCard
+
+
+RECORDS = [
+    {"online_ip": "10.160.1.21", "online_mac": "a4:5e:60:11:22:33", "device_name": "DESKTOP-LAB01",
+     "user_account": "u1"},
+    {"online_ip": "10.160.1.22", "online_mac": "f0:18:98:44:55:66", "device_name": "iPhone",
+     "user_account": "u1"},
+    {"online_ip": "10.161.9.8", "online_mac": "3c:22:fb:77:88:99", "device_name": "MacBook-Pro",
+     "user_account": "u1"},
+]
+
+
+class DeviceFilterTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.card = DeviceManagerCard("在线设备")
+        self.card.setDevices("u1", RECORDS)
+
+    def tearDown(self):
+        self.card.deleteLater()
+
+    def visibleIPs(self):
+        return [item.data(Qt.UserRole)["online_ip"] for item in self.card.visibleItems()]
+
+    def test_prefix_of_any_field(self):
+        self.assertEqual(self.card.searchDevices("10.160"), {0, 1})
+        self.assertEqual(self.card.searchDevices("F0:18"), {1})
+        self.assertEqual(self.card.searchDevices("desktop"), {0})
+
+    def test_misspelled_name_still_matches(self):
+        self.assertEqual(self.card.searchDevices("DESKTIP-LAB01"), {0})
+        self.assertEqual(self.card.searchDevices("deskop"), {0})
+        self.assertEqual(self.card.searchDevices("Macbok"), {2})
+
+    def test_account_field_is_not_indexed(self):
+        self.assertEqual(self.card.searchDevices("u1"), set())
+
+    def test_filter_hides_rows_and_limits_the_selection(self):
+        self.card.searchEdit.setText("iphone")
+        self.assertEqual(self.visibleIPs(), ["10.160.1.22"])
+        self.assertEqual([device["online_ip"] for device in self.card.selectedDevices()], ["10.160.1.22"])
+
+        self.card.searchEdit.clear()
+        self.assertEqual(len(self.card.visibleItems()), len(RECORDS))
+
+    def test_index_follows_the_records(self):
+        self.card.searchEdit.setText("macbook")
+        self.assertEqual(self.visibleIPs(), ["10.161.9.8"])
+
+        self.card.setDevices("u1", RECORDS[:2])
+        self.assertEqual(self.visibleIPs(), [])
+        self.assertEqual(self.card.searchDevices("macbook"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
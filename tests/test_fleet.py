@@ -0,0 +1,52 @@
+# coding: utf-8
+import os
+import sys
+import time
+import unittest
+
+from app.common.fleet import FleetController
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+from portal_stub import PortalStub  # noqa: E402
+
+
+class FleetDeadlineTest(unittest.TestCase):
+
+    def controller(self, stub, deadline, workers=4):
+        return FleetController(workers, deadline, portal_url=stub.portal_url, eportal_url=stub.eportal_url)
+
+    def test_deadline_covers_every_page(self):
+        stub = PortalStub(delay=0.3).start()
+        self.addCleanup(stub.stop)
+        # 200 条在线记录需要翻 4 页，每页 0.3 秒
+        stub.state.sessions.update({f"10.0.{i // 256}.{i % 256}": "u" for i in range(200)})
+
+        start = time.perf_counter()
+        report = self.controller(stub, 0.8).status([{"uid": "u", "password": "", "source": ""}])
+        self.assertLess(time.perf_counter() - start, 1.1)
+        self.assertEqual(len(report.timedOut), 1)
+        self.assertFalse(report.results[0]["success"])
+
+    def test_late_targets_are_not_waited_for(self):
+        stub = PortalStub(delay=3.0).start()
+        self.addCleanup(stub.stop)
+        targets = [{"uid": f"u{i}", "password": "p", "source": ""} for i in range(3)]
+
+        start = time.perf_counter()
+        report = self.controller(stub, 0.5, workers=3).login(targets)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(report.summary()["timeout"], 3)
+        self.assertEqual([result["uid"] for result in report.results], ["u0", "u1", "u2"])
+
+    def test_results_keep_the_target_order(self):
+        stub = PortalStub().start()
+        self.addCleanup(stub.stop)
+        targets = [{"uid": f"u{i}", "password": "p", "source": ""} for i in range(10)]
+
+        report = self.controller(stub, 2.0).login(targets)
+        self.assertEqual([result["uid"] for result in report.results], [f"u{i}" for i in range(10)])
+        self.assertEqual(report.summary()["timeout"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
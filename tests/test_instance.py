@@ -0,0 +1,81 @@
+# coding: utf-8
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication
+
+from app.common.instance import InstanceServer
+from app.common.ipc import request
+
+
+class InstanceServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.name = os.path.join(tempfile.mkdtemp(), "ouc-net-test")
+        self.server = InstanceServer(self.name)
+        self.assertTrue(self.server.listen())
+        self.server.setReady()
+
+    def tearDown(self):
+        self.server.close()
+        self.server.deleteLater()
+
+    def ask(self, command, args=None, timeout=2.0):
+        """ send the requests from worker threads while the event loop runs """
+        replies = []
+        worker = threading.Thread(target=lambda: replies.append(request(command, args, self.name, timeout)))
+        worker.start()
+        deadline = time.monotonic() + timeout + 1
+        while worker.is_alive() and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        worker.join()
+        return replies[0]
+
+    def test_plain_handler(self):
+        self.server.addHandler("status", lambda args: {"echo": args["value"]})
+        self.assertEqual(self.ask("status", {"value": 3}), {"ok": True, "echo": 3})
+        self.assertEqual(self.ask("foo")["ok"], False)
+
+    def test_deferred_reply_keeps_the_server_responsive(self):
+        pending = []
+        self.server.addHandler("login", lambda args, respond: pending.append(respond), deferred=True)
+        self.server.addHandler("status", lambda args: {"pending": len(pending)})
+
+        replies = []
+        worker = threading.Thread(target=lambda: replies.append(request("login", {}, self.name, 5.0)))
+        worker.start()
+        while not pending:
+            self.app.processEvents()
+            time.sleep(0.001)
+
+        # 延迟回复期间其他客户端照常得到回复
+        self.assertEqual(self.ask("status"), {"ok": True, "pending": 1})
+
+        QTimer.singleShot(0, lambda: pending[0]({"success": True}))
+        while worker.is_alive():
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.assertEqual(replies, [{"ok": True, "success": True}])
+
+    def test_deferred_errors(self):
+        def handler(args, respond):
+            if args.get("raise"):
+                raise ValueError("unknown account: x")
+            respond(RuntimeError("no healthy account to log in"))
+
+        self.server.addHandler("login", handler, deferred=True)
+        self.assertEqual(self.ask("login", {"raise": True}), {"ok": False, "error": "unknown account: x"})
+        self.assertEqual(self.ask("login"), {"ok": False, "error": "no healthy account to log in"})
+
+
+if __name__ == "__main__":
+    unittest.main()
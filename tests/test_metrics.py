@@ -0,0 +1,21 @@
+# coding: utf-8
+import unittest
+
+from app.common.metrics import metrics
+from app.common.rate_limit import portalLimiter
+
+
+class RateLimiterMetricsTest(unittest.TestCase):
+
+    def test_totals_are_exposed_as_counters(self):
+        portalLimiter.acquire("login")
+        exposition = metrics.expose()
+
+        self.assertIn("# TYPE ouc_net_ratelimit_requests_total counter", exposition)
+        self.assertIn("# TYPE ouc_net_ratelimit_delay_seconds_total counter", exposition)
+        self.assertIn('ouc_net_ratelimit_requests_total{endpoint="login",outcome="granted"}', exposition)
+        self.assertNotIn("# TYPE ouc_net_ratelimit_requests gauge", exposition)
+
+
+if __name__ == "__main__":
+    unittest.main()
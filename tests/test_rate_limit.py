@@ -0,0 +1,113 @@
+# coding: utf-8
+import threading
+import time
+import unittest
+
+from app.common.rate_limit import TokenBucket, EndpointClass, PortalRateLimiter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=3, clock=clock)
+
+        self.assertTrue(all(bucket.tryAcquire() for _ in range(3)))
+        self.assertFalse(bucket.tryAcquire())
+        self.assertAlmostEqual(bucket.delay(), 0.5)
+
+        clock.now += 0.25
+        self.assertAlmostEqual(bucket.delay(), 0.25)
+        clock.now += 0.25
+        self.assertTrue(bucket.tryAcquire())
+
+    def test_refill_is_capped(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10.0, capacity=2, clock=clock)
+        bucket.take(2)
+
+        clock.now += 60
+        self.assertTrue(bucket.tryAcquire())
+        self.assertTrue(bucket.tryAcquire())
+        self.assertFalse(bucket.tryAcquire())
+
+
+class PortalRateLimiterTest(unittest.TestCase):
+
+    def limiter(self, rate=100.0, capacity=100, **classes):
+        return PortalRateLimiter(rate, capacity, [
+            EndpointClass(name, priority, classRate, classCapacity, shed=shed, maxDelay=maxDelay)
+            for name, (priority, classRate, classCapacity, shed, maxDelay) in classes.items()])
+
+    def test_class_burst_and_drop(self):
+        limiter = self.limiter(identity=(0, 0.1, 2, True, 0.0))
+
+        self.assertTrue(limiter.acquire("identity"))
+        self.assertTrue(limiter.acquire("identity"))
+        self.assertFalse(limiter.acquire("identity"))
+        self.assertEqual(limiter.stats()["identity"],
+                         {"requests": 3, "granted": 2, "delayed": 0, "dropped": 1, "delay_seconds": 0.0})
+
+    def test_global_bucket_limits_every_class(self):
+        limiter = self.limiter(rate=0.1, capacity=1, login=(0, 10, 10, False, 0.0), devices=(1, 10, 10, True, 0.0))
+
+        self.assertTrue(limiter.acquire("devices"))
+        self.assertFalse(limiter.acquire("login"))
+
+    def test_waits_for_a_token(self):
+        limiter = self.limiter(login=(0, 20.0, 1, False, 1.0))
+        self.assertTrue(limiter.acquire("login"))
+
+        start = time.monotonic()
+        self.assertTrue(limiter.acquire("login"))
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+        self.assertEqual(limiter.stats()["login"]["delayed"], 1)
+
+    def test_shed_class_drops_while_one_is_queued(self):
+        limiter = self.limiter(health=(0, 5.0, 1, True, 1.0))
+        self.assertTrue(limiter.acquire("health"))
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire("health")))
+        waiter.start()
+        while not limiter.classes["health"].waiting:
+            time.sleep(0.001)
+
+        self.assertFalse(limiter.acquire("health"))
+        waiter.join()
+        self.assertEqual(results, [True])
+        self.assertEqual(limiter.stats()["health"]["dropped"], 1)
+
+    def test_higher_priority_is_served_first(self):
+        limiter = self.limiter(rate=10.0, capacity=1, login=(0, 100, 100, False, 2.0), health=(4, 100, 100, True, 2.0))
+        self.assertTrue(limiter.acquire("health"))
+
+        order = []
+
+        def acquire(endpoint):
+            limiter.acquire(endpoint)
+            order.append(endpoint)
+
+        low = threading.Thread(target=acquire, args=("health",))
+        low.start()
+        while not limiter.classes["health"].waiting:
+            time.sleep(0.001)
+        high = threading.Thread(target=acquire, args=("login",))
+        high.start()
+        low.join()
+        high.join()
+
+        self.assertEqual(order, ["login", "health"])
+
+
+if __name__ == "__main__":
+    unittest.main()
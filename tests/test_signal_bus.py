@@ -0,0 +1,144 @@
+# coding: utf-8
+import threading
+import time
+import unittest
+
+from PySide6.QtWidgets import QApplication
+
+from app.common.signal_bus import SignalBus, signalBus
+from app.view.net_info import NetInfoCard
+
+
+class SignalBusTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.bus = SignalBus()
+        self.received = []
+
+    def tearDown(self):
+        self.bus.deleteLater()
+
+    def pump(self, seconds=0.0, until=None):
+        """ run the event loop for the given time or until the condition holds """
+        deadline = time.monotonic() + max(seconds, 0.001 if until is None else 2.0)
+        while time.monotonic() < deadline:
+            self.app.processEvents()
+            if until is not None and until():
+                return
+            time.sleep(0.001)
+
+    def emitFromWorker(self, values, delay=0.0):
+        def emit():
+            for value in values:
+                self.bus.netStateChanged.emit(value)
+                time.sleep(delay)
+
+        worker = threading.Thread(target=emit)
+        worker.start()
+        worker.join()
+
+    def test_latest_value_of_a_burst(self):
+        self.bus.subscribe("netStateChanged", self.received.append, parent=self.bus)
+
+        self.emitFromWorker([True, False, True, False])
+        self.pump(0.05)
+        self.assertEqual(self.received, [False])
+
+    def test_every_value_in_order(self):
+        calls = []
+        self.bus.subscribe("loginResult", lambda uid, results: calls.append(uid), latest=False, parent=self.bus)
+
+        for i in range(5):
+            self.bus.loginResult.emit(f"u{i}", {})
+        self.assertEqual(calls, [])
+        self.pump(0.05)
+        self.assertEqual(calls, ["u0", "u1", "u2", "u3", "u4"])
+
+    def test_delivered_on_the_subscriber_thread(self):
+        threads = []
+        self.bus.subscribe("netStateChanged", lambda value: threads.append(threading.current_thread()),
+                           parent=self.bus)
+
+        self.emitFromWorker([True])
+        self.pump(until=lambda: threads)
+        self.assertEqual(threads, [threading.main_thread()])
+
+    def test_debounce_waits_for_quiet(self):
+        self.bus.subscribe("netStateChanged", self.received.append, debounce=80, parent=self.bus)
+
+        for value in (True, False, True):
+            self.bus.netStateChanged.emit(value)
+            self.pump(0.03)
+        self.assertEqual(self.received, [])
+
+        self.pump(until=lambda: self.received)
+        self.assertEqual(self.received, [True])
+
+    def test_throttle_spaces_deliveries(self):
+        times = []
+        self.bus.subscribe("netSnapshot", lambda snapshot: times.append(time.monotonic()), throttle=100,
+                           parent=self.bus)
+
+        for i in range(10):
+            self.bus.netSnapshot.emit({"n": i})
+            self.pump(0.02)
+        self.pump(until=lambda: len(times) >= 3)
+
+        self.assertGreaterEqual(len(times), 2)
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        self.assertTrue(all(gap >= 0.09 for gap in gaps), gaps)
+
+    def test_unsubscribe_drops_pending_values(self):
+        subscription = self.bus.subscribe("netStateChanged", self.received.append, parent=self.bus)
+
+        self.bus.netStateChanged.emit(True)
+        subscription.unsubscribe()
+        self.bus.netStateChanged.emit(False)
+        self.pump(0.05)
+        self.assertEqual(self.received, [])
+
+    def test_unknown_event(self):
+        with self.assertRaises(ValueError):
+            self.bus.subscribe("switchToSampleCard", print)
+
+
+class LoginResultTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.card = NetInfoCard("网络状态", None)
+        self.addCleanup(self.card.deleteLater)
+        self.card.updateuids({"2101": ["p", False], "2102": ["p", False], "2103": ["p", False]})
+
+    def completions(self, text):
+        self.card.filterAccounts(text)
+        return self.card.accountCompleter.model().stringList()
+
+    def test_logins_from_workers_rank_the_completion(self):
+        self.assertEqual(self.completions("210"), ["2101", "2102", "2103"])
+
+        # 强制下线后的重新登录在工作线程中发出，不经过登录卡片
+        worker = threading.Thread(target=lambda: (
+            signalBus.loginResult.emit("2103", {"lo": {"success": True}}),
+            signalBus.loginResult.emit("2102", {"lo": {"success": False}}),
+        ))
+        worker.start()
+        worker.join()
+        deadline = time.monotonic() + 2
+        while "2103" not in self.card.accountUsed and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+
+        self.assertEqual(list(self.card.accountUsed), ["2103"])
+        self.assertEqual(self.completions("210")[0], "2103")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# coding: utf-8
+import os
+import tempfile
+import unittest
+
+from app.common.trie import Trie, MappedTrie
+
+
+class TrieTest(unittest.TestCase):
+
+    def setUp(self):
+        self.trie = Trie()
+        for key in ("23020001", "23020002", "23021000", "Alice", "alicia", "张三"):
+            self.trie.insert(key, key.upper())
+
+    def test_lookup_is_case_folded(self):
+        self.assertIn("ALICE", self.trie)
+        self.assertEqual(self.trie.get("aLiCe"), "ALICE")
+        self.assertEqual(self.trie.get("bob", "none"), "none")
+        self.assertEqual(len(self.trie), 6)
+
+    def test_prefix_items_in_order(self):
+        self.assertEqual([key for key, _ in self.trie.items("2302000")], ["23020001", "23020002"])
+        self.assertEqual([key for key, _ in self.trie.items("ali")], ["Alice", "alicia"])
+        self.assertEqual([key for key, _ in self.trie.items("张")], ["张三"])
+        self.assertEqual(self.trie.items("2303"), [])
+
+    def test_limit_and_ranking(self):
+        self.trie.setWeight("23020002", 10)
+        self.trie.setWeight("23021000", 5)
+
+        self.assertEqual(len(self.trie.items("2302", limit=2)), 2)
+        ranked = [key for key, _ in self.trie.items("2302", ranked=True)]
+        self.assertEqual(ranked, ["23020002", "23021000", "23020001"])
+
+    def test_insert_overwrites_and_remove(self):
+        self.trie.insert("alice", "new")
+        self.assertEqual(len(self.trie), 6)
+        self.assertEqual(self.trie.get("Alice"), "new")
+
+        self.assertTrue(self.trie.remove("ALICE"))
+        self.assertFalse(self.trie.remove("alice"))
+        self.assertNotIn("alice", self.trie)
+        self.assertEqual([key for key, _ in self.trie.items("ali")], ["alicia"])
+
+    def test_fuzzy_within_one_edit(self):
+        matches = {key: distance for key, _, distance in self.trie.fuzzy("23020003", 1)}
+        self.assertEqual(matches, {"23020001": 1, "23020002": 1})
+
+        self.assertEqual([key for key, _, _ in self.trie.fuzzy("alise", 1)], ["Alice"])
+        self.assertEqual(self.trie.fuzzy("bob", 1), [])
+
+    def test_fuzzy_prefix_for_type_ahead(self):
+        keys = [key for key, _, _ in self.trie.fuzzy("alc", 1, prefix=True)]
+        self.assertEqual(sorted(keys), ["Alice", "alicia"])
+
+
+class MappedTrieTest(unittest.TestCase):
+
+    def test_round_trip_through_file(self):
+        trie = Trie()
+        for i in range(200):
+            trie.insert(f"2302{i:04d}", {"row": i}, weight=i)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        trie.save(path)
+
+        with MappedTrie(path) as mapped:
+            self.assertEqual(len(mapped), 200)
+            self.assertIn("23020042", mapped)
+            self.assertEqual(mapped.get("23020042"), {"row": 42})
+            self.assertEqual(mapped.items("230201", limit=3), trie.items("230201", limit=3))
+            self.assertEqual(mapped.items("2302", limit=2, ranked=True), trie.items("2302", limit=2, ranked=True))
+
+    def test_rejects_other_files(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, b"not a trie" * 10)
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        with self.assertRaises(ValueError):
+            MappedTrie(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+# coding: utf-8
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from PySide6.QtWidgets import QApplication
+
+from app.common.account_io import importAccounts, exportAccounts
+from app.common.account_store import AccountStore
+from app.common.vault import CredentialVault, VaultError, VaultLocked, WrongPassphrase, isSealed, MIN_COST
+from app.components.account_list import AccountListModel
+
+
+class CredentialVaultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vault = CredentialVault.create("correct horse", MIN_COST)
+
+    def test_round_trip(self):
+        sealed = self.vault.seal("pässword", "a")
+        self.assertTrue(isSealed(sealed))
+        self.assertNotIn("pässword", sealed)
+        self.assertNotEqual(sealed, self.vault.seal("pässword", "a"))
+        self.assertEqual(self.vault.open(sealed, "a"), "pässword")
+
+    def test_sealed_password_is_bound_to_its_account(self):
+        with self.assertRaises(VaultError):
+            self.vault.open(self.vault.seal("secret", "a"), "b")
+
+    def test_text_looking_sealed_is_sealed_again(self):
+        sealed = self.vault.seal("vault1:AAAA", "a")
+        self.assertNotEqual(sealed, "vault1:AAAA")
+        self.assertEqual(self.vault.open(sealed, "a"), "vault1:AAAA")
+
+    def test_lock_and_unlock(self):
+        sealed = self.vault.seal("secret", "a")
+        vault = CredentialVault(self.vault.salt, self.vault.cost, check=self.vault.check)
+
+        self.assertTrue(vault.locked)
+        with self.assertRaises(VaultLocked):
+            vault.open(sealed, "a")
+        with self.assertRaises(WrongPassphrase):
+            vault.unlock("wrong")
+
+        vault.unlock("correct horse")
+        self.assertEqual(vault.open(sealed, "a"), "secret")
+
+    def test_empty_passphrase(self):
+        with self.assertRaises(VaultError):
+            CredentialVault.create("")
+
+
+class VaultStoreCase(unittest.TestCase):
+    """ store with two accounts sealed by a vault """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "ids.db")
+        self.store = AccountStore(self.path, legacy_path=None)
+        self.addCleanup(self.store.close)
+        self.store.upsertMany([("a", "plain-secret", True), ("b", "vault1:pb", False)])
+        self.store.enableVault("correct horse", MIN_COST)
+
+    def stored(self):
+        with sqlite3.connect(self.path) as conn:
+            return dict(conn.execute("SELECT uid, password FROM accounts"))
+
+
+class StoreVaultTest(VaultStoreCase):
+
+    def test_passwords_are_sealed_on_disk(self):
+        stored = self.stored()
+        self.assertTrue(all(isSealed(password) for password in stored.values()))
+        self.assertEqual(self.store.reveal("a", stored["a"]), "plain-secret")
+        self.assertEqual(self.store.reveal("b", stored["b"]), "vault1:pb")
+
+        # 整理后的数据库文件中不留明文，base64 中没有 "-"
+        with open(self.path, "rb") as f:
+            self.assertNotIn(b"plain-secret", f.read())
+
+    def test_reopened_store_is_locked_until_unlocked(self):
+        store = AccountStore(self.path, legacy_path=None)
+        self.addCleanup(store.close)
+        sealed = store.get("a")[0]
+
+        self.assertTrue(store.locked)
+        with self.assertRaises(VaultLocked):
+            store.reveal("a", sealed)
+        with self.assertRaises(VaultLocked):
+            store.upsert("c", "pc")
+
+        store.unlock("correct horse")
+        self.assertEqual(store.reveal("a", sealed), "plain-secret")
+
+    def test_new_and_imported_passwords_are_sealed(self):
+        self.store.upsert("c", "vault1:pc")
+        roster = os.path.join(self.dir, "roster.csv")
+        with open(roster, "w") as f:
+            f.write("d,vault1:pd\n")
+        importAccounts(self.store, roster)
+
+        stored = self.stored()
+        self.assertEqual(self.store.reveal("c", stored["c"]), "vault1:pc")
+        self.assertEqual(self.store.reveal("d", stored["d"]), "vault1:pd")
+
+    def test_export_writes_plaintext(self):
+        export = os.path.join(self.dir, "out.jsonl")
+        exportAccounts(self.store, export)
+        with open(export) as f:
+            self.assertIn('"password": "vault1:pb"', f.read())
+
+    def test_disable_restores_plaintext(self):
+        self.store.disableVault()
+        self.assertIsNone(self.store.vault)
+        self.assertEqual(self.stored(), {"a": "plain-secret", "b": "vault1:pb"})
+
+
+class AccountListVaultTest(VaultStoreCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        super().setUp()
+        self.model = AccountListModel()
+        self.model.reveal = self.store.reveal
+        self.model.locked = lambda: self.store.locked
+        self.model.setAccounts(self.store.all())
+        self.store.subscribe(self.model.applyDelta)
+
+    def save(self):
+        upserts, removed = self.model.pendingChanges()
+        self.store.removeMany(removed)
+        self.store.upsertMany(upserts)
+        self.model.markSaved()
+
+    def test_renamed_account_is_sealed_for_the_new_uid(self):
+        self.model.setData(self.model.index(0), "a2", AccountListModel.UidRole)
+        self.save()
+
+        self.assertNotIn("a", self.store)
+        self.assertEqual(self.store.reveal("a2", self.store.get("a2")[0]), "plain-secret")
+        self.assertEqual(self.model.revealPassword(self.model.index(0)), "plain-secret")
+
+    def test_no_password_entry_while_locked(self):
+        index = self.model.addAccount("c")
+        self.assertEqual(self.model.revealPassword(index), "")
+
+        self.store.lockVault()
+        self.assertIsNone(self.model.revealPassword(index))
+        self.assertIsNone(self.model.revealPassword(self.model.index(0)))
+
+        self.model.setData(self.model.index(0), "a2", AccountListModel.UidRole)
+        with self.assertRaises(VaultLocked):
+            self.model.pendingChanges()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+# coding: utf-8
+"""
+Benchmark fleet mode against the local portal stand-in.
+
+Every target logs in from its own loopback address (127.0.x.y), which works
+out of the box on Linux; on macOS the aliases have to be added to lo0 first.
+
+    python tools/bench_fleet.py --targets 500 --workers 64 --delay 0.05
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.common.fleet import FleetController
+from portal_stub import PortalStub
+
+
+def loopbackTargets(count):
+    """ targets with distinct loopback source addresses, starting at 127.0.0.2 """
+    return [{"uid": f"2102{i:07d}", "password": "pass&word", "source": f"127.0.{(i + 2) // 256}.{(i + 2) % 256}"}
+            for i in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark fleet mode")
+    parser.add_argument("--targets", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--deadline", type=float, default=5.0)
+    parser.add_argument("--delay", type=float, default=0.05, help="simulated portal latency in seconds")
+    args = parser.parse_args()
+
+    stub = PortalStub(delay=args.delay).start()
+    controller = FleetController(args.workers, args.deadline,
+                                 portal_url=stub.portal_url, eportal_url=stub.eportal_url)
+    targets = loopbackTargets(args.targets)
+
+    for action in ("login", "status", "logout", "status"):
+        print(controller.run(action, targets))
+
+    print(f"portal requests: {stub.state.requests}")
+    stub.stop()
@@ -0,0 +1,103 @@
+# coding: utf-8
+"""
+Benchmark prefix iteration of Trie on large prefixes.
+
+Compares the lazy, bounded `Trie.items` with the previous implementation,
+which walked the whole subtree breadth-first through a `queue.Queue` and
+returned every match, then compares building the index at startup with
+mapping a serialized one.
+
+    python tools/bench_trie.py --keys 100000 --limit 10
+    python tools/bench_trie.py --keys 1000000 --repeat 1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from queue import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.common.trie import Trie, MappedTrie
+
+
+def legacyItems(trie: Trie, prefix):
+    """ `Trie.items` before the lazy traversal """
+    node = trie.searchPrefix(prefix)
+    if not node:
+        return []
+
+    q = Queue()
+    result = []
+    q.put(node)
+
+    while not q.empty():
+        node = q.get()
+        if node.isEnd:
+            result.append((node.key, node.value))
+
+        if node.children:
+            for c in node.children.values():
+                q.put(c)
+
+    return result
+
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Trie prefix iteration")
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    uids = [f"{random.choice(('21', '22', '23'))}{random.randrange(10 ** 9):09d}" for _ in range(args.keys)]
+
+    start = time.perf_counter()
+    trie = Trie()
+    for uid in uids:
+        trie.insert(uid, uid, random.random())
+    buildTime = time.perf_counter() - start
+
+    print(f"{len(trie)} keys, limit {args.limit}, time per query in us")
+    print(f"{'prefix':>8} {'matches':>8} {'legacy':>10} {'all':>10} {'limit':>10} {'ranked':>10}")
+    for prefix in ("", "2", "21", "210", "2101", "21012"):
+        matches = len(legacyItems(trie, prefix))
+        print(f"{prefix!r:>8} {matches:>8} "
+              f"{measure(lambda: legacyItems(trie, prefix), args.repeat):>10.0f} "
+              f"{measure(lambda: trie.items(prefix), args.repeat):>10.0f} "
+              f"{measure(lambda: trie.items(prefix, args.limit), args.repeat):>10.0f} "
+              f"{measure(lambda: trie.items(prefix, args.limit, ranked=True), args.repeat):>10.0f}")
+
+    path = os.path.join(tempfile.mkdtemp(), "index.trie")
+    start = time.perf_counter()
+    trie.save(path)
+    saveTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mapped = MappedTrie(path)
+    openTime = time.perf_counter() - start
+    start = time.perf_counter()
+    first = mapped.items("2101", args.limit)
+    queryTime = time.perf_counter() - start
+    assert first == trie.items("2101", args.limit)
+
+    print(f"\nstartup: build {buildTime * 1e3:.0f} ms, save {saveTime * 1e3:.0f} ms "
+          f"({os.path.getsize(path) / 2 ** 20:.1f} MB), map {openTime * 1e6:.0f} us, "
+          f"first query {queryTime * 1e6:.0f} us")
+    for prefix in ("21", "2101"):
+        print(f"mapped {prefix!r:>8}: limit {measure(lambda: mapped.items(prefix, args.limit), args.repeat):.0f} us, "
+              f"ranked {measure(lambda: mapped.items(prefix, args.limit, ranked=True), args.repeat):.0f} us")
+
+    mapped.close()
+    os.remove(path)
@@ -0,0 +1,173 @@
+# coding: utf-8
+"""
+Local stand-in of the Dr.COM ePortal, used for development and benchmarks.
+
+Sessions are keyed by the client address, so several loopback addresses
+(127.0.0.2, 127.0.0.3, ...) behave like several interfaces of one machine.
+
+    python tools/portal_stub.py --port 8802 --delay 0.05
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class PortalState:
+    """ Sessions and accounts of the stand-in portal """
+
+    def __init__(self, accounts: dict = None, deviceLimit: int = 0):
+        self.accounts = accounts  # uid -> password, None accepts every password
+        self.deviceLimit = deviceLimit  # 每个账号最多的在线会话数，0 表示不限
+        self.sessions = {}  # client ip -> uid
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def login(self, uid, password, ip):
+        if self.accounts is not None and self.accounts.get(uid) != password:
+            return {"result": 0, "msg": "账号或密码错误", "ret_code": 1}
+
+        with self.lock:
+            if self.sessions.get(ip) == uid:
+                return {"result": 0, "msg": "IP: {} 已经在线！".format(ip), "ret_code": 2}
+            if self.deviceLimit and list(self.sessions.values()).count(uid) >= self.deviceLimit:
+                # 与部分门户版本一样返回 base64 编码的消息
+                return {"result": 0, "msg": base64.b64encode(b"Rad:Limit Users Err").decode(), "ret_code": 1}
+            self.sessions[ip] = uid
+
+        return {"result": 1, "msg": "Portal协议认证成功！"}
+
+    def logout(self, ip):
+        with self.lock:
+            if self.sessions.pop(ip, None) is None:
+                return {"result": 0, "msg": "注销失败，该IP不在线"}
+
+        return {"result": 1, "msg": "注销成功"}
+
+    def unbind(self, uid, mac):
+        with self.lock:
+            ips = [ip for ip, user in self.sessions.items() if user == uid and self.mac(ip) == mac]
+            for ip in ips:
+                del self.sessions[ip]
+
+        if not ips:
+            return {"result": 0, "msg": "解绑失败，该MAC未绑定"}
+        return {"result": 1, "msg": "解绑成功"}
+
+    @staticmethod
+    def mac(ip):
+        """ stand-in MAC address of a session, derived from its IPv4 """
+        return "0000" + "".join(f"{int(octet):02x}" for octet in ip.split("."))
+
+    def records(self, uid, start=1, end=None):
+        with self.lock:
+            ips = [ip for ip, user in self.sessions.items() if user == uid]
+
+        return [{"online_ip": ip, "online_mac": self.mac(ip), "user_account": uid} for ip in ips[start - 1:end]]
+
+
+class PortalHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # 头部与正文分两次写出，保持连接时避免 Nagle 与延迟确认叠加的 40ms 等待
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+
+        # 绑定了源地址的请求以客户端地址为准，否则以 wlan_user_ip 为准
+        ip = self.client_address[0]
+        if ip == "127.0.0.1" and query.get("wlan_user_ip", "0.0.0.0") != "0.0.0.0":
+            ip = query["wlan_user_ip"]
+
+        with server.state.lock:
+            server.state.requests += 1
+
+        if server.delay:
+            time.sleep(server.delay)
+
+        callback = query.get("callback", "dr1000")
+        if url.path.endswith("/login"):
+            reply = server.state.login(query.get("user_account"), query.get("user_password"), ip)
+        elif url.path.endswith("/logout"):
+            reply = server.state.logout(ip)
+        elif url.path.endswith("/loadOnlineRecord"):
+            start, end = int(query.get("start_rn") or 1), int(query.get("end_rn") or 0) or None
+            reply = {"result": 1, "records": server.state.records(query.get("user_account"), start, end)}
+        elif url.path.endswith("/mac/custom"):
+            reply = server.state.unbind(query.get("user_account"), query.get("wlan_user_mac"))
+        elif url.path in ("", "/"):
+            uid = server.state.sessions.get(ip, "")
+            return self._reply(f"<html><script>uid='{uid}';v4ip='{ip}'</script></html>", "text/html")
+        elif url.path == "/ip":
+            # ip.ouc.edu.cn 的替身
+            return self._reply(f"<html><body>您的IP地址是：{ip}</body></html>", "text/html")
+        else:
+            return self._reply("not found", "text/plain", 404)
+
+        self._reply(f"{callback}({json.dumps(reply, ensure_ascii=False)});", "application/javascript")
+
+    # 保活心跳用 HEAD 请求门户首页
+    do_HEAD = do_GET
+
+    def _reply(self, text, content_type, code=200):
+        body = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PortalStub(ThreadingHTTPServer):
+    """ Stand-in portal server, run it with `start()` in a background thread """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, accounts: dict = None, deviceLimit: int = 0):
+        super().__init__((host, port), PortalHandler)
+        self.state = PortalState(accounts, deviceLimit)
+        self.delay = delay
+
+    @property
+    def portal_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+    @property
+    def ip_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/ip"
+
+    @property
+    def eportal_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/eportal/portal"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in of the Dr.COM ePortal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8802)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before every reply")
+    args = parser.parse_args()
+
+    stub = PortalStub(args.host, args.port, args.delay)
+    print(f"portal_url={stub.portal_url} eportal_url={stub.eportal_url}")
+    stub.serve_forever()
@@ -0,0 +1,285 @@
+# coding: utf-8
+"""
+Soak test of the refresh, probe and login pipeline against the local portal stand-in.
+
+The real `NetworkUpdateThread`, `NetworkOnline`, `NetInfoCard` and portal
+client run back to back on a simulated clock: a refresh every 3 s, a probe
+every 5 s and a logout/login every hour of simulated time, so a day of cycles
+takes minutes. Python heap (tracemalloc) and RSS are sampled at regular
+intervals and the run fails if either keeps growing after the warm-up.
+
+    QT_QPA_PLATFORM=offscreen python tools/soak.py --hours 24 --samples 48
+
+Interfaces are reported by a fixed table instead of the platform tools, and
+the probes run `echo` instead of `ping` unless `--real-ping` is given.
+"""
+import argparse
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QObject, QEvent, QCoreApplication
+from PySide6.QtWidgets import QApplication
+
+from qfluentwidgets import FluentIcon
+
+from loguru import logger
+
+from app.common.portal import PortalClient, loginInterfaces, logoutInterfaces
+from app.common.signal_bus import signalBus
+from app.view.net_info import NetInfoCard, GroupHeaderCardWidget
+from app.view.ouc_net import NetworkUpdateThread, NetworkOnline
+from portal_stub import PortalStub
+
+
+REFRESH_INTERVAL = 3
+PROBE_INTERVAL = 5
+LOGIN_INTERVAL = 3600
+UID = "21020000001"
+PASSWORD = "soak&password"
+
+
+class SimulatedClock:
+    """ Clock of the simulated time, advanced by the harness """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class SoakParent(QObject):
+    """ The parts of OUCNet read by the worker threads """
+
+    def __init__(self):
+        super().__init__()
+        self.network_was_down = False
+
+
+class SoakUpdateThread(NetworkUpdateThread):
+
+    def __init__(self, stub: PortalStub, parent=None):
+        super().__init__(parent)
+        self.IP_URL = stub.ip_url
+        self.portal = PortalClient(portal_url=stub.portal_url, eportal_url=stub.eportal_url, limiter=None)
+
+    def get_network_info(self):
+        net_status = {
+            "Ethernet": {
+                "type": "Ethernet",
+                "interface": "Ethernet",
+                "ipv4": "127.0.0.1",
+                "ipv4_dns": ["211.64.142.5"],
+                "ipv6": "Unknown",
+                "mac": "00:11:22:33:44:55",
+            }
+        }
+        return list(net_status), net_status
+
+
+class SoakProbeThread(NetworkOnline):
+
+    realPing = False
+
+    def startPing(self, host):
+        if self.realPing:
+            return super().startPing(host)
+
+        echo = shutil.which("echo")
+        command = [echo, "time=1.0 ms"] if echo else [sys.executable, "-S", "-c", "print('time=1.0 ms')"]
+        return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def rss():
+    """ resident set size of the process in bytes """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def isGrowing(values, tolerance, ratio=0.8):
+    """ whether the values rise in most steps and in total by more than `tolerance` """
+    steps = [b - a for a, b in zip(values, values[1:])]
+    if not steps:
+        return False
+
+    rising = sum(1 for step in steps if step > 0)
+    return rising >= ratio * len(steps) and values[-1] - values[0] > tolerance
+
+
+class Soak:
+    """ Drive the pipeline on the simulated clock and sample memory """
+
+    def __init__(self, stub: PortalStub, hours: float, samples: int):
+        self.stub = stub
+        self.clock = SimulatedClock()
+        self.duration = hours * 3600
+        self.sampleInterval = self.duration / samples
+        # 预热阶段填充缓存、连接池和延迟导入，之后的样本才参与判断
+        self.warmup = max(2, samples // 4)
+        self.parent = SoakParent()
+
+        self.card = NetInfoCard("网络状态", None)
+        self.card.resize(900, 400)
+        self.card.show()
+        self.devicesCard = GroupHeaderCardWidget()
+        self.devicesCard.show()
+        self.devices = []
+
+        self.updateThread = SoakUpdateThread(stub, self.parent)
+        self.netInfoSubscription = signalBus.subscribe("netSnapshot", self.onNetInfo)
+        self.probeThread = SoakProbeThread(self.parent)
+
+        self.counts = {"refresh": 0, "probe": 0, "login": 0}
+        self.samples = []   # (simulated hours, traced bytes, rss bytes)
+        self.baseline = None
+
+    def onNetInfo(self, netInfo):
+        self.card.update_info(netInfo)
+
+        # 设备列表每次刷新都重建，覆盖 GroupHeaderCardWidget 的增删
+        self.devicesCard.setGroups([
+            (FluentIcon.GLOBE, device.get("name", device.get("online_ip")), device.get("IP", device.get("online_ip")))
+            for device in self.devices + netInfo.get("device", [])])
+
+    def refresh(self):
+        self.updateThread.start()
+        self.updateThread.wait()
+        self.counts["refresh"] += 1
+
+    def probe(self):
+        self.probeThread.start()
+        self.probeThread.wait()
+        self.counts["probe"] += 1
+
+    def login(self):
+        logoutInterfaces({"有线网络": None}, portal_url=self.stub.portal_url,
+                         eportal_url=self.stub.eportal_url, limiter=None)
+        loginInterfaces(UID, PASSWORD, {"有线网络": None}, portal_url=self.stub.portal_url,
+                        eportal_url=self.stub.eportal_url, limiter=None)
+        client = PortalClient(portal_url=self.stub.portal_url, eportal_url=self.stub.eportal_url, limiter=None)
+        self.devices = client.fetchDevices(UID)
+        client.session.close()
+        self.counts["login"] += 1
+
+    def close(self):
+        """ tear the widgets and threads down before the interpreter finalizes """
+        self.netInfoSubscription.unsubscribe()
+        for obj in (self.netInfoSubscription, self.card, self.devicesCard, self.updateThread, self.probeThread, self.parent):
+            obj.deleteLater()
+        self.settle()
+
+    def settle(self):
+        """ deliver queued signals and run the pending deleteLater() calls """
+        QApplication.processEvents()
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+    def sample(self):
+        self.settle()
+        gc.collect()
+        traced = tracemalloc.get_traced_memory()[0]
+        self.samples.append((self.clock.now / 3600, traced, rss()))
+
+    def run(self):
+        schedule = {"refresh": 0.0, "probe": 0.0, "login": 0.0, "sample": self.sampleInterval}
+        actions = {"refresh": self.refresh, "probe": self.probe, "login": self.login}
+        intervals = {"refresh": REFRESH_INTERVAL, "probe": PROBE_INTERVAL, "login": LOGIN_INTERVAL,
+                     "sample": self.sampleInterval}
+
+        self.sample()
+        while True:
+            name = min(schedule, key=schedule.get)
+            if schedule[name] > self.duration:
+                break
+
+            self.clock.advance(schedule[name] - self.clock.now)
+            if name == "sample":
+                self.sample()
+                if len(self.samples) == self.warmup + 1:
+                    self.baseline = tracemalloc.take_snapshot()
+            else:
+                actions[name]()
+                self.settle()
+
+            schedule[name] += intervals[name]
+
+
+def report(soak: Soak, elapsed, traceTolerance, rssTolerance, top):
+    print(f"simulated {soak.clock.now / 3600:.1f} h in {elapsed:.0f} s: "
+          f"{soak.counts['refresh']} refreshes, {soak.counts['probe']} probes, {soak.counts['login']} logins")
+    print(f"{'hours':>7} {'traced MB':>10} {'rss MB':>8}")
+    for hours, traced, resident in soak.samples:
+        print(f"{hours:>7.2f} {traced / 2 ** 20:>10.2f} {resident / 2 ** 20:>8.1f}")
+
+    steady = soak.samples[soak.warmup:]
+    traced = [s[1] for s in steady]
+    resident = [s[2] for s in steady]
+    leaks = []
+    if isGrowing(traced, traceTolerance):
+        leaks.append(f"Python heap grew by {(traced[-1] - traced[0]) / 2 ** 10:.0f} KB")
+    if isGrowing(resident, rssTolerance):
+        leaks.append(f"RSS grew by {(resident[-1] - resident[0]) / 2 ** 20:.1f} MB")
+
+    if soak.baseline is not None:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        print(f"\ntop allocation sites since warm-up:")
+        for stat in snapshot.compare_to(soak.baseline, "lineno")[:top]:
+            print(f"  {stat.size_diff / 2 ** 10:+9.1f} KB {stat.count_diff:+7d} blocks  {stat.traceback[0]}")
+
+    if leaks:
+        print("\nFAIL: " + "; ".join(leaks))
+        return 1
+
+    print("\nOK: no monotonic memory growth")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soak test with memory leak detection")
+    parser.add_argument("--hours", type=float, default=24, help="simulated hours")
+    parser.add_argument("--samples", type=int, default=48, help="memory samples over the run")
+    parser.add_argument("--trace-tolerance", type=float, default=512, help="allowed heap growth in KB")
+    parser.add_argument("--rss-tolerance", type=float, default=32, help="allowed RSS growth in MB")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites to report")
+    parser.add_argument("--real-ping", action="store_true", help="probe with the system ping")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    app = QApplication(sys.argv)
+    stub = PortalStub().start()
+    SoakProbeThread.realPing = args.real_ping
+
+    tracemalloc.start()
+    soak = Soak(stub, args.hours, args.samples)
+    start = time.perf_counter()
+    soak.run()
+    code = report(soak, time.perf_counter() - start, args.trace_tolerance * 2 ** 10, args.rss_tolerance * 2 ** 20,
+                  args.top)
+
+    soak.close()
+    stub.stop()
+    del soak
+    app.shutdown()
+    sys.exit(code)
@@ -0,0 +1,311 @@
+# coding: utf-8
+"""
+Benchmark the cards on the offscreen platform.
+
+Measures the UI hot paths: building a `GroupHeaderCardWidget` with a
+growing number of groups, rebuilding it with `removeAll` or `setGroups`,
+removing single groups, relayout on resize and `NetInfoCard.update_info`.
+For every operation the time of the call itself is reported separately
+from the layout and repaint it triggers, together with the paint events and
+frames (update requests of the window) it costs.
+
+    python tools/ui_bench.py --groups 6 24 96 384 --output ui_bench.jsonl
+    python tools/ui_bench.py --baseline ui_bench.jsonl
+
+Every run is appended to `--output` as one JSON line with the Qt and
+qfluentwidgets versions, so the numbers of two upgrades can be compared
+with `--baseline`, which fails if an operation got slower than `--threshold`.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PySide6
+from PySide6.QtCore import QEvent, QCoreApplication, qVersion, qInstallMessageHandler
+from PySide6.QtWidgets import QApplication
+
+from qfluentwidgets import FluentIcon
+
+from loguru import logger
+
+from app.view.net_info import NetInfoCard, GroupHeaderCardWidget
+
+
+NET_INFOS = [
+    {"online_status": "Online", "IP": "10.140.12.34", "IPv6": ["2001:da8:7001::1234"], "MAC": "00:11:22:33:44:55",
+     "interface": "Ethernet", "DNS": ["211.64.142.5", "211.64.142.6"], "id": "21020000001", "device": []},
+    {"online_status": "Online", "IP": "10.140.56.78", "IPv6": "Unknown", "MAC": "66:77:88:99:aa:bb",
+     "interface": "WLAN", "DNS": ["211.64.142.5"], "id": "21020000002", "device": []},
+]
+
+
+class BenchApplication(QApplication):
+    """ QApplication counting paint events and timing the frames while recording """
+
+    def __init__(self, argv):
+        super().__init__(argv)
+        self.recording = False
+        self.events = 0
+        self.paints = 0
+        self.frames = []    # seconds of each update request of a window
+
+    def notify(self, receiver, event):
+        if not self.recording:
+            return super().notify(receiver, event)
+
+        self.events += 1
+        eventType = event.type()
+        if eventType == QEvent.Paint:
+            self.paints += 1
+        elif eventType == QEvent.UpdateRequest:
+            # 窗口的一次重绘请求即一帧，子控件的绘制都在其中完成
+            start = time.perf_counter()
+            try:
+                return super().notify(receiver, event)
+            finally:
+                self.frames.append(time.perf_counter() - start)
+
+        return super().notify(receiver, event)
+
+
+class Measure:
+    """ Samples of one operation at one size """
+
+    def __init__(self, app: BenchApplication, name: str, groups: int):
+        self.app = app
+        self.name = name
+        self.groups = groups
+        self.calls = []     # seconds in the operation itself
+        self.settles = []   # seconds of the layout and repaint after it
+        self.paints = []
+        self.frames = []
+
+    def run(self, operation):
+        self.app.paints = 0
+        self.app.frames = []
+        self.app.recording = True
+
+        start = time.perf_counter()
+        operation()
+        self.calls.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        settle(self.app)
+        self.settles.append(time.perf_counter() - start)
+
+        self.app.recording = False
+        self.paints.append(self.app.paints)
+        self.frames.extend(self.app.frames)
+
+    def result(self):
+        runs = len(self.calls)
+        return {
+            "op": self.name,
+            "groups": self.groups,
+            "runs": runs,
+            "call_ms": round(statistics.median(self.calls) * 1e3, 3),
+            "settle_ms": round(statistics.median(self.settles) * 1e3, 3),
+            "paints": round(sum(self.paints) / runs, 1),
+            "frames": round(len(self.frames) / runs, 2),
+            "frame_ms": round(statistics.median(self.frames) * 1e3, 3) if self.frames else 0,
+        }
+
+
+def quietHandler(mode, context, message):
+    # offscreen 平台每显示一个窗口都会警告一次
+    if "propagateSizeHints" not in message:
+        sys.stderr.write(message + "\n")
+
+
+def settle(app: BenchApplication):
+    """ deliver posted events until the layouts, repaints and deletions are done """
+    for _ in range(10):
+        before = app.events
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        app.processEvents()
+        if app.events == before:
+            break
+
+
+def addGroups(card: GroupHeaderCardWidget, count, start=0):
+    for i in range(start, start + count):
+        card.addGroup(FluentIcon.GLOBE, f"设备 {i}", f"10.140.{i // 256}.{i % 256}", group_index=i)
+
+
+def benchGroups(app: BenchApplication, groups: int, repeat: int):
+    """ measurements of a GroupHeaderCardWidget with `groups` groups """
+    results = []
+    card = None
+
+    build = Measure(app, "build", groups)
+    for _ in range(repeat):
+        if card is not None:
+            card.deleteLater()
+            settle(app)
+
+        def create():
+            nonlocal card
+            card = GroupHeaderCardWidget()
+            card.setTitle("在线设备")
+            card.resize(900, 600)
+            addGroups(card, groups)
+            card.show()
+
+        build.run(create)
+    results.append(build)
+
+    relayout = Measure(app, "relayout", groups)
+    for i in range(repeat):
+        relayout.run(lambda: card.resize(800 + 200 * (i % 2), 600))
+    results.append(relayout)
+
+    rebuild = Measure(app, "rebuild", groups)
+    for _ in range(repeat):
+        rebuild.run(lambda: (card.removeAll(), addGroups(card, groups)))
+    results.append(rebuild)
+
+    setGroups = Measure(app, "setGroups", groups)
+    items = [(FluentIcon.GLOBE, f"设备 {i}", f"10.140.{i // 256}.{i % 256}", None, 0, i) for i in range(groups)]
+    for _ in range(repeat):
+        setGroups.run(lambda: card.setGroups(items))
+    results.append(setGroups)
+
+    # 从中间逐个删除，每次删除后单独布局和重绘
+    remove = Measure(app, "removeGroup", groups)
+    for index in range(groups // 2, groups // 2 + min(repeat, groups)):
+        remove.run(lambda: card.removeGroup(index))
+    results.append(remove)
+
+    card.deleteLater()
+    settle(app)
+    return [m.result() for m in results]
+
+
+def benchNetInfo(app: BenchApplication, repeat: int):
+    """ measurements of NetInfoCard updates """
+    card = None
+
+    build = Measure(app, "NetInfoCard", 6)
+
+    def create():
+        nonlocal card
+        card = NetInfoCard("网络状态", None)
+        card.resize(900, 400)
+        card.show()
+
+    build.run(create)
+
+    update = Measure(app, "update_info", 6)
+    for i in range(repeat):
+        update.run(lambda: card.update_info(dict(NET_INFOS[i % 2])))
+
+    same = Measure(app, "update_info same", 6)
+    for _ in range(repeat):
+        same.run(lambda: card.update_info(dict(NET_INFOS[0])))
+
+    card.deleteLater()
+    settle(app)
+    return [build.result(), update.result(), same.result()]
+
+
+def environment():
+    try:
+        from qfluentwidgets import __version__ as fluentVersion
+    except ImportError:
+        fluentVersion = "unknown"
+
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt": qVersion(),
+        "pyside6": PySide6.__version__,
+        "qfluentwidgets": fluentVersion,
+    }
+
+
+def loadBaseline(path):
+    """ the last record of a JSON lines file """
+    with open(path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+
+    return json.loads(lines[-1]) if lines else None
+
+
+def compare(record, baseline, threshold):
+    """ print the change of every operation, return the regressions """
+    previous = {(r["op"], r["groups"]): r for r in baseline["results"]}
+    env = baseline["environment"]
+    print(f"\ncompared with {env['time']} (Qt {env['qt']}, qfluentwidgets {env['qfluentwidgets']}):")
+
+    regressions = []
+    for result in record["results"]:
+        old = previous.get((result["op"], result["groups"]))
+        if old is None:
+            continue
+
+        total = result["call_ms"] + result["settle_ms"]
+        oldTotal = old["call_ms"] + old["settle_ms"]
+        ratio = total / oldTotal if oldTotal else 1.0
+        mark = ""
+        if ratio > threshold:
+            mark = "  <- slower"
+            regressions.append(f"{result['op']}@{result['groups']}")
+        print(f"  {result['op']:>18} {result['groups']:>6} {oldTotal:>9.2f} -> {total:>9.2f} ms "
+              f"({ratio:.2f}x), paints {old['paints']} -> {result['paints']}{mark}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cards on the offscreen platform")
+    parser.add_argument("--groups", type=int, nargs="+", default=[6, 24, 96, 384], help="group counts")
+    parser.add_argument("--repeat", type=int, default=10, help="runs of every operation")
+    parser.add_argument("--output", help="append the results to this JSON lines file")
+    parser.add_argument("--baseline", help="compare with the last record of this JSON lines file")
+    parser.add_argument("--threshold", type=float, default=1.5, help="slowdown counted as a regression")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    qInstallMessageHandler(quietHandler)
+    app = BenchApplication(sys.argv)
+    # 预热字体、图标和样式表缓存
+    benchNetInfo(app, 2)
+
+    results = benchNetInfo(app, args.repeat)
+    for groups in args.groups:
+        results.extend(benchGroups(app, groups, args.repeat))
+
+    record = {"environment": environment(), "results": results}
+    env = record["environment"]
+    print(f"Qt {env['qt']}, PySide6 {env['pyside6']}, qfluentwidgets {env['qfluentwidgets']}, "
+          f"median of {args.repeat} runs")
+    print(f"{'op':>18} {'groups':>6} {'call ms':>9} {'settle ms':>10} {'paints':>7} {'frames':>7} {'frame ms':>9}")
+    for r in results:
+        print(f"{r['op']:>18} {r['groups']:>6} {r['call_ms']:>9.2f} {r['settle_ms']:>10.2f} "
+              f"{r['paints']:>7} {r['frames']:>7} {r['frame_ms']:>9.2f}")
+
+    code = 0
+    if args.baseline:
+        baseline = loadBaseline(args.baseline)
+        if baseline is not None:
+            regressions = compare(record, baseline, args.threshold)
+            if regressions:
+                print(f"\nFAIL: slower than {args.threshold}x: {', '.join(regressions)}")
+                code = 1
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    app.shutdown()
+    sys.exit(code)